@@ -0,0 +1,413 @@
+'''
+Benchmarks for the render, load and layout hot paths.
+
+    python -m benchmarks.bench                                # run everything, print a table
+    python -m benchmarks.bench -o results.json                # also write machine readable results
+    python -m benchmarks.bench --compare benchmarks/baseline.json
+    python -m benchmarks.bench --save-baseline                # refresh benchmarks/baseline.json
+
+Every case runs on a fixed synthetic corpus (seeded), so runs are comparable across commits.
+Cases that need a display are skipped when Tk cannot open one.
+Cases with a budget (startup) also fail the run when slower than it, with or without a baseline.
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lib.chord_diagram_gen as cg
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED = 1234
+# a case regresses when its median is this much slower than the baseline
+DEFAULT_THRESHOLD = 1.25
+
+BENCHMARKS = []
+
+class Skip(Exception):
+    pass
+
+def benchmark(name, repeat = 5, budget = None):
+    '''
+    Registers a benchmark. The function takes no arguments and returns (callable, items per call);
+    setup happens in the function itself so only the callable is timed.
+    budget: seconds the median may take at most, checked on every run
+    '''
+    def register(function):
+        BENCHMARKS.append((name, function, repeat, budget))
+        return function
+    return register
+
+def synthetic_chord(rng, num_strings, span, index):
+    '''
+    A random but valid chord: one fretted note per string inside a window of span + 1 frets,
+    with the odd open or muted string
+    '''
+    starting_fret = rng.randint(1, 9)
+    notes = []
+    mute = []
+    for string in range(1, num_strings + 1):
+        roll = rng.random()
+        if roll < 0.1:
+            mute.append(string)
+        elif roll < 0.25:
+            continue
+        else:
+            notes.append((string, starting_fret + rng.randint(0, span)))
+    if notes:
+        # pin the span so every chord in a corpus has the same number of frets
+        notes[0] = (notes[0][0], starting_fret)
+        notes[-1] = (notes[-1][0], starting_fret + span)
+    barres = [(starting_fret, 1, 2)] if rng.random() < 0.3 else []
+    return cg.Chord(num_strings, f"chord{index}", starting_fret, notes, barres, mute)
+
+def corpus(size, num_strings = 6, span = 3, seed = SEED):
+    rng = random.Random(seed + size * 31 + num_strings * 7 + span)
+    return [synthetic_chord(rng, num_strings, span, index) for index in range(size)]
+
+# Chord.create_image
+
+for num_strings in (4, 5, 6):
+    for span in (3, 6):
+        def build(num_strings = num_strings, span = span):
+            chords = corpus(50, num_strings, span)
+            directory = tempfile.mkdtemp(prefix="rechord-bench-")
+            def run():
+                for index, chord in enumerate(chords):
+                    chord.create_image(os.path.join(directory, f"{index}.svg"))
+            return run, len(chords)
+        benchmark(f"create_image/{num_strings}strings/span{span}")(build)
+
+        def build_svg(num_strings = num_strings, span = span):
+            chords = corpus(50, num_strings, span)
+            def run():
+                for chord in chords:
+                    chord.to_svg()
+            return run, len(chords)
+        benchmark(f"to_svg/{num_strings}strings/span{span}")(build_svg)
+
+# rasterization
+
+@benchmark("rasterize/svg2rlg+renderPM")
+def rasterize_svg():
+    import lib.render as render
+    documents = [chord.to_svg() for chord in corpus(30)]
+    def run():
+        for document in documents:
+            render.svg_to_pil(document)
+    return run, len(documents)
+
+@benchmark("rasterize/svg2rlg")
+def parse_svg():
+    import lib.render as render
+    documents = [chord.to_svg() for chord in corpus(30)]
+    def run():
+        for document in documents:
+            render.svg_to_drawing(document)
+    return run, len(documents)
+
+@benchmark("rasterize/svg2rlg_full")
+def parse_full_svg():
+    import lib.render as render
+    documents = [chord.to_svg(compact=False) for chord in corpus(30)]
+    def run():
+        for document in documents:
+            render.svg_to_drawing(document)
+    return run, len(documents)
+
+@benchmark("rasterize/raster_backend")
+def rasterize_direct():
+    import lib.raster_backend as raster_backend
+    chords = corpus(30)
+    def run():
+        for chord in chords:
+            raster_backend.chord_to_pil(chord)
+    return run, len(chords)
+
+@benchmark("rasterize/cache_hit")
+def rasterize_cached():
+    from lib.raster_cache import RasterCache
+    documents = [chord.to_svg() for chord in corpus(30)]
+    cache = RasterCache(cache_dir=None)
+    for document in documents:
+        cache.rasterize(document)
+    def run():
+        for document in documents:
+            cache.rasterize(document)
+    return run, len(documents)
+
+# startup: wall time of a fresh interpreter, so these include python's own start (about 20 ms)
+
+# what importing a module may cost; the GUI and headless users of chord_diagram_gen must not pull in
+# svglib, reportlab or PIL at import time
+IMPORT_BUDGETS = {"main": 0.15, "lib.chord_diagram_gen": 0.075}
+# from launching python to the window being drawn
+FIRST_FRAME_BUDGET = 0.5
+FIRST_FRAME_CODE = '''
+import sys
+# resource_path finds logo.ico here, as in a PyInstaller build
+sys._MEIPASS = sys.path[0]
+import main
+app = main.ReChord()
+app.update()
+app.destroy()
+'''
+
+def run_python(code):
+    return subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {REPO_ROOT!r})\n{code}"], capture_output=True, text=True)
+
+for module, budget in IMPORT_BUDGETS.items():
+    def build_import(module = module):
+        def run():
+            run_python(f"import {module}").check_returncode()
+        return run, 1
+    benchmark(f"startup/import/{module}", budget=budget)(build_import)
+
+@benchmark("startup/first_frame", budget=FIRST_FRAME_BUDGET)
+def build_first_frame():
+    result = run_python(FIRST_FRAME_CODE)
+    if result.returncode != 0:
+        raise Skip((result.stderr.strip().splitlines() or ["no output"])[-1])
+    def run():
+        run_python(FIRST_FRAME_CODE).check_returncode()
+    return run, 1
+
+# layout
+
+def layout_sizes(count):
+    rng = random.Random(SEED + count)
+    return [(rng.choice((99, 116, 134)), rng.choice((179, 202, 224))) for _ in range(count)]
+
+for count in (10, 100, 1000):
+    def build_layout(count = count):
+        from lib.layout import FlowLayout
+        sizes = layout_sizes(count)
+        def run():
+            FlowLayout(sizes, 800)
+        return run, count
+    benchmark(f"layout/compute/{count}")(build_layout)
+
+    def build_edit(count = count):
+        from lib.layout import FlowLayout
+        layout = FlowLayout(layout_sizes(count), 800)
+        # an insert and a remove in the last tenth only lay out the rows after them
+        index = count - count // 10 - 1
+        def run():
+            layout.insert(index, (116, 202))
+            layout.remove(index)
+        return run, 2
+    benchmark(f"layout/insert_remove/{count}")(build_edit)
+
+    def build_set_width(count = count):
+        from lib.layout import FlowLayout
+        layout = FlowLayout(layout_sizes(count), 800)
+        widths = iter([600, 800] * 100000)
+        def run():
+            layout.set_width(next(widths))
+        return run, count
+    benchmark(f"layout/set_width/{count}")(build_set_width)
+
+    def build_hit_test(count = count):
+        from lib.layout import FlowLayout
+        layout = FlowLayout(layout_sizes(count), 800)
+        rng = random.Random(SEED)
+        points = [(rng.uniform(0, 800), rng.uniform(0, layout.content_height())) for _ in range(1000)]
+        def run():
+            for x, y in points:
+                layout.hit_test(x, y)
+        return run, len(points)
+    benchmark(f"layout/hit_test/{count}")(build_hit_test)
+
+    def build_reposition(count = count):
+        import tkinter as tk
+        from PIL import Image
+        from main import ReChord
+        from lib.layout import FlowLayout
+        from lib.raster_cache import RasterCache
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            raise Skip(f"no display ({e})")
+        root.withdraw()
+        canvas = tk.Canvas(root, width=800, height=600)
+        raster_cache = RasterCache(cache_dir=None)
+        raster_cache.put("chord", Image.new("RGB", (134, 179), "white"))
+        app = SimpleNamespace(
+            canvas=canvas, raster_cache=raster_cache, canvas_width=800, display_scale=1.0,
+            chord_names=["chord"] * count, chord_keys=["chord"] * count, chord_definitions=[None] * count,
+            chord_sizes=[(134, 179)] * count, chord_images=[None] * count, chord_items=[None] * count,
+            layout=FlowLayout([(134, 179)] * count, 800), materialized=set(), selected_chord=None,
+            edit_depth=0, reflow_start=None, viewport_job=None,
+        )
+        for method in ("layout_chords", "show_selection", "viewport_bounds", "update_viewport", "update_scrollregion", "chord_image", "materialize_chord", "release_chord"):
+            setattr(app, method, getattr(ReChord, method).__get__(app))
+        ReChord.reposition_chords(app)
+        widths = iter([600, 800] * 1000)
+        def run():
+            app.canvas_width = next(widths)
+            ReChord.reposition_chords(app, app.layout.set_width(app.canvas_width))
+            root.update_idletasks()
+        return run, count
+    benchmark(f"layout/reposition/{count}")(build_reposition)
+
+# loading saved sets
+
+for size in (10, 100, 300):
+    for embed in (False, True):
+        def build_load(size = size, embed = embed):
+            import lib.render as render
+            from lib.raster_cache import RasterCache
+            from lib.save_format import build_save, read_save
+            from lib.set_loader import SetLoader
+            chords = corpus(size)
+            definitions = [chord.to_dict() for chord in chords]
+            images = [render.render_chord(chord) for chord in chords] if embed else None
+            save_text = json.dumps(build_save([chord.title for chord in chords], definitions, images))
+            def run():
+                loader = SetLoader(read_save(json.loads(save_text)), RasterCache(cache_dir=None))
+                for _ in range(len(loader)):
+                    loader.results.get()
+            return run, size
+        benchmark(f"load/{'png' if embed else 'definitions'}/{size}", repeat=3)(build_load)
+
+# opening the chord library: indexing loose SVGs from scratch against a library pack
+
+def library_dir(size):
+    directory = tempfile.mkdtemp(prefix="rechord-bench-")
+    for chord in corpus(size):
+        chord.create_image(os.path.join(directory, f"{chord.title}.svg"))
+    return directory
+
+for size in (100, 1000):
+    def build_index(size = size):
+        from lib.library import ChordLibrary
+        svg_dir = library_dir(size)
+        def run():
+            # a new database, so every SVG is read and parsed, as on a cold start or after a backup restore
+            library = ChordLibrary(os.path.join(tempfile.mkdtemp(prefix="rechord-bench-"), "library.db"), svg_dir, "missing", None)
+            library.reconcile()
+            library.chord_filenames()
+            library.close()
+        return run, size
+    benchmark(f"library/open/svg_dir/{size}", repeat=3)(build_index)
+
+    def build_pack(size = size):
+        from lib.library_pack import ChordPack, import_svgs
+        path = os.path.join(tempfile.mkdtemp(prefix="rechord-bench-"), "library.pack")
+        pack = ChordPack(path)
+        import_svgs(pack, library_dir(size), thumbnails=False)
+        pack.close()
+        def run():
+            pack = ChordPack(path, writable=False)
+            pack.names()
+            pack.definition("chord0")
+            pack.close()
+        return run, size
+    benchmark(f"library/open/pack/{size}", repeat=3)(build_pack)
+
+def run_benchmarks(pattern = None, log = print):
+    results = {}
+    for name, build, repeat, budget in BENCHMARKS:
+        if pattern and pattern not in name:
+            continue
+        try:
+            run, items = build()
+        except Skip as e:
+            log(f"{name:<40} skipped: {e}")
+            continue
+        run()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        results[name] = {
+            "median_s": statistics.median(timings),
+            "min_s": min(timings),
+            "runs": repeat,
+            "items": items,
+            "per_item_ms": statistics.median(timings) / items * 1000
+        }
+        if budget is not None:
+            results[name]["budget_s"] = budget
+        log(f"{name:<40} {results[name]['median_s'] * 1000:10.2f} ms  {results[name]['per_item_ms']:8.3f} ms/item")
+    return results
+
+def compare(results, baseline, threshold):
+    '''
+    returns: [(name, baseline median, current median, ratio)] for every case slower than threshold
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_s"] / baseline[name]["median_s"]
+        if ratio > threshold:
+            regressions.append((name, baseline[name]["median_s"], result["median_s"], ratio))
+    return regressions
+
+def over_budget(results):
+    '''
+    returns: [(name, budget, median)] for every case slower than its budget
+    '''
+    return [
+        (name, result["budget_s"], result["median_s"]) for name, result in results.items()
+        if result.get("budget_s") is not None and result["median_s"] > result["budget_s"]
+    ]
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Benchmark reChord's render, load and layout paths")
+    parser.add_argument("-k", "--filter", default=None, help="only run cases whose name contains this")
+    parser.add_argument("-o", "--output", default=None, help="write results as JSON")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown ratio that counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {BASELINE_PATH}")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    # everything that writes to ./tmp does so in a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="rechord-bench-"))
+    results = run_benchmarks(args.filter)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    for name, budget, median in over_budget(results):
+        print(f"OVER BUDGET {name}: {median * 1000:.2f} ms (budget {budget * 1000:.0f} ms)")
+        status = 1
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.2f}x")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+'''
+Load test for the render service (lib/render_server.py) on localhost.
+
+    python -m benchmarks.load_test                                   # starts a local instance on a free port
+    python -m benchmarks.load_test --url http://127.0.0.1:8765 -n 5000 -c 32
+    python -m benchmarks.load_test --unique 2000 --format png --scale 2
+
+Every client thread keeps one keep-alive connection and posts definitions drawn from a fixed synthetic
+corpus of --unique chords, so repeats are served from the response cache; --revalidate sends the ETag of
+chords it has seen before, which are answered 304. Reports throughput and p50/p90/p99 latency.
+'''
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench import REPO_ROOT, SEED, corpus
+
+STARTUP_TIMEOUT_S = 30
+STOP_TIMEOUT_S = 30
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workers):
+    '''
+    Starts lib.render_server in a child process, so its threads don't share a GIL with the clients
+    returns: (process, base url)
+    '''
+    port = free_port()
+    command = [sys.executable, "-m", "lib.render_server", "--port", str(port)]
+    if workers:
+        command += ["--workers", str(workers)]
+    # its own process group on Windows, so it can be sent a Ctrl+Break without the load test getting it too
+    flags = subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, creationflags=flags)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.perf_counter() + STARTUP_TIMEOUT_S
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"render server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return process, url
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("render server didn't come up")
+
+def stop_server(process):
+    # an interrupt lets the server shut its render processes down; a kill would leave them running
+    process.send_signal(signal.CTRL_BREAK_EVENT if os.name == "nt" else signal.SIGINT)
+    try:
+        process.wait(STOP_TIMEOUT_S)
+    except subprocess.TimeoutExpired:
+        print(f"Error stopping the render server (pid {process.pid}): killing it")
+        process.kill()
+        process.wait()
+
+def percentile(sorted_values, fraction):
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def run_load(url, requests, concurrency, bodies, format = "svg", scale = 1.0, revalidate = False):
+    '''
+    Posts requests render requests from concurrency threads, each picking bodies at random (seeded)
+    returns: {"elapsed_s", "latencies_s" (sorted), "statuses": Counter, "errors": [str]}
+    '''
+    parts = urlsplit(url)
+    path = f"/render?format={format}&scale={scale:g}"
+    latencies = []
+    statuses = Counter()
+    errors = []
+    etags = {}
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client(index):
+        rng = random.Random(SEED + index)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+        mine = []
+        for _ in counter:
+            choice = rng.randrange(len(bodies))
+            headers = {"Content-Type": "application/json"}
+            if revalidate and choice in etags:
+                headers["If-None-Match"] = etags[choice]
+            start = time.perf_counter()
+            try:
+                connection.request("POST", path, bodies[choice], headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                with lock:
+                    errors.append(repr(e))
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+                continue
+            mine.append(time.perf_counter() - start)
+            if response.getheader("ETag"):
+                etags[choice] = response.getheader("ETag")
+            with lock:
+                statuses[response.status] += 1
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"elapsed_s": time.perf_counter() - start, "latencies_s": sorted(latencies), "statuses": statuses, "errors": errors}
+
+def summarize(result):
+    latencies = result["latencies_s"]
+    completed = len(latencies)
+    return {
+        "requests": completed,
+        "errors": len(result["errors"]),
+        "statuses": {str(status): count for status, count in sorted(result["statuses"].items())},
+        "throughput_rps": completed / result["elapsed_s"] if result["elapsed_s"] > 0 else 0,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p90_ms": percentile(latencies, 0.90) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "max_ms": latencies[-1] * 1000 if latencies else None,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+    }
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Load test the reChord render service")
+    parser.add_argument("--url", default=None, help="service to test (default: start one on a free port)")
+    parser.add_argument("-n", "--requests", type=int, default=2000, help="total requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--unique", type=int, default=200, help="distinct chords in the request mix")
+    parser.add_argument("-f", "--format", choices=("svg", "png"), default="png")
+    parser.add_argument("--scale", type=float, default=1.0, help="PNG scale")
+    parser.add_argument("--revalidate", action="store_true", help="send If-None-Match for chords already seen")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="render processes of the started instance")
+    parser.add_argument("-o", "--output", default=None, help="write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    bodies = [json.dumps(chord.to_dict()).encode("utf-8") for chord in corpus(args.unique)]
+    process = None
+    url = args.url
+    try:
+        if url is None:
+            process, url = start_server(args.workers)
+        result = run_load(url, args.requests, args.concurrency, bodies, args.format, args.scale, args.revalidate)
+        connection = http.client.HTTPConnection(urlsplit(url).hostname, urlsplit(url).port, timeout=5)
+        connection.request("GET", "/stats")
+        server_stats = json.loads(connection.getresponse().read())
+    except Exception as e:
+        print(f"Error load testing {url}: {e}")
+        return 1
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    summary = summarize(result)
+    summary["server"] = server_stats
+    print(f"{summary['requests']} requests ({args.unique} distinct {args.format}) from {args.concurrency} clients in {result['elapsed_s']:.2f}s")
+    print(f"  throughput  {summary['throughput_rps']:10.1f} req/s")
+    if result["latencies_s"]:
+        print(f"  latency     p50 {summary['p50_ms']:.2f} ms  p90 {summary['p90_ms']:.2f} ms  p99 {summary['p99_ms']:.2f} ms  max {summary['max_ms']:.2f} ms")
+    print(f"  statuses    {summary['statuses']}  client errors {summary['errors']}")
+    print(f"  server      {server_stats['renders']} renders, {server_stats['cache_hits']} cache hits, {server_stats['shared']} shared, {server_stats['not_modified']} not modified")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary["errors"] or any(not status.startswith(("2", "3")) for status in summary["statuses"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+'''
+Headless batch renderer: reads chord definitions in the Chord.__init__ shape and writes SVG/PNG files.
+
+    python -m lib.batch_render chords.json -o out --format svg png --workers 8
+
+JSON/YAML input is a list of definitions (or {"chords": [...]}), e.g.
+    {"num_strings": 6, "title": "F", "notes": [[5, 3], [4, 3]], "barres": [[1, 1, 2]], "mute": [3]}
+CSV input has the columns num_strings,title,starting_fret,notes,barres,mute where
+    notes: "5:3 4:3" (string:fret), barres: "1:1:6" (fret:start:end), mute: "3 6"
+'''
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import lib.chord_diagram_gen as cg
+
+FORMATS = ("svg", "png")
+
+def parse_tuples(cell):
+    cell = (cell or "").strip()
+    if not cell:
+        return []
+    if cell.startswith("["):
+        return [tuple(value) for value in json.loads(cell)]
+    return [tuple(int(part) for part in token.split(":")) for token in cell.replace(";", " ").split()]
+
+def parse_csv_row(row):
+    definition = {
+        "num_strings": int(row["num_strings"]),
+        "title": row.get("title") or "",
+        "starting_fret": int(row.get("starting_fret") or 1),
+        "notes": parse_tuples(row.get("notes")),
+        "barres": parse_tuples(row.get("barres")),
+        "mute": [value[0] for value in parse_tuples(row.get("mute"))]
+    }
+    if row.get("params"):
+        definition["params"] = json.loads(row["params"])
+    return definition
+
+def read_definitions(path):
+    '''
+    Reads chord definitions from a .json, .csv, .yaml or .yml file
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline="") as f:
+        if extension == ".csv":
+            return [parse_csv_row(row) for row in csv.DictReader(f)]
+        if extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Reading YAML needs PyYAML (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        elif extension == ".json":
+            data = json.load(f)
+        else:
+            raise ValueError(f"Unsupported chord definition file: {path}")
+    if isinstance(data, dict):
+        data = data.get("chords", [])
+    return data
+
+def chord_title(definition):
+    '''
+    returns: the title a definition is drawn and named with, cg.DEFAULT_TITLE when it is blank
+    '''
+    title = definition.get("title") if isinstance(definition, dict) else None
+    title = "" if title is None else str(title)
+    return title if title.strip() else cg.DEFAULT_TITLE
+
+def file_names(definitions):
+    '''
+    Picks an output file name (without extension) per definition, from its chord_title. Repeated names
+    (compared case-insensitively, as on Windows/macOS) get a "-2", "-3", ... suffix,
+    so parallel workers never write over each other's files.
+    returns: [name per definition]
+    '''
+    names = []
+    taken = set()
+    for definition in definitions:
+        base = cg.safe_filename(chord_title(definition))
+        name = base
+        suffix = 2
+        while name.lower() in taken:
+            name = f"{base}-{suffix}"
+            suffix += 1
+        taken.add(name.lower())
+        names.append(name)
+    return names
+
+def render_definition(definition, out_dir, formats, scale = 1.0, backend = None, compact = True, name = None):
+    '''
+    Renders one chord definition; runs in a worker process
+    inputs: name, the output file name without extension (default: from the title)
+    returns: (title, [written paths])
+    '''
+    import lib.render as render
+    chord = cg.Chord.from_dict(dict(definition, title=chord_title(definition)))
+    base_path = os.path.join(out_dir, name or file_names([definition])[0])
+    written = []
+    if "svg" in formats:
+        chord.create_image(f"{base_path}.svg", compact=compact)
+        written.append(f"{base_path}.svg")
+    if "png" in formats:
+        render.render_chord(chord, scale, backend or render.DEFAULT_BACKEND).save(f"{base_path}.png")
+        written.append(f"{base_path}.png")
+    return chord.title, written
+
+def render_batch(definitions, out_dir, formats = FORMATS, workers = None, scale = 1.0, backend = None, log = print, compact = True):
+    '''
+    Renders definitions on a process pool. A failing chord is reported and skipped, never aborting the batch.
+    returns: (number rendered, [(index, title, error), ...], elapsed seconds)
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    errors = []
+    rendered = 0
+    start = time.perf_counter()
+    names = file_names(definitions)
+    for index, (definition, name) in enumerate(zip(definitions, names)):
+        if name != cg.safe_filename(chord_title(definition)):
+            log(f"Chord #{index} {chord_title(definition)!r} is written as {name!r} to avoid a name collision")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(render_definition, definition, out_dir, tuple(formats), scale, backend, compact, name): index
+            for index, (definition, name) in enumerate(zip(definitions, names))
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                future.result()
+                rendered += 1
+            except Exception as e:
+                title = definitions[index].get("title", "") if isinstance(definitions[index], dict) else ""
+                errors.append((index, title, e))
+                log(f"Error rendering chord #{index} {title!r}: {e}")
+    return rendered, errors, time.perf_counter() - start
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Render chord diagrams from JSON/CSV/YAML definitions without the GUI")
+    parser.add_argument("inputs", nargs="+", help="chord definition files (.json, .csv, .yaml)")
+    parser.add_argument("-o", "--output", default="./out", help="output directory")
+    parser.add_argument("-f", "--format", nargs="+", choices=FORMATS, default=["svg"], help="output formats")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: cpu count)")
+    parser.add_argument("--scale", type=float, default=1.0, help="PNG render scale")
+    parser.add_argument("--backend", choices=("raster", "svg"), default=None, help="PNG render backend")
+    parser.add_argument("--full-svg", action="store_true", help="write every shape in full instead of compact SVGs")
+    args = parser.parse_args(argv)
+
+    definitions = []
+    for path in args.inputs:
+        try:
+            definitions.extend(read_definitions(path))
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+
+    rendered, errors, elapsed = render_batch(definitions, args.output, args.format, args.workers, args.scale, args.backend, compact=not args.full_svg)
+    rate = rendered / elapsed if elapsed > 0 else 0
+    print(f"Rendered {rendered}/{len(definitions)} chords ({len(errors)} failed) in {elapsed:.2f}s: {rate:.1f} chords/s")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,45 @@
+import hashlib
+import html
+import json
+import re
 import sys
-import svgwrite
+import lib.instrument as instrument
 
 TITLE_PADDING = 15
+# drawn (and used as the file name) for chords without a title
+DEFAULT_TITLE = "test"
+# Prefix of the <desc> text that carries the chord definition inside saved SVGs
+DEFINITION_PREFIX = "rechord:"
+DEFINITION_PATTERN = re.compile(r"<desc>" + re.escape(DEFINITION_PREFIX) + r"(.*?)</desc>", re.DOTALL)
+# Decimal places kept for coordinates in compact SVGs
+COMPACT_PRECISION = 2
+
+def safe_filename(title):
+    '''
+    Replaces the characters a chord name may contain (e.g. "C/G") that are not allowed in file names
+    '''
+    return "".join("_" if char in '/\\:*?"<>|' else char for char in title)
+
+def compact_number(value):
+    return f"{round(value, COMPACT_PRECISION):g}"
+
+def rect_path(x, y, width, height):
+    return f"M{compact_number(x)} {compact_number(y)}h{compact_number(width)}v{compact_number(height)}h{compact_number(-width)}z"
+
+def read_definition(svg):
+    '''
+    Returns the chord definition embedded in an SVG written by Chord.create_image,
+    or None for SVGs without one (e.g. made by older versions)
+    '''
+    if isinstance(svg, bytes):
+        svg = svg.decode("utf-8")
+    match = DEFINITION_PATTERN.search(svg)
+    if match is None:
+        return None
+    try:
+        return json.loads(html.unescape(match.group(1)))
+    except ValueError:
+        return None
 
 class Chord:
     '''
@@ -79,7 +117,7 @@ class Chord:
     @title.setter
     def title(self, value):
         if value == "":
-            self._title = "test"
+            self._title = DEFAULT_TITLE
         else:
             self._title = value 
 
@@ -115,6 +153,35 @@ class Chord:
         self._params["line_thickness"] = value.get("line_thickness") or 3
         self._params["top_line_thickness"] = value.get("top_line_thickness") or 10 if self._params["line_thickness"] < 5 else 3 * self._params["line_thickness"]
 
+    def to_dict(self):
+        '''
+        Returns the chord definition in the same shape Chord.__init__ takes (JSON friendly)
+        '''
+        return {
+            "num_strings": self.num_strings,
+            "title": self.title,
+            "starting_fret": self.starting_fret,
+            "notes": [list(note) for note in self.notes],
+            "barres": [list(barre) for barre in self.barres],
+            "mute": list(self.muted_strings),
+            "params": dict(self.params)
+        }
+
+    @classmethod
+    def from_dict(cls, definition: dict):
+        '''
+        Builds a Chord from a definition dict as produced by to_dict (lists or tuples accepted)
+        '''
+        return cls(
+            int(definition["num_strings"]),
+            title = definition.get("title", ""),
+            starting_fret = int(definition.get("starting_fret", 1)),
+            notes = [tuple(note) for note in definition.get("notes", [])],
+            barres = [tuple(barre) for barre in definition.get("barres", [])],
+            mute = list(definition.get("mute", [])),
+            params = dict(definition.get("params", {}))
+        )
+
     def get_max_fret_distance(self):
         min_fret = 101
         max_fret = -1
@@ -143,34 +210,7 @@ class Chord:
                 to_ret.discard(muted)
         return to_ret
 
-    def draw_mute_symbol(self, chord_svg, string_number):
-        index = abs(self.num_strings - string_number)
-        y_start = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] / 2
-        center = (self.params["padding"] + index * (self.params["string_spacing"] + self.params["line_thickness"]) + self.params["line_thickness"] / 2, y_start)
-        chord_svg.add(chord_svg.line(
-            start = (center[0] - self.params["markers_spacing"] / 3, center[1] - self.params["markers_spacing"] / 3),
-            end = (center[0] + self.params["markers_spacing"] / 3, center[1] + self.params["markers_spacing"] / 3),
-            stroke_width = self.params["line_thickness"],
-            stroke = "black"
-        ))
-        chord_svg.add(chord_svg.line(
-            start = (center[0] + self.params["markers_spacing"] / 3, center[1] - self.params["markers_spacing"] / 3),
-            end = (center[0] - self.params["markers_spacing"] / 3, center[1] + self.params["markers_spacing"] / 3),
-            stroke_width = self.params["line_thickness"],
-            stroke = "black"
-        ))
-
-    def draw_note(self, chord_svg, string, fret):
-        string_index = abs(self.num_strings - string)
-        fret_index = fret - self.starting_fret
-        x_pos = self.params["padding"] + string_index * (self.params["string_spacing"] + self.params["line_thickness"]) + self.params["line_thickness"] / 2
-        y_pos = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] + self.params["top_line_thickness"] + fret_index * (self.params["line_thickness"] + self.params["fret_spacing"]) + self.params["fret_spacing"] / 2
-        chord_svg.add(chord_svg.circle(
-            center = (x_pos, y_pos),
-            r = self.params["markers_spacing"] / 2.5 / 1.75
-        ))
-        
-    def create_image(self):
+    def get_size(self):
         num_frets = max(4, self.get_max_fret_distance())
         diagram_width = (self.num_strings - 1) * self.params["string_spacing"] + self.num_strings * self.params["line_thickness"]
         diagram_height = num_frets * self.params["fret_spacing"] + (num_frets - 1) * self.params["line_thickness"] + self.params["top_line_thickness"]
@@ -178,107 +218,282 @@ class Chord:
         if self._title == "":
             height = 2 * self.params["padding"] + diagram_height + self._params["markers_spacing"]
         width =  2 * self.params["padding"] + diagram_width 
+        return width, height
 
-        chord_svg = svgwrite.Drawing(f"./tmp/svg/{self.title}.svg", (width, height))
-        
-        # White Canvas
-        chord_svg.add(chord_svg.rect(insert = (0, 0), size = (width, height), fill = "white", stroke = "white"))
-        
-        # Top Line (Rectangle)
-        chord_svg.add(chord_svg.rect(
-            insert = (self.params["padding"], self.params["padding"] + TITLE_PADDING + self.params["markers_spacing"]),
-            size = (diagram_width, self.params["top_line_thickness"]),
-            stroke = "black",
-            fill = "black",
-            stroke_width = 0
-        ))
-        
-        # Strings
+    def marker_center(self, string_number):
+        # center of the open/mute marker above a string
+        index = abs(self.num_strings - string_number)
+        y_start = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] / 2
+        return (self.params["padding"] + index * (self.params["string_spacing"] + self.params["line_thickness"]) + self.params["line_thickness"] / 2, y_start)
+
+    def grid_rects(self):
+        '''
+        Returns the top line, string and fret rectangles of the diagram as (x, y, width, height)
+        '''
+        num_frets = max(4, self.get_max_fret_distance())
+        diagram_width = (self.num_strings - 1) * self.params["string_spacing"] + self.num_strings * self.params["line_thickness"]
+        diagram_height = num_frets * self.params["fret_spacing"] + (num_frets - 1) * self.params["line_thickness"] + self.params["top_line_thickness"]
+        top = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"]
+        rects = [(self.params["padding"], top, diagram_width, self.params["top_line_thickness"])]
         for string in range(self.num_strings):
             x_offset = string * self.params["string_spacing"] + string * self.params["line_thickness"]
-            chord_svg.add(chord_svg.rect(
-                insert = (x_offset + self.params["padding"], TITLE_PADDING + self.params["padding"] + self._params["markers_spacing"]),
-                size = (self.params["line_thickness"], diagram_height),
-                stroke_width = 0,
-                stroke = "black",
-                fill = "black"
-                )
-            )
-
-        # Frets
+            rects.append((x_offset + self.params["padding"], top, self.params["line_thickness"], diagram_height))
         for fret in range(num_frets):
-            y_offset = TITLE_PADDING + self.params["padding"] + self._params["markers_spacing"] + self.params["top_line_thickness"] + self.params["fret_spacing"] + fret * (self.params["line_thickness"] + self.params["fret_spacing"])
-            chord_svg.add(chord_svg.rect(
-                insert = (self.params["padding"], y_offset),
-                size = (diagram_width,self.params["line_thickness"]),
-                stroke_width = 0,
-                stroke = "black",
-                fill = "black"
-            ))
+            y_offset = top + self.params["top_line_thickness"] + self.params["fret_spacing"] + fret * (self.params["line_thickness"] + self.params["fret_spacing"])
+            rects.append((self.params["padding"], y_offset, diagram_width, self.params["line_thickness"]))
+        return rects
+
+    def barre_line(self, barre):
+        # start and end of the line joining a barre's end notes
+        total_top_padding = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] + self.params["top_line_thickness"]
+        fret_index = barre[0] - self.starting_fret
+        y_offset = total_top_padding + fret_index * (self.params["fret_spacing"] + self.params["line_thickness"]) + self.params["fret_spacing"] / 2
+        ending_index = self.num_strings - barre[1]
+        starting_index = self.num_strings - barre[2]
+        return (
+            (self.params["padding"] + starting_index * (self.params["string_spacing"] + self.params["line_thickness"]), y_offset),
+            (self.params["padding"] + ending_index * (self.params["string_spacing"] + self.params["line_thickness"]) + self.params["line_thickness"], y_offset)
+        )
+
+    def starting_fret_insert(self):
+        diagram_width = (self.num_strings - 1) * self.params["string_spacing"] + self.num_strings * self.params["line_thickness"]
+        total_top_padding = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] + self.params["top_line_thickness"]
+        return (self.params["padding"] + diagram_width + self.params["fret_spacing"] / 4, total_top_padding + self.params["fret_spacing"] / 1.5)
+
+    def mute_symbol_shapes(self, string_number):
+        center = self.marker_center(string_number)
+        return [
+            {
+                "type": "line",
+                "start": (center[0] - self.params["markers_spacing"] / 3, center[1] - self.params["markers_spacing"] / 3),
+                "end": (center[0] + self.params["markers_spacing"] / 3, center[1] + self.params["markers_spacing"] / 3),
+                "stroke_width": self.params["line_thickness"],
+                "stroke": "black"
+            },
+            {
+                "type": "line",
+                "start": (center[0] + self.params["markers_spacing"] / 3, center[1] - self.params["markers_spacing"] / 3),
+                "end": (center[0] - self.params["markers_spacing"] / 3, center[1] + self.params["markers_spacing"] / 3),
+                "stroke_width": self.params["line_thickness"],
+                "stroke": "black"
+            }
+        ]
+
+    def note_shape(self, string, fret):
+        string_index = abs(self.num_strings - string)
+        fret_index = fret - self.starting_fret
+        x_pos = self.params["padding"] + string_index * (self.params["string_spacing"] + self.params["line_thickness"]) + self.params["line_thickness"] / 2
+        y_pos = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] + self.params["top_line_thickness"] + fret_index * (self.params["line_thickness"] + self.params["fret_spacing"]) + self.params["fret_spacing"] / 2
+        return {
+            "type": "circle",
+            "center": (x_pos, y_pos),
+            "r": self.params["markers_spacing"] / 2.5 / 1.75
+        }
+
+    def get_shapes(self):
+        '''
+        Computes the geometry of the diagram as a list of backend independent shapes, in paint order.
+        Each shape is a dict with a "type" (rect, circle, line, text) and the keyword arguments
+        svgwrite expects for that element. Circles without a fill are black.
+        '''
+        width, height = self.get_size()
+        shapes = []
+
+        # White Canvas
+        shapes.append({"type": "rect", "insert": (0, 0), "size": (width, height), "fill": "white", "stroke": "white"})
+
+        # Top Line, Strings and Frets (Rectangles)
+        for x, y, rect_width, rect_height in self.grid_rects():
+            shapes.append({
+                "type": "rect",
+                "insert": (x, y),
+                "size": (rect_width, rect_height),
+                "stroke_width": 0,
+                "stroke": "black",
+                "fill": "black"
+            })
 
         # Open String Symbols
         for open_string in self.get_open_strings():
-            index = abs(self.num_strings - open_string)
-            y_start = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] / 2
-            chord_svg.add(chord_svg.circle(
-                center = (self.params["padding"] + index * (self.params["string_spacing"] + self.params["line_thickness"]) + self.params["line_thickness"] / 2, y_start),
-                r = self.params["markers_spacing"] / 3
-            ))
-            chord_svg.add(chord_svg.circle(
-                center = (self.params["padding"] + index * (self.params["string_spacing"] + self.params["line_thickness"]) + self.params["line_thickness"] / 2, y_start),
-                r = self.params["markers_spacing"] / 3 - self.params["line_thickness"],
-                fill = "white"
-            ))
+            center = self.marker_center(open_string)
+            shapes.append({
+                "type": "circle",
+                "center": center,
+                "r": self.params["markers_spacing"] / 3
+            })
+            shapes.append({
+                "type": "circle",
+                "center": center,
+                "r": self.params["markers_spacing"] / 3 - self.params["line_thickness"],
+                "fill": "white"
+            })
 
         # Mute Symbols
         for muted_string in self.muted_strings:
-            self.draw_mute_symbol(chord_svg, muted_string)
+            shapes.extend(self.mute_symbol_shapes(muted_string))
         
 
         # Barre Chord
         for barre in self.barres:
-            total_top_padding = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] + self.params["top_line_thickness"]
-            fret_index = barre[0] - self.starting_fret
-            y_offset = total_top_padding + fret_index * (self.params["fret_spacing"] + self.params["line_thickness"]) + self.params["fret_spacing"] / 2
-            ending_index = self.num_strings - barre[1]
-            starting_index = self.num_strings - barre[2]
-            chord_svg.add(chord_svg.line(
-                start = (self.params["padding"] + starting_index * (self.params["string_spacing"] + self.params["line_thickness"]), y_offset),
-                end = (self.params["padding"] + ending_index * (self.params["string_spacing"] + self.params["line_thickness"]) + self.params["line_thickness"], y_offset),
-                stroke_width = self.params["fret_spacing"] / 2.5,
-                stroke = "black"
-            ))
-            self.draw_note(chord_svg, barre[1], barre[0])
-            self.draw_note(chord_svg, barre[2], barre[0])
+            start, end = self.barre_line(barre)
+            shapes.append({
+                "type": "line",
+                "start": start,
+                "end": end,
+                "stroke_width": self.params["fret_spacing"] / 2.5,
+                "stroke": "black"
+            })
+            shapes.append(self.note_shape(barre[1], barre[0]))
+            shapes.append(self.note_shape(barre[2], barre[0]))
 
         # Notes
         for string, fret in self.notes:
-            self.draw_note(chord_svg, string, fret)
+            shapes.append(self.note_shape(string, fret))
 
         # Starting Fret
         if self.starting_fret != 1:
-            total_top_padding = TITLE_PADDING + self.params["padding"] + self.params["markers_spacing"] + self.params["top_line_thickness"]
-            y_start = total_top_padding + self.params["fret_spacing"] / 1.5
-            chord_svg.add(chord_svg.text(
-                text = self.starting_fret,
-                font_size = TITLE_PADDING,
-                font_family = "Helvetica",
-                insert=(self.params["padding"] + diagram_width + self.params["fret_spacing"] / 4, y_start),
-                text_anchor = "start"
-            ))
+            shapes.append({
+                "type": "text",
+                "text": self.starting_fret,
+                "font_size": TITLE_PADDING,
+                "font_family": "Helvetica",
+                "insert": self.starting_fret_insert(),
+                "text_anchor": "start"
+            })
  
         # Title
         title_y_offset = self.params["padding"] + TITLE_PADDING / 1.5
-        chord_svg.add(chord_svg.text(
-            text = self.title,
-            font_size = TITLE_PADDING * 1.5,
-            font_family = "Helvetica",
-            insert=(width / 2, title_y_offset),
-            text_anchor = "middle"
+        shapes.append({
+            "type": "text",
+            "text": self.title,
+            "font_size": TITLE_PADDING * 1.5,
+            "font_family": "Helvetica",
+            "insert": (width / 2, title_y_offset),
+            "text_anchor": "middle"
+        })
+
+        return shapes
+
+    def grid_symbol_id(self):
+        # depends on everything that shapes the grid, so diagrams in one document can share it
+        num_frets = max(4, self.get_max_fret_distance())
+        params = hashlib.sha1(json.dumps(self.params, sort_keys=True).encode("utf-8")).hexdigest()[:6]
+        return f"grid-{self.num_strings}x{num_frets}-{params}"
+
+    def add_compact_elements(self, drawing, parent, defined=None):
+        '''
+        Adds the diagram to parent (the drawing or a group in it) as a minimal set of elements:
+        the top line, strings and frets as one path and each open string marker as one ring.
+        When several diagrams share a document, pass the same defined set to each call: the grid path
+        then becomes a <symbol> in drawing.defs, written once per shape and instanced with <use>
+        inputs:
+            defined: set of symbol ids already in drawing.defs, updated in place (None inlines the grid)
+        '''
+        width, height = self.get_size()
+        markers_spacing = self.params["markers_spacing"]
+        line_thickness = self.params["line_thickness"]
+        marker_width = compact_number(line_thickness)
+
+        parent.add(drawing.rect(size=(compact_number(width), compact_number(height)), fill="white"))
+
+        grid = drawing.path(d="".join(rect_path(*rect) for rect in self.grid_rects()))
+        if defined is None:
+            parent.add(grid)
+        else:
+            symbol_id = self.grid_symbol_id()
+            if symbol_id not in defined:
+                symbol = drawing.symbol(id=symbol_id, overflow="visible")
+                symbol.add(grid)
+                drawing.defs.add(symbol)
+                defined.add(symbol_id)
+            parent.add(drawing.use(f"#{symbol_id}"))
+
+        # a stroked circle covers the same band as the black circle with a white one on top
+        ring_radius = compact_number(markers_spacing / 3 - line_thickness / 2)
+        for open_string in self.get_open_strings():
+            x, y = self.marker_center(open_string)
+            parent.add(drawing.circle((compact_number(x), compact_number(y)), ring_radius, fill="white", stroke="black", stroke_width=marker_width))
+
+        arm = markers_spacing / 3
+        for muted_string in self.muted_strings:
+            x, y = self.marker_center(muted_string)
+            cross = f"M{compact_number(x - arm)} {compact_number(y - arm)}L{compact_number(x + arm)} {compact_number(y + arm)}M{compact_number(x + arm)} {compact_number(y - arm)}L{compact_number(x - arm)} {compact_number(y + arm)}"
+            parent.add(drawing.path(d=cross, stroke="black", stroke_width=marker_width))
+
+        notes = []
+        for barre in self.barres:
+            (x1, y1), (x2, y2) = self.barre_line(barre)
+            parent.add(drawing.line(
+                (compact_number(x1), compact_number(y1)), (compact_number(x2), compact_number(y2)),
+                stroke="black", stroke_width=compact_number(self.params["fret_spacing"] / 2.5)
+            ))
+            notes.extend(((barre[1], barre[0]), (barre[2], barre[0])))
+        notes.extend(self.notes)
+        dot_radius = compact_number(markers_spacing / 2.5 / 1.75)
+        for string, fret in notes:
+            x, y = self.note_shape(string, fret)["center"]
+            parent.add(drawing.circle((compact_number(x), compact_number(y)), dot_radius))
+
+        if self.starting_fret != 1:
+            x, y = self.starting_fret_insert()
+            parent.add(drawing.text(str(self.starting_fret), insert=(compact_number(x), compact_number(y)), font_size=TITLE_PADDING, font_family="Helvetica"))
+
+        title_y_offset = self.params["padding"] + TITLE_PADDING / 1.5
+        parent.add(drawing.text(
+            self.title, insert=(compact_number(width / 2), compact_number(title_y_offset)),
+            font_size=compact_number(TITLE_PADDING * 1.5), font_family="Helvetica", text_anchor="middle"
         ))
 
-        chord_svg.save()
+    def get_drawing(self, filename=None, compact=True):
+        '''
+        Builds the chord diagram as an in-memory svgwrite Drawing.
+        Nothing is written to disk until the drawing is saved.
+        compact (the default) writes the minimal elements of add_compact_elements with rounded
+        coordinates, otherwise every shape is written in full; both render the same
+        '''
+        # svgwrite is slow to import and only needed to build documents, not to work with chord definitions
+        import svgwrite
+
+        if filename is None:
+            filename = f"./tmp/svg/{safe_filename(self.title)}.svg"
+        if compact:
+            chord_svg = svgwrite.Drawing(filename, self.get_size(), debug=False)
+            chord_svg.set_desc(desc = DEFINITION_PREFIX + json.dumps(self.to_dict(), separators=(",", ":")))
+            self.add_compact_elements(chord_svg, chord_svg)
+            return chord_svg
+
+        chord_svg = svgwrite.Drawing(filename, self.get_size())
+        chord_svg.set_desc(desc = DEFINITION_PREFIX + json.dumps(self.to_dict()))
+
+        for shape in self.get_shapes():
+            attributes = dict(shape)
+            element = getattr(chord_svg, attributes.pop("type"))
+            chord_svg.add(element(**attributes))
+
+        return chord_svg
+
+    def to_svg(self, compact=True):
+        '''
+        Returns the SVG document as a string without touching the disk
+        '''
+        with instrument.stage("svg.build"):
+            chord_svg = self.get_drawing(compact=compact)
+        with instrument.stage("svg.serialize"):
+            return chord_svg.tostring()
 
+    def create_image(self, filename=None, library=None, compact=True):
+        '''
+        Writes the chord diagram to ./tmp/svg/<title>.svg (or filename)
+        and records it in library (a lib.library.ChordLibrary) when given
+        '''
+        with instrument.stage("svg.build"):
+            chord_svg = self.get_drawing(filename, compact)
+        with instrument.stage("svg.serialize+write"):
+            chord_svg.save()
+        if library is not None:
+            with instrument.stage("library.record"):
+                library.record_svg(chord_svg.filename)
+        return chord_svg
 
 
 
@@ -0,0 +1,320 @@
+'''
+ChordPro songbook pipeline: one chord sheet per song, with a diagram for every chord the song uses.
+
+    python -m lib.chordpro songs/ -o sheets/ --format pdf
+
+Songs (.cho, .chopro, .chordpro, .crd, .pro) are read line by line for their [Am]-style inline chords.
+Each distinct chord name is resolved once: to the library diagram of that name, or else to the best
+generated voicing (lib.voicings). Library diagrams without an embedded definition are drawn from their SVG.
+Generated voicings are rendered into ./tmp/svg once, in parallel, and added to the library, so later runs
+find them there; a file already there under that name is never overwritten. Songs are processed in batches as they are found,
+so memory stays bounded by the batch and the distinct chord names however big the archive is, and a
+song whose file, options and chord diagrams are unchanged since the last run is skipped (tracked in a
+small SQLite file in the output directory).
+'''
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import lib.chord_diagram_gen as cg
+import lib.theory as theory
+import lib.voicings as voicings
+from lib.raster_cache import definition_hash
+
+EXTENSIONS = (".cho", ".chopro", ".chordpro", ".crd", ".pro")
+# [Am], [C/G], [Bbmaj7]; "[*...]" are annotations, not chords
+CHORD_PATTERN = re.compile(r"\[([^\]\s*][^\]]*)\]")
+DIRECTIVE_PATTERN = re.compile(r"^\s*\{\s*(\w+)\s*(?::\s*(.*?))?\s*\}\s*$")
+TITLE_DIRECTIVES = ("title", "t")
+# "no chord" markings, which have no diagram
+NO_CHORD = {"N.C.", "N.C", "NC"}
+# songs read, resolved and written together; memory use is bounded by this many songs
+SONG_BATCH = 200
+MANIFEST_NAME = ".rechord_songs.db"
+
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    options TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    -- {chord name: hash of the definition it was drawn with, or null}
+    chords TEXT NOT NULL
+);
+"""
+
+def iter_songs(directory, extensions = EXTENSIONS):
+    '''
+    Yields the paths of the ChordPro files under directory, in sorted order, without listing the whole tree first
+    '''
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                yield os.path.join(root, name)
+
+def scan_song(path):
+    '''
+    Reads a ChordPro file line by line
+    returns: (title, [distinct chord names in order of first use])
+    '''
+    title = None
+    chords = {}
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            directive = DIRECTIVE_PATTERN.match(line)
+            if directive is not None:
+                if title is None and directive.group(1).lower() in TITLE_DIRECTIVES:
+                    title = directive.group(2)
+                continue
+            for match in CHORD_PATTERN.finditer(line):
+                name = match.group(1).strip()
+                if name not in NO_CHORD:
+                    chords.setdefault(name, None)
+    if not title:
+        title = os.path.splitext(os.path.basename(path))[0]
+    return title, list(chords)
+
+class ChordResolver:
+    '''
+    Resolves chord names to definitions, each name once: the library diagram of that name (or of its
+    canonical spelling, "A#m" -> "Bbm"), else the best voicing from lib.voicings
+    inputs:
+        library: lib.library.ChordLibrary or None
+        num_strings: int (for generated voicings)
+    '''
+    def __init__(self, library = None, num_strings: int = 6):
+        self.library = library
+        self.num_strings = num_strings
+        # name -> (definition or None, source: "library", "generated" or the error)
+        self.resolved = {}
+        # name -> library record, for library chords without an embedded definition (drawn from their SVG)
+        self.svg_records = {}
+
+    def names(self, name):
+        yield name
+        try:
+            canonical = theory.chord_name(*theory.parse_chord_name(name))
+        except ValueError:
+            return
+        if canonical != name:
+            yield canonical
+
+    def resolve(self, name):
+        '''
+        returns: (definition or None, source)
+        '''
+        if name not in self.resolved:
+            self.resolved[name] = self._resolve(name)
+        return self.resolved[name]
+
+    def _resolve(self, name):
+        if self.library is not None:
+            for candidate in self.names(name):
+                record = self.library.get(cg.safe_filename(candidate))
+                if record is None:
+                    continue
+                if record["definition"]:
+                    return dict(record["definition"], title=name), "library"
+                # e.g. drawn before definitions were embedded
+                self.svg_records[name] = record
+                return None, "library"
+        try:
+            return voicings.best_voicing(name, self.num_strings).to_chord(name).to_dict(), "generated"
+        except ValueError as e:
+            return None, str(e)
+
+    def svg(self, name):
+        '''
+        returns: the SVG of a library chord that resolved without a definition
+        '''
+        return self.library.read_svg(self.svg_records[name]["filename"])
+
+    def chord_hash(self, name):
+        '''
+        returns: the definition_hash of what name resolves to, the content_hash of the SVG it is drawn
+        from when it has no definition (None when it doesn't resolve)
+        '''
+        definition, _ = self.resolve(name)
+        if definition is not None:
+            return definition_hash(definition)
+        record = self.svg_records.get(name)
+        return record["content_hash"] if record is not None else None
+
+    def counts(self):
+        sources = [source if source in ("library", "generated") else "unresolved" for _, source in self.resolved.values()]
+        return {source: sources.count(source) for source in ("library", "generated", "unresolved")}
+
+class SongManifest:
+    '''
+    What was last written for each song, so unchanged songs are skipped on the next run
+    '''
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(MANIFEST_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def is_current(self, path, stat, options, chord_hash):
+        '''
+        Whether the sheet written last time still stands: the song file and options are the same, and every
+        chord still resolves to the diagram it was drawn with
+        inputs:
+            chord_hash: function of a chord name (ChordResolver.chord_hash)
+        '''
+        row = self.connection.execute("SELECT mtime, size, options, sheet, chords FROM songs WHERE path = ?", (path,)).fetchone()
+        if row is None or (row["mtime"], row["size"], row["options"]) != (stat.st_mtime, stat.st_size, options):
+            return False
+        if not os.path.exists(row["sheet"]):
+            return False
+        chords = json.loads(row["chords"])
+        return isinstance(chords, dict) and all(chord_hash(name) == drawn for name, drawn in chords.items())
+
+    def record(self, path, stat, options, sheet, chords):
+        # chords: {name: chord hash}
+        self.connection.execute(
+            "INSERT OR REPLACE INTO songs (path, mtime, size, options, sheet, chords) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, stat.st_mtime, stat.st_size, options, sheet, json.dumps(chords))
+        )
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def build_songbook(song_dir, out_dir, format = "pdf", width: int = 800, resolver = None, workers: int = None,
+                   svg_dir: str = './tmp/svg', force: bool = False, log = print):
+    '''
+    Writes a chord sheet for every ChordPro song under song_dir to the same relative path under out_dir
+    inputs:
+        format: "svg", "png" or "pdf" (see lib.sheet_export)
+        resolver: ChordResolver (its library gets the generated voicings)
+        force: rewrite every sheet, even for unchanged songs
+    returns: {"songs", "written", "skipped", "failed", "rendered", and the resolver counts}
+    '''
+    from lib.batch_render import render_batch
+    from lib.sheet_export import export_format, export_sheet
+
+    format = export_format(f"sheet.{format}")
+    resolver = resolver or ChordResolver()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = SongManifest(os.path.join(out_dir, MANIFEST_NAME))
+    options = json.dumps({"format": format, "width": width, "strings": resolver.num_strings})
+    stats = {"songs": 0, "written": 0, "skipped": 0, "failed": 0, "rendered": 0}
+    # chord names already resolved (and rendered or reported) by an earlier batch
+    seen = set()
+    # PNG sheets, and library chords drawn from their SVG, are pasted from the raster cache, so every distinct chord is rasterized once
+    raster_cache = None
+
+    try:
+        for batch in batches(iter_songs(song_dir), SONG_BATCH):
+            songs = []
+            for path in batch:
+                stats["songs"] += 1
+                try:
+                    # a song can disappear between the walk and here
+                    stat = os.stat(path)
+                    if not force and manifest.is_current(path, stat, options, resolver.chord_hash):
+                        stats["skipped"] += 1
+                        continue
+                    title, names = scan_song(path)
+                except OSError as e:
+                    log(f"Error reading {path}: {e}")
+                    stats["failed"] += 1
+                    continue
+                songs.append((path, stat, title, names))
+
+            # every chord this batch uses for the first time is resolved, and generated ones rendered together
+            missing = {}
+            for _, _, _, names in songs:
+                for name in names:
+                    if name in seen:
+                        continue
+                    seen.add(name)
+                    definition, source = resolver.resolve(name)
+                    if source == "generated":
+                        # a diagram the library doesn't know (yet) is never replaced; the sheet still gets the voicing
+                        if not os.path.exists(os.path.join(svg_dir, cg.safe_filename(name) + ".svg")):
+                            missing[name] = definition
+                    elif definition is None and source != "library":
+                        log(f"Error resolving chord {name}: {source}")
+            if missing:
+                count, _, _ = render_batch(list(missing.values()), svg_dir, ("svg",), workers, log=log)
+                stats["rendered"] += count
+                if resolver.library is not None:
+                    resolver.library.reconcile()
+
+            with manifest.connection:
+                for path, stat, title, names in songs:
+                    drawn = [name for name in names if resolver.resolve(name)[0] is not None or name in resolver.svg_records]
+                    definitions = [resolver.resolve(name)[0] for name in drawn]
+                    sheet = os.path.join(out_dir, os.path.splitext(os.path.relpath(path, song_dir))[0] + f".{format}")
+                    os.makedirs(os.path.dirname(sheet), exist_ok=True)
+
+                    def load_image(index):
+                        if definitions[index] is None:
+                            return raster_cache.rasterize(resolver.svg(drawn[index]))
+                        return raster_cache.render_chord(cg.Chord.from_dict(definitions[index]))
+
+                    try:
+                        if raster_cache is None and (format == "png" or None in definitions):
+                            from lib.raster_cache import RasterCache
+                            raster_cache = RasterCache()
+                        if format == "png":
+                            images = [load_image(index) for index in range(len(drawn))]
+                            export_sheet(sheet, [None] * len(images), width, images.__getitem__, [image.size for image in images], format)
+                        else:
+                            export_sheet(sheet, definitions, width, load_image, format=format)
+                    except Exception as e:
+                        log(f"Error writing the sheet of {title} ({path}): {e}")
+                        stats["failed"] += 1
+                        continue
+                    manifest.record(path, stat, options, sheet, {name: resolver.chord_hash(name) for name in names})
+                    stats["written"] += 1
+    finally:
+        manifest.close()
+    stats.update(resolver.counts())
+    return stats
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Write a chord sheet for every ChordPro song in a directory")
+    parser.add_argument("songs", help="directory of ChordPro files (searched recursively)")
+    parser.add_argument("-o", "--output", default="./sheets", help="directory to write the sheets to")
+    parser.add_argument("-f", "--format", choices=("svg", "png", "pdf"), default="pdf", help="sheet format")
+    parser.add_argument("--width", type=int, default=800, help="row width to wrap at, in pixels")
+    parser.add_argument("-s", "--strings", type=int, default=6, help="strings of generated voicings (default tuning)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="render worker processes")
+    parser.add_argument("--force", action="store_true", help="rewrite the sheets of unchanged songs too")
+    args = parser.parse_args(argv)
+
+    from lib.library import ChordLibrary
+    library = ChordLibrary()
+    # forced, to catch diagrams edited in place (which leave the directory mtime alone), so their songs are redrawn
+    library.reconcile(True)
+    start = time.perf_counter()
+    try:
+        stats = build_songbook(args.songs, args.output, args.format, args.width, ChordResolver(library, args.strings), args.workers, force=args.force)
+    finally:
+        library.close()
+    print(
+        f"{stats['songs']} songs: {stats['written']} sheets written, {stats['skipped']} unchanged, {stats['failed']} failed "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    print(f"Chords: {stats['library']} from the library, {stats['generated']} generated ({stats['rendered']} rendered), {stats['unresolved']} unresolved")
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+'''
+Chord identification from a fretted shape.
+
+    python -m lib.identify          # suggest names for every chord in the library
+'''
+import argparse
+import sys
+import lib.theory as theory
+
+def build_index():
+    '''
+    Maps a pitch class bitmask to every (root, quality, complete) that sounds it.
+    Chords of four or more notes are also indexed with the fifth left out (complete = False).
+    '''
+    index = {}
+    for root in range(12):
+        for quality, intervals in theory.CHORD_QUALITIES.items():
+            pitch_classes = theory.chord_pitch_classes(root, quality)
+            index.setdefault(mask_of(pitch_classes), []).append((root, quality, True))
+            if len(intervals) >= 4 and 7 in intervals:
+                without_fifth = pitch_classes - {(root + 7) % 12}
+                index.setdefault(mask_of(without_fifth), []).append((root, quality, False))
+    return index
+
+def mask_of(pitch_classes):
+    mask = 0
+    for pitch_class in pitch_classes:
+        mask |= 1 << pitch_class
+    return mask
+
+CHORD_INDEX = build_index()
+
+def chord_frets(chord):
+    '''
+    Returns the fret that sounds on each string of a Chord, from string 1:
+    None for muted, 0 for open, otherwise the highest fret held on the string
+    '''
+    held = {}
+    for string, fret in chord.notes:
+        held[string] = max(held.get(string, 0), fret)
+    for fret, starting_string, ending_string in chord.barres:
+        for string in range(starting_string, ending_string + 1):
+            held[string] = max(held.get(string, 0), fret)
+    muted = set(chord.muted_strings)
+    return [None if string in muted else held.get(string, 0) for string in range(1, chord.num_strings + 1)]
+
+def sounding_pitches(chord, tuning = None):
+    '''
+    Returns the MIDI pitch of every sounding string of a Chord, from string 1
+    '''
+    if tuning is None:
+        tuning = theory.default_tuning(chord.num_strings)
+    return [
+        tuning[string] + fret
+        for string, fret in enumerate(chord_frets(chord))
+        if fret is not None and string < len(tuning)
+    ]
+
+def identify_pitches(pitches, limit: int = 5):
+    '''
+    Suggests names for a set of sounding MIDI pitches, best first
+    '''
+    if not pitches:
+        return []
+    bass = min(pitches) % 12
+    pitch_classes = {pitch % 12 for pitch in pitches}
+
+    candidates = []
+    for root, quality, complete in CHORD_INDEX.get(mask_of(pitch_classes), []):
+        candidates.append((rank(root, quality, complete, bass, False), root, quality))
+    # a bass note outside the chord, e.g. C/B
+    if not candidates and len(pitch_classes) > 2:
+        for root, quality, complete in CHORD_INDEX.get(mask_of(pitch_classes - {bass}), []):
+            candidates.append((rank(root, quality, complete, bass, True), root, quality))
+
+    candidates.sort(key=lambda candidate: (candidate[0], candidate[1], candidate[2]))
+    names = []
+    for _, root, quality in candidates:
+        name = theory.chord_name(root, quality, bass)
+        if name not in names:
+            names.append(name)
+    return names[:limit]
+
+def rank(root, quality, complete, bass, foreign_bass):
+    score = len(theory.CHORD_QUALITIES[quality])
+    if root != bass:
+        score += 4
+    if not complete:
+        score += 2
+    if foreign_bass:
+        score += 6
+    return score
+
+def identify_chord(chord, tuning = None, limit: int = 5):
+    '''
+    Suggests names for a Chord, best first (empty when nothing sounds or nothing matches)
+    '''
+    return identify_pitches(sounding_pitches(chord, tuning), limit)
+
+def name_library(library, limit: int = 3):
+    '''
+    Bulk pass over a lib.library.ChordLibrary
+    returns: {chord name: [suggested names]} for every chord with a stored definition
+    '''
+    import lib.chord_diagram_gen as cg
+    suggestions = {}
+    for name in library.chord_names():
+        record = library.get(name)
+        if not record or not record["definition"]:
+            continue
+        try:
+            suggestions[name] = identify_chord(cg.Chord.from_dict(record["definition"]), limit=limit)
+        except ValueError as e:
+            print(f"Error identifying {name}: {e}")
+    return suggestions
+
+def main(argv = None):
+    from lib.library import ChordLibrary
+    parser = argparse.ArgumentParser(description="Suggest names for every chord in the library")
+    parser.add_argument("--limit", type=int, default=3, help="suggestions per chord")
+    args = parser.parse_args(argv)
+
+    library = ChordLibrary()
+    library.reconcile()
+    for name, names in name_library(library, args.limit).items():
+        print(f"{name}: {', '.join(names) if names else '?'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+'''
+Opt-in per-stage timing for the diagram pipeline.
+
+Set RECHORD_PROFILE=1 to enable it (or call enable()); the summary table is printed at exit
+and, when RECHORD_PROFILE_FILE is set, dumped there as JSON. When disabled, stage() hands back
+a shared no-op context manager and count() returns at once, so instrumented code pays one call.
+
+    with instrument.stage("render.svg2rlg"):
+        drawing = svg2rlg(...)
+    instrument.count("raster_cache.hit")
+'''
+import atexit
+import json
+import os
+import threading
+import time
+
+enabled = os.environ.get("RECHORD_PROFILE", "") not in ("", "0")
+
+_timings = {}
+_counters = {}
+_lock = threading.Lock()
+
+class NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_STAGE = NullStage()
+
+class Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+def stage(name: str):
+    return Stage(name) if enabled else NULL_STAGE
+
+def record(name: str, seconds: float):
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            _timings[name] = [1, seconds, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+def count(name: str, amount: int = 1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+def summary():
+    '''
+    returns: {"stages": {name: {count, total_s, mean_ms, max_ms}}, "counters": {...}, "hit_rates": {...}}
+    Hit rates are derived from counters named <prefix>.hit / <prefix>.disk_hit / <prefix>.miss
+    '''
+    with _lock:
+        stages = {
+            name: {"count": calls, "total_s": total, "mean_ms": total / calls * 1000, "max_ms": longest * 1000}
+            for name, (calls, total, longest) in _timings.items()
+        }
+        counters = dict(_counters)
+    hit_rates = {}
+    for name in counters:
+        if name.endswith(".miss"):
+            prefix = name[:-len(".miss")]
+            hits = counters.get(f"{prefix}.hit", 0) + counters.get(f"{prefix}.disk_hit", 0)
+            lookups = hits + counters[name]
+            hit_rates[prefix] = hits / lookups if lookups else 0.0
+    return {"stages": stages, "counters": counters, "hit_rates": hit_rates}
+
+def summary_table():
+    data = summary()
+    lines = [f"{'stage':<28}{'count':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+    for name, timing in sorted(data["stages"].items(), key=lambda item: -item[1]["total_s"]):
+        lines.append(f"{name:<28}{timing['count']:>8}{timing['total_s'] * 1000:>12.2f}{timing['mean_ms']:>10.3f}{timing['max_ms']:>10.3f}")
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"{name:<28}{value:>8}")
+    for name, rate in sorted(data["hit_rates"].items()):
+        lines.append(f"{name + ' hit rate':<28}{rate:>8.1%}")
+    return "\n".join(lines)
+
+def dump(path: str):
+    with open(path, "w") as f:
+        json.dump(summary(), f, indent=2)
+
+def _report_at_exit():
+    if not enabled or not (_timings or _counters):
+        return
+    print(summary_table())
+    path = os.environ.get("RECHORD_PROFILE_FILE")
+    if path:
+        dump(path)
+
+atexit.register(_report_at_exit)
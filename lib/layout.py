@@ -0,0 +1,187 @@
+'''
+Tk independent wrap layout of the chord canvas.
+
+Chords are placed left to right and a new row starts when the next chord would pass the width; the row
+moves down by the height of the chord that starts it. Placement only depends on the chords before, so an
+insert, remove or resize at some index only lays out the chords from there on, and a width change only
+from the first chord whose wrapping flips. Rows are kept sorted by top, so hit-testing a point is a
+bisect over the rows and then over the chords of a row.
+'''
+from bisect import bisect_right
+
+class FlowLayout:
+    '''
+    Positions of a list of chord sizes wrapped at a width
+    inputs:
+        sizes: [(width, height), ...]
+        width: int (the canvas width)
+    '''
+    def __init__(self, sizes = (), width: float = 800):
+        self.width = width
+        self.sizes = []
+        # top left of each chord; the first chord, top and running content bottom of each row
+        self.positions = []
+        self.row_starts = []
+        self.row_tops = []
+        self.row_bottoms = []
+        self.max_height = 0
+        self.extend(sizes)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def center(self, index):
+        x, y = self.positions[index]
+        width, height = self.sizes[index]
+        return x + width / 2, y + height / 2
+
+    def content_height(self):
+        return self.row_bottoms[-1] if self.row_bottoms else 0
+
+    def _place(self, start):
+        '''
+        Lays out the chords from start on, keeping everything before it
+        returns: start (the first index whose position may have changed)
+        '''
+        del self.positions[start:]
+        row = bisect_right(self.row_starts, start - 1) if start > 0 else 0
+        del self.row_starts[row:]
+        del self.row_tops[row:]
+        del self.row_bottoms[row - 1 if row else 0:]
+        if start > 0:
+            (x, next_y), (width, _) = self.positions[start - 1], self.sizes[start - 1]
+            next_x = x + width
+            # the row start is in keeps only its chords before start
+            self.row_bottoms.append(max(
+                [self.row_bottoms[-1] if self.row_bottoms else 0]
+                + [y + height for (_, y), (_, height) in zip(self.positions[self.row_starts[-1]:], self.sizes[self.row_starts[-1]:start])]
+            ))
+        else:
+            next_x = next_y = 0
+        # this loop is the whole cost of a full layout, so it keeps the row state in locals
+        width, positions = self.width, self.positions
+        row_top = self.row_tops[-1] if self.row_tops else None
+        bottom = self.row_bottoms.pop() if self.row_bottoms else 0
+        for index, (chord_width, chord_height) in enumerate(self.sizes[start:], start):
+            if next_x + chord_width > width:
+                next_x = 0
+                next_y += chord_height
+            if next_y != row_top:
+                if row_top is not None:
+                    self.row_bottoms.append(bottom)
+                row_top = next_y
+                self.row_starts.append(index)
+                self.row_tops.append(next_y)
+            positions.append((next_x, next_y))
+            if next_y + chord_height > bottom:
+                bottom = next_y + chord_height
+            next_x += chord_width
+        if row_top is not None:
+            self.row_bottoms.append(bottom)
+        return start
+
+    def reset(self, sizes, width = None):
+        if width is not None:
+            self.width = width
+        self.sizes = list(sizes)
+        self.max_height = max((height for _, height in self.sizes), default=0)
+        return self._place(0)
+
+    def extend(self, sizes):
+        start = len(self.sizes)
+        self.sizes.extend(sizes)
+        self.max_height = max([self.max_height] + [height for _, height in self.sizes[start:]])
+        return self._place(start)
+
+    def append(self, size):
+        return self.extend([size])
+
+    def insert(self, index, size):
+        self.sizes.insert(index, size)
+        self.max_height = max(self.max_height, size[1])
+        return self._place(index)
+
+    def remove(self, index):
+        # max_height may stay above the real maximum; it is only used as a search margin
+        self.sizes.pop(index)
+        return self._place(index)
+
+    def resize(self, index, size):
+        self.sizes[index] = size
+        self.max_height = max(self.max_height, size[1])
+        return self._place(index)
+
+    def replace(self, start, sizes):
+        '''
+        Replaces the sizes from start on, for reorders and swaps that leave the chords before start in place
+        '''
+        self.sizes[start:] = sizes
+        self.max_height = max([self.max_height] + [height for _, height in self.sizes[start:]])
+        return self._place(start)
+
+    def set_width(self, width):
+        '''
+        Rewraps at a new width from the first chord whose wrapping changes
+        returns: the first index whose position may have changed (len(self) when none did)
+        '''
+        old_width, self.width = self.width, width
+        for row, start in enumerate(self.row_starts):
+            start_x, end = 0, self._row_slice(row)[1]
+            if start > 0:
+                start_x = self.positions[start - 1][0] + self.sizes[start - 1][0]
+            # the chord starting the row wrapped because it passed the old width from where the last row ended
+            if (start_x + self.sizes[start][0] > width) != (start_x + self.sizes[start][0] > old_width):
+                return self._place(start)
+            # the rest of the row fit; the first one that passes the new width wraps now
+            for index in range(start + 1, end):
+                if self.positions[index][0] + self.sizes[index][0] > width:
+                    return self._place(index)
+        return len(self.sizes)
+
+    def visible_range(self, top, bottom):
+        '''
+        returns: (first, last) index range of the chords that may intersect the band top <= y < bottom
+        '''
+        first_row = bisect_right(self.row_tops, top - self.max_height)
+        last_row = bisect_right(self.row_tops, bottom - 1e-9)
+        first = self.row_starts[first_row] if first_row < len(self.row_starts) else len(self.sizes)
+        last = self.row_starts[last_row] if last_row < len(self.row_starts) else len(self.sizes)
+        return first, max(first, last)
+
+    def _row_slice(self, row):
+        end = self.row_starts[row + 1] if row + 1 < len(self.row_starts) else len(self.sizes)
+        return self.row_starts[row], end
+
+    def hit_test(self, x, y):
+        '''
+        returns: the index of the chord at the point, or None
+        '''
+        row = bisect_right(self.row_tops, y) - 1
+        # chords taller than the rows below them reach into those rows' bands, but never more than max_height
+        for candidate in range(row, -1, -1):
+            if self.row_tops[candidate] <= y - self.max_height:
+                break
+            start, end = self._row_slice(candidate)
+            index = bisect_right(self.positions, (x, float("inf")), start, end) - 1
+            if index < start:
+                continue
+            chord_x, chord_y = self.positions[index]
+            width, height = self.sizes[index]
+            if x < chord_x + width and y < chord_y + height:
+                return index
+        return None
+
+    def drop_index(self, x, y):
+        '''
+        returns: the index a chord dropped at the point should be inserted at, between 0 and len(self)
+        '''
+        if not self.sizes or y < self.row_tops[0]:
+            return 0
+        row = bisect_right(self.row_tops, y) - 1
+        start, end = self._row_slice(row)
+        index = bisect_right(self.positions, (x, float("inf")), start, end) - 1
+        if index < start:
+            return start
+        if x > self.positions[index][0] + self.sizes[index][0] / 2:
+            index += 1
+        return min(index, end)
@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import lib.chord_diagram_gen as cg
+from lib.raster_cache import RasterCache, content_hash
+
+LIBRARY_PATH = "./tmp/library.db"
+PACK_PATH = "./tmp/library.pack"
+SVG_DIR = "./tmp/svg"
+SAVE_DIR = "./save"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chords (
+    name TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    definition TEXT,
+    params TEXT,
+    content_hash TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    thumbnail TEXT
+);
+CREATE TABLE IF NOT EXISTS saves (
+    name TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class ChordLibrary:
+    '''
+    Persistent SQLite index of the chord SVGs in ./tmp/svg and the saves in ./save,
+    so popups never have to list or parse the directories themselves.
+    When a library pack (lib.library_pack) exists, its chords are part of the library too, and a loose SVG
+    wins over a packed chord of the same name. The pack only gains chords by importing them
+    (python -m lib.library_pack import); new chords stay loose, where reconcile sees them.
+    inputs:
+        path: str (database file)
+        svg_dir: str
+        save_dir: str
+        pack_path: str (library pack, only used when it exists; None for no pack)
+    '''
+    def __init__(self, path: str = LIBRARY_PATH, svg_dir: str = SVG_DIR, save_dir: str = SAVE_DIR, pack_path: str = PACK_PATH):
+        self.svg_dir = svg_dir
+        self.save_dir = save_dir
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self.pack = None
+        if pack_path is not None and os.path.exists(pack_path):
+            from lib.library_pack import ChordPack
+            try:
+                self.pack = ChordPack(pack_path)
+            except (OSError, ValueError) as e:
+                # most likely an import or compaction holding the writer lock: read it, but delete nothing
+                print(f"Error opening library pack {pack_path} for writing ({e}), opening it read-only")
+                try:
+                    self.pack = ChordPack(pack_path, writable=False)
+                except (OSError, ValueError) as e:
+                    print(f"Error opening library pack {pack_path}: {e}")
+
+    def close(self):
+        self.connection.close()
+        if self.pack is not None:
+            # appends the pack index, so the next start doesn't scan the pack
+            self.pack.close()
+
+    def record_svg(self, svg_path):
+        '''
+        Adds or refreshes the index entry for one chord SVG
+        '''
+        stat = os.stat(svg_path)
+        with open(svg_path, 'rb') as f:
+            svg_data = f.read()
+        with self.connection:
+            self._upsert(os.path.basename(svg_path), svg_data, stat)
+
+    def remove(self, name):
+        '''
+        Forgets a chord deleted in the app, packed copy included
+        '''
+        packed = self.pack is not None and name in self.pack
+        if packed and not self.pack.writable:
+            raise ValueError(f"{name} is in the library pack, which another process has open for writing")
+        with self.connection:
+            self.connection.execute("DELETE FROM chords WHERE name = ?", (name,))
+        if packed:
+            self.pack.delete(name)
+
+    def chord_names(self):
+        names = [row["name"] for row in self.connection.execute("SELECT name FROM chords ORDER BY name")]
+        if self.pack is not None:
+            names = sorted(set(names).union(self.pack.names()))
+        return names
+
+    def chord_filenames(self):
+        if self.pack is None:
+            return [row["filename"] for row in self.connection.execute("SELECT filename FROM chords ORDER BY name")]
+        filenames = {row["name"]: row["filename"] for row in self.connection.execute("SELECT name, filename FROM chords")}
+        return [filenames.get(name, f"{name}.svg") for name in self.chord_names()]
+
+    def get(self, name):
+        '''
+        returns: {"name", "filename", "definition", "params", "content_hash", "mtime", "size", "thumbnail"} or None
+        (mtime and size are None for packed chords)
+        '''
+        row = self.connection.execute("SELECT * FROM chords WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            if self.pack is None or name not in self.pack:
+                return None
+            definition = self.pack.definition(name)
+            svg_hash = self.pack.content_hash(name)
+            return {
+                "name": name, "filename": f"{name}.svg", "definition": definition,
+                "params": definition.get("params") if definition else None, "content_hash": svg_hash,
+                "mtime": None, "size": None, "thumbnail": RasterCache.hash_key(svg_hash)
+            }
+        record = dict(row)
+        record["definition"] = json.loads(record["definition"]) if record["definition"] else None
+        record["params"] = json.loads(record["params"]) if record["params"] else None
+        return record
+
+    def read_svg(self, filename):
+        '''
+        returns: the SVG of a library chord, from svg_dir or else the pack
+        '''
+        path = os.path.join(self.svg_dir, filename)
+        name = os.path.splitext(filename)[0]
+        if self.pack is not None and name in self.pack and not os.path.exists(path):
+            return self.pack.svg(name)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def thumbnail(self, name, svg_hash):
+        '''
+        returns: the packed thumbnail of a chord as a PIL image, when there is one for an SVG with this
+        content_hash (None otherwise)
+        '''
+        if self.pack is None or name not in self.pack or self.pack.content_hash(name) != svg_hash:
+            return None
+        return self.pack.thumbnail_image(name)
+
+    def save_filenames(self):
+        return [row["filename"] for row in self.connection.execute("SELECT filename FROM saves ORDER BY name")]
+
+    def reconcile(self, force: bool = False):
+        '''
+        Brings the index up to date with files changed outside the app.
+        Unless forced, a directory whose mtime is unchanged is skipped (catches adds, deletes and renames);
+        a forced pass stats every file and re-reads only those whose mtime or size changed.
+        '''
+        self._reconcile_dir(self.svg_dir, ".svg", "chords", force)
+        self._reconcile_dir(self.save_dir, ".json", "saves", force)
+
+    def _reconcile_dir(self, directory, extension, table, force):
+        if not os.path.isdir(directory):
+            return
+        dir_mtime = str(os.stat(directory).st_mtime_ns)
+        meta_key = f"mtime:{table}"
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (meta_key,)).fetchone()
+        if not force and row is not None and row["value"] == dir_mtime:
+            return
+
+        indexed = {
+            row["name"]: (row["mtime"], row["size"])
+            for row in self.connection.execute(f"SELECT name, mtime, size FROM {table}")
+        }
+        with self.connection:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(extension) or not entry.is_file():
+                        continue
+                    name = entry.name[:-len(extension)]
+                    stat = entry.stat()
+                    if indexed.pop(name, None) == (stat.st_mtime, stat.st_size):
+                        continue
+                    if table == "chords":
+                        try:
+                            with open(entry.path, 'rb') as f:
+                                self._upsert(entry.name, f.read(), stat)
+                        except OSError as e:
+                            print(f"Error indexing {entry.path}: {e}")
+                    else:
+                        self.connection.execute(
+                            "INSERT OR REPLACE INTO saves (name, filename, mtime, size) VALUES (?, ?, ?, ?)",
+                            (name, entry.name, stat.st_mtime, stat.st_size)
+                        )
+            for name in indexed:
+                self.connection.execute(f"DELETE FROM {table} WHERE name = ?", (name,))
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (meta_key, dir_mtime))
+
+    def _upsert(self, filename, svg_data, stat):
+        definition = cg.read_definition(svg_data)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO chords (name, filename, definition, params, content_hash, mtime, size, thumbnail) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                os.path.splitext(filename)[0],
+                filename,
+                json.dumps(definition) if definition else None,
+                json.dumps(definition.get("params")) if definition else None,
+                content_hash(svg_data),
+                stat.st_mtime,
+                stat.st_size,
+                # the raster cache key the canvas renders this SVG under (./tmp/png/<thumbnail>.png)
+                RasterCache.make_key(svg_data)
+            )
+        )
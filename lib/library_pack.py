@@ -0,0 +1,476 @@
+'''
+Single-file chord library pack: the definitions, SVGs and pre-rasterized thumbnails of the library in one
+file with an offset index, instead of thousands of small files in ./tmp/svg.
+
+    python -m lib.library_pack import             # packs ./tmp/svg into ./tmp/library.pack
+    python -m lib.library_pack export -o out/svg  # writes the packed chords back out as loose SVGs
+    python -m lib.library_pack compact
+    python -m lib.library_pack info
+
+The file is a 16 byte header followed by records, each a RECORD_HEADER, the UTF-8 name and three data
+fields (definition JSON, SVG, thumbnail PNG). Writes only ever append: a changed chord gets a new record, a
+deleted one a tombstone, and flush() appends the index (name -> [record offset, SVG content hash]) as a
+record followed by a TRAILER pointing at it. Opening reads the trailer and the index and memory-maps the
+file; a chord's fields are only read and decoded when asked for. When the file doesn't end in a trailer
+(the app died before flushing) the records are scanned instead, stopping at the first torn one.
+Superseded records are dropped by compact(), which runs by itself once they take up most of the file.
+One process at a time may open a pack writable: it holds a lock on <pack>.lock until it closes it, so
+appends never race and a compaction never replaces the file under another writer.
+'''
+import argparse
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from lib.raster_cache import RasterCache, content_hash
+
+PACK_PATH = "./tmp/library.pack"
+MAGIC = b"RCHDPACK"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sH6x")
+# kind, name length, definition length, SVG length, thumbnail length, crc32 of the name and fields
+RECORD_HEADER = struct.Struct("<BxHIIII")
+TRAILER_MAGIC = b"RCHDIDX1"
+# offset of the index record
+TRAILER = struct.Struct("<Q8s")
+CHORD, TOMBSTONE, INDEX = 1, 2, 3
+# flush() compacts once superseded records are over this share of the file (and COMPACT_MIN_BYTES)
+COMPACT_RATIO = 0.5
+COMPACT_MIN_BYTES = 1024 * 1024
+
+def lock_file(f):
+    '''
+    Takes a non-blocking exclusive lock on an open file
+    returns: whether it was taken
+    '''
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+def pack_record(kind, name, definition = b"", svg = b"", thumbnail = b""):
+    name = name.encode("utf-8")
+    crc = zlib.crc32(thumbnail, zlib.crc32(svg, zlib.crc32(definition, zlib.crc32(name))))
+    header = RECORD_HEADER.pack(kind, len(name), len(definition), len(svg), len(thumbnail), crc)
+    return b"".join((header, name, definition, svg, thumbnail))
+
+class ChordPack:
+    '''
+    Memory-mapped library pack (see the module docstring for the layout)
+    inputs:
+        path: str (created when it doesn't exist and writable)
+        writable: bool (raises ValueError when another process has the pack open writable)
+    '''
+    def __init__(self, path: str = PACK_PATH, writable: bool = True):
+        self.path = path
+        self.writable = writable
+        # name -> (record offset, SVG content hash)
+        self.index = {}
+        # bytes of records no longer in the index, including old indexes
+        self.dead_bytes = 0
+        # set by writes, cleared by flush(), which then has an index to append
+        self.dirty = False
+        # (offset, size) of the index the file ends in, dead once anything is appended
+        self._index_span = None
+        self._map = None
+        # the writer lock, on a file of its own so it outlives the pack file being replaced by compact()
+        self._lock = None
+        if writable:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._lock = open(f"{path}.lock", "a+b")
+            if not lock_file(self._lock):
+                self._lock.close()
+                raise ValueError(f"{path} is open for writing in another process")
+        try:
+            self._open()
+        except Exception:
+            self._release()
+            raise
+
+    def _release(self):
+        if self._lock is not None:
+            # closing the file drops the lock
+            self._lock.close()
+            self._lock = None
+
+    def _open(self):
+        if self.writable and not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "wb") as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION))
+        self._file = open(self.path, "r+b" if self.writable else "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version = FILE_HEADER.unpack_from(self._map) if len(self._map) >= FILE_HEADER.size else (None, None)
+            if magic != MAGIC:
+                raise ValueError(f"Not a chord library pack: {self.path}")
+            if version != VERSION:
+                raise ValueError(f"Unsupported chord library pack version {version}: {self.path}")
+            self.end = len(self._map)
+            if not self._read_index():
+                self._scan()
+        except Exception:
+            self._close_file()
+            raise
+
+    def _close_file(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _remap(self):
+        # appends are only mapped once something past the old end is read
+        self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._map is None:
+            return
+        try:
+            if self.writable:
+                self.flush()
+        finally:
+            self._close_file()
+            self._release()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return sorted(self.index)
+
+    def content_hash(self, name):
+        '''
+        returns: the sha1 of the packed SVG (lib.raster_cache.content_hash), without reading it
+        '''
+        return self.index[name][1]
+
+    def _read_index(self):
+        # the fast path: a file that ends in a trailer, whose index record is intact
+        if self.end < FILE_HEADER.size + RECORD_HEADER.size + TRAILER.size:
+            return False
+        offset, magic = TRAILER.unpack_from(self._map, self.end - TRAILER.size)
+        if magic != TRAILER_MAGIC or not FILE_HEADER.size <= offset < self.end - TRAILER.size:
+            return False
+        record = self._record(offset, verify=True)
+        if record is None or record[0] != INDEX or record[1] + TRAILER.size != self.end - offset:
+            return False
+        fields = record[3]
+        data = json.loads(self._map[fields[0][0]:fields[0][1]])
+        self.index = {name: tuple(entry) for name, entry in data["chords"].items()}
+        self.dead_bytes = data["dead_bytes"]
+        self._index_span = (offset, self.end - offset)
+        return True
+
+    def _scan(self):
+        '''
+        Rebuilds the index from the records, for a pack whose last writes were never indexed;
+        everything from the first torn record on is cut off
+        '''
+        self.index = {}
+        sizes = {}
+        offset = FILE_HEADER.size
+        while offset < self.end:
+            record = self._record(offset, verify=True)
+            if record is None:
+                break
+            kind, size, name, _ = record
+            if kind == CHORD:
+                start, end = record[3][1]
+                self.index[name] = (offset, content_hash(self._map[start:end]))
+                sizes[name] = size
+            elif kind == TOMBSTONE:
+                self.index.pop(name, None)
+                sizes.pop(name, None)
+            elif kind == INDEX:
+                size += TRAILER.size
+            offset += size
+        if offset < self.end:
+            print(f"Error reading {self.path}: dropping {self.end - offset} bytes after the last intact record")
+            if self.writable:
+                # a mapped file can't be truncated on Windows
+                self._map.close()
+                self._file.truncate(offset)
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.end = offset
+        # old indexes are counted here, so there is no index span to drop on the next flush
+        self.dead_bytes = self.end - FILE_HEADER.size - sum(sizes.values())
+        self._index_span = None
+        self.dirty = True
+
+    def _record(self, offset, verify = False):
+        '''
+        returns: (kind, record size, name, [(start, end) of the definition, SVG and thumbnail]),
+        or None when the record is cut off (or fails its checksum, if verify)
+        '''
+        if offset + RECORD_HEADER.size > self.end:
+            return None
+        if offset + RECORD_HEADER.size > len(self._map):
+            self._remap()
+        kind, name_length, *lengths, crc = RECORD_HEADER.unpack_from(self._map, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + name_length + sum(lengths)
+        if kind not in (CHORD, TOMBSTONE, INDEX) or end > self.end:
+            return None
+        if end > len(self._map):
+            self._remap()
+        if verify and zlib.crc32(self._map[start:end]) != crc:
+            return None
+        name = self._map[start:start + name_length].decode("utf-8")
+        fields = []
+        position = start + name_length
+        for length in lengths:
+            fields.append((position, position + length))
+            position += length
+        return kind, end - offset, name, fields
+
+    def _fields(self, name):
+        if name not in self.index:
+            raise KeyError(name)
+        return self._record(self.index[name][0])[3]
+
+    def definition(self, name):
+        '''
+        returns: the chord definition (Chord.to_dict()) or None when the SVG didn't carry one
+        '''
+        start, end = self._fields(name)[0]
+        return json.loads(self._map[start:end]) if end > start else None
+
+    def svg(self, name):
+        start, end = self._fields(name)[1]
+        return self._map[start:end]
+
+    def thumbnail(self, name):
+        '''
+        returns: the PNG of the SVG rasterized at scale 1, or None when none was packed
+        '''
+        start, end = self._fields(name)[2]
+        return self._map[start:end] if end > start else None
+
+    def thumbnail_image(self, name):
+        png = self.thumbnail(name)
+        if png is None:
+            return None
+        from PIL import Image
+        with Image.open(io.BytesIO(png)) as image:
+            return image.convert("RGB")
+
+    def _append(self, data):
+        if not self.writable:
+            raise ValueError(f"{self.path} is opened read-only")
+        offset = self.end
+        self._file.seek(offset)
+        self._file.write(data)
+        self._file.flush()
+        self.end += len(data)
+        self.dirty = True
+        return offset
+
+    def _supersede(self, name):
+        if name in self.index:
+            self.dead_bytes += self._record(self.index[name][0])[1]
+
+    def put(self, name, svg_data, definition = None, thumbnail = None):
+        '''
+        Appends a chord, replacing any packed under the same name
+        inputs:
+            svg_data: bytes
+            definition: dict (Chord.to_dict()) or None
+            thumbnail: PNG bytes of the SVG at scale 1, or None
+        '''
+        definition = json.dumps(definition, separators=(",", ":")).encode("utf-8") if definition else b""
+        record = pack_record(CHORD, name, definition, svg_data, thumbnail or b"")
+        self._supersede(name)
+        self.index[name] = (self._append(record), content_hash(svg_data))
+
+    def delete(self, name):
+        if name not in self.index:
+            return
+        self._supersede(name)
+        # the tombstone only matters until the next index, which leaves the name out
+        record = pack_record(TOMBSTONE, name)
+        self._append(record)
+        self.dead_bytes += len(record)
+        del self.index[name]
+
+    def flush(self):
+        '''
+        Appends the index, so the next open doesn't scan; compacts instead when enough of the file is dead
+        '''
+        if not self.dirty:
+            return
+        if self.dead_bytes > COMPACT_MIN_BYTES and self.dead_bytes > COMPACT_RATIO * self.end:
+            try:
+                self.compact()
+                return
+            except OSError as e:
+                print(f"Error compacting {self.path}: {e}")
+        # the index being replaced is dead from here on
+        if self._index_span is not None:
+            self.dead_bytes += self._index_span[1]
+        size = self._write_index(self._file, self.end, self.dead_bytes)
+        self._index_span = (self.end, size)
+        self.end += size
+        self.dirty = False
+
+    def _write_index(self, f, offset, dead_bytes):
+        '''
+        returns: the size of the index record and trailer written at offset
+        '''
+        data = json.dumps({"chords": self.index, "dead_bytes": dead_bytes}, separators=(",", ":")).encode("utf-8")
+        record = pack_record(INDEX, "", data) + TRAILER.pack(offset, TRAILER_MAGIC)
+        f.seek(offset)
+        f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+        return len(record)
+
+    def compact(self):
+        '''
+        Rewrites the pack with only the live records, in name order, and a fresh index
+        '''
+        if not self.writable:
+            raise ValueError(f"{self.path} is opened read-only")
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        index = {}
+        with open(tmp_path, "wb") as f:
+            f.write(FILE_HEADER.pack(MAGIC, VERSION))
+            for name in sorted(self.index):
+                offset, svg_hash = self.index[name]
+                size = self._record(offset)[1]
+                index[name] = (f.tell(), svg_hash)
+                # records are copied as they are, nothing is decoded
+                f.write(self._map[offset:offset + size])
+            self.index = index
+            self._write_index(f, f.tell(), 0)
+        # a mapped file can't be replaced on Windows
+        self._close_file()
+        try:
+            # fails on Windows while a reader has the pack open; the old file is kept as it was
+            os.replace(tmp_path, self.path)
+        except OSError:
+            os.remove(tmp_path)
+            self._open()
+            raise
+        self.dirty = False
+        self._open()
+
+    def stats(self):
+        return {"chords": len(self.index), "file_bytes": self.end, "dead_bytes": self.dead_bytes}
+
+def thumbnail_png(svg_data, raster_cache):
+    '''
+    returns: the PNG of an SVG at scale 1, straight from the raster cache's disk tier when it has one
+    '''
+    key = RasterCache.make_key(svg_data)
+    if raster_cache.cache_dir is not None and os.path.exists(raster_cache.disk_path(key)):
+        with open(raster_cache.disk_path(key), 'rb') as f:
+            return f.read()
+    buffer = io.BytesIO()
+    raster_cache.rasterize(svg_data, persist=False).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def import_svgs(pack, svg_dir: str = './tmp/svg', thumbnails: bool = True, remove: bool = False, log = print):
+    '''
+    Packs the loose SVGs of svg_dir, skipping those already packed with the same content
+    inputs:
+        thumbnails: also pack each SVG rasterized at scale 1
+        remove: delete the loose SVGs once they are packed
+    returns: (packed, unchanged, failed)
+    '''
+    import lib.chord_diagram_gen as cg
+    raster_cache = RasterCache(max_bytes=0) if thumbnails else None
+    packed = unchanged = failed = 0
+    with os.scandir(svg_dir) as entries:
+        paths = sorted(entry.path for entry in entries if entry.name.endswith(".svg") and entry.is_file())
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            with open(path, 'rb') as f:
+                svg_data = f.read()
+            if name in pack and pack.content_hash(name) == content_hash(svg_data):
+                unchanged += 1
+            else:
+                thumbnail = thumbnail_png(svg_data, raster_cache) if thumbnails else None
+                pack.put(name, svg_data, cg.read_definition(svg_data), thumbnail)
+                packed += 1
+        except Exception as e:
+            log(f"Error packing {path}: {e}")
+            failed += 1
+            continue
+        if remove:
+            os.remove(path)
+    pack.flush()
+    return packed, unchanged, failed
+
+def export_svgs(pack, svg_dir: str = './tmp/svg', overwrite: bool = False, log = print):
+    '''
+    Writes every packed chord to svg_dir as <name>.svg; existing files are only replaced when overwrite
+    returns: (written, skipped)
+    '''
+    os.makedirs(svg_dir, exist_ok=True)
+    written = skipped = 0
+    for name in pack.names():
+        path = os.path.join(svg_dir, f"{name}.svg")
+        if os.path.exists(path) and not overwrite:
+            skipped += 1
+            continue
+        try:
+            with open(path, 'wb') as f:
+                f.write(pack.svg(name))
+            written += 1
+        except OSError as e:
+            log(f"Error exporting {path}: {e}")
+    return written, skipped
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Pack the chord library into one file, or unpack it")
+    parser.add_argument("command", choices=("import", "export", "compact", "info"))
+    parser.add_argument("-p", "--pack", default=PACK_PATH, help="library pack file")
+    parser.add_argument("-d", "--svg-dir", default='./tmp/svg', help="directory of loose SVGs to import from")
+    parser.add_argument("-o", "--output", default=None, help="directory to export to (default: --svg-dir)")
+    parser.add_argument("--no-thumbnails", action="store_true", help="don't pack pre-rasterized thumbnails")
+    parser.add_argument("--remove", action="store_true", help="delete the loose SVGs once they are packed")
+    parser.add_argument("--overwrite", action="store_true", help="replace existing SVGs on export")
+    args = parser.parse_args(argv)
+
+    if args.command != "import" and not os.path.exists(args.pack):
+        print(f"Error opening {args.pack}: no such pack")
+        return 1
+    try:
+        pack = ChordPack(args.pack, writable=args.command in ("import", "compact"))
+    except (OSError, ValueError) as e:
+        print(f"Error opening {args.pack}: {e}")
+        return 1
+    try:
+        if args.command == "import":
+            packed, unchanged, failed = import_svgs(pack, args.svg_dir, not args.no_thumbnails, args.remove)
+            print(f"Packed {packed} chords ({unchanged} unchanged, {failed} failed) into {args.pack}")
+        elif args.command == "export":
+            written, skipped = export_svgs(pack, args.output or args.svg_dir, args.overwrite)
+            print(f"Exported {written} chords ({skipped} already there) to {args.output or args.svg_dir}")
+        elif args.command == "compact":
+            before = pack.end
+            pack.compact()
+            print(f"Compacted {args.pack} from {before} to {pack.end} bytes")
+        stats = pack.stats()
+        print(f"{stats['chords']} chords, {stats['file_bytes']} bytes, {stats['dead_bytes']} superseded")
+    finally:
+        pack.close()
+    return 1 if args.command == "import" and failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import queue
+import threading
+from collections import namedtuple
+import lib.instrument as instrument
+
+PreviewResult = namedtuple("PreviewResult", ["generation", "request", "image", "error"])
+
+class PreviewWorker:
+    '''
+    Renders previews on one background thread, off the Tk thread, keeping only the latest request.
+    A request submitted while another waits replaces it, and a result whose request was superseded while
+    it rendered is dropped, so the results queue only holds renders of the latest state.
+    inputs:
+        render: function(request) -> PIL image, called on the worker thread
+        stage: instrument stage the renders are timed under
+    '''
+    def __init__(self, render, stage: str = "preview.render"):
+        self.render = render
+        self.stage = stage
+        self.results = queue.Queue()
+        self._condition = threading.Condition()
+        self._pending = None
+        self._generation = 0
+        # generation of the latest request while it has no result yet
+        self._outstanding = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="rechord-preview", daemon=True)
+        self._thread.start()
+
+    def submit(self, request):
+        '''
+        returns: the generation of the request, to match it with its PreviewResult
+        '''
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, request)
+            self._outstanding = self._generation
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        # drops the waiting request and makes any render in progress stale
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+            self._outstanding = None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._pending = None
+            self._outstanding = None
+            self._condition.notify()
+
+    def is_current(self, generation):
+        return generation == self._generation
+
+    def busy(self):
+        return self._outstanding is not None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                generation, request = self._pending
+                self._pending = None
+            try:
+                with instrument.stage(self.stage):
+                    result = PreviewResult(generation, request, self.render(request), None)
+            except Exception as e:
+                result = PreviewResult(generation, request, None, e)
+            with self._condition:
+                if generation == self._generation:
+                    self.results.put(result)
+                    self._outstanding = None
@@ -0,0 +1,112 @@
+import math
+import os
+from functools import lru_cache, reduce
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+# Rendered at SUPERSAMPLE times the target size, then downsampled, to get
+# the same anti-aliased edges renderPM produces
+SUPERSAMPLE = 4
+
+# svglib reads the unitless SVG lengths as px (0.75pt) and renderPM draws one pixel per point at 72 dpi
+PX_TO_PT = 0.75
+
+# Helvetica metrics first (the URW clone ReportLab renders with), then look-alikes
+FONT_CANDIDATES = ["Helvetica.ttf", "Arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf"]
+
+@lru_cache(maxsize=None)
+def get_font(size: int):
+    candidates = list(FONT_CANDIDATES)
+    try:
+        import reportlab
+        fonts_dir = os.path.join(os.path.dirname(reportlab.__file__), "fonts")
+        candidates = [os.path.join(fonts_dir, "_a______.pfb"), os.path.join(fonts_dir, "Vera.ttf")] + candidates
+    except ImportError:
+        pass
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+def chord_to_pil(chord, scale: float = 1.0):
+    '''
+    Rasterizes a Chord straight from its geometry (Chord.get_shapes) into a PIL image,
+    skipping the SVG -> svglib -> renderPM round trip.
+    The output has the same size as renderPM.drawToPIL at the same scale.
+    '''
+    width, height = chord.get_size()
+    # strokes are sized in output pixels at scale 1, like renderPM draws them
+    stroke_scale = scale
+    scale = scale * PX_TO_PT
+    out_size = (int(width * scale + 0.5), int(height * scale + 0.5))
+    factor = scale * SUPERSAMPLE
+    # renderPM anchors the drawing to the bottom edge, so the rounding of the height shifts everything down
+    shift = (out_size[1] - height * scale) * SUPERSAMPLE
+
+    image = Image.new("RGB", (out_size[0] * SUPERSAMPLE, out_size[1] * SUPERSAMPLE), "white")
+    draw = ImageDraw.Draw(image)
+    for shape in chord.get_shapes():
+        draw_shape(draw, shape, factor, shift, stroke_scale)
+
+    # box filter over each SUPERSAMPLE x SUPERSAMPLE block: exact coverage and much cheaper than a resize
+    return image.reduce(SUPERSAMPLE)
+
+def draw_shape(draw, shape, factor, shift = 0, stroke_scale: float = 1.0):
+    kind = shape["type"]
+    if kind == "rect":
+        x, y = shape["insert"]
+        w, h = shape["size"]
+        draw.rectangle(
+            [x * factor, y * factor + shift, (x + w) * factor - 1, (y + h) * factor + shift - 1],
+            fill = shape.get("fill", "black")
+        )
+    elif kind == "circle":
+        cx, cy = shape["center"]
+        r = shape["r"]
+        draw.ellipse(
+            [(cx - r) * factor, (cy - r) * factor + shift, (cx + r) * factor, (cy + r) * factor + shift],
+            fill = shape.get("fill", "black")
+        )
+    elif kind == "line":
+        # drawn as a polygon so the ends are butt capped like the SVG stroke.
+        # renderPM draws stroke widths in output pixels, so the width is the stroke width times the
+        # render scale in output pixels, whatever the px to pt factor
+        (x1, y1), (x2, y2) = shape["start"], shape["end"]
+        length = math.hypot(x2 - x1, y2 - y1)
+        if length == 0:
+            return
+        half = shape["stroke_width"] * stroke_scale * SUPERSAMPLE / factor / 2
+        dx, dy = -(y2 - y1) / length * half, (x2 - x1) / length * half
+        draw.polygon(
+            [
+                ((x1 + dx) * factor, (y1 + dy) * factor + shift),
+                ((x2 + dx) * factor, (y2 + dy) * factor + shift),
+                ((x2 - dx) * factor, (y2 - dy) * factor + shift),
+                ((x1 - dx) * factor, (y1 - dy) * factor + shift)
+            ],
+            fill = shape.get("stroke", "black")
+        )
+    elif kind == "text":
+        x, y = shape["insert"]
+        anchor = "ms" if shape.get("text_anchor") == "middle" else "ls"
+        draw.text(
+            (x * factor, y * factor + shift),
+            str(shape["text"]),
+            fill = "black",
+            font = get_font(int(round(shape["font_size"] * factor))),
+            anchor = anchor
+        )
+    else:
+        raise ValueError(f"Unknown shape type: {kind}")
+
+def image_difference(first, second, threshold: int = 64):
+    '''
+    Returns the fraction of pixels whose largest channel difference exceeds threshold,
+    used to check the raster backend against the SVG backend
+    '''
+    if first.size != second.size:
+        return 1.0
+    difference = ImageChops.difference(first.convert("RGB"), second.convert("RGB"))
+    histogram = reduce(ImageChops.lighter, difference.split()).histogram()
+    return sum(histogram[threshold + 1:]) / (first.width * first.height)
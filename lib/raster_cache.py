@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import lib.instrument as instrument
+import lib.render as render
+
+CACHE_DIR = "./tmp/png"
+# bumped when renders of the same key change, which clears the persistent tier
+# (2: stroke widths scale with the render scale)
+CACHE_VERSION = 2
+# zoomed images are resampled down from the nearest of these render scales at or above the zoom
+MIP_LEVELS = (1.0, 2.0, 4.0)
+
+def content_hash(svg):
+    '''
+    Returns the sha1 hex digest of an SVG document (str or bytes)
+    '''
+    if isinstance(svg, str):
+        svg = svg.encode("utf-8")
+    return hashlib.sha1(svg).hexdigest()
+
+def definition_hash(definition: dict):
+    '''
+    Returns the sha1 hex digest of a chord definition (as produced by Chord.to_dict)
+    '''
+    return hashlib.sha1(json.dumps(definition, sort_keys=True).encode("utf-8")).hexdigest()
+def mip_level(scale: float):
+    for level in MIP_LEVELS:
+        if level >= scale - 1e-9:
+            return level
+    return MIP_LEVELS[-1]
+
+def scaled_size(size, scale: float):
+    width, height = size
+    return max(1, int(width * scale + 0.5)), max(1, int(height * scale + 0.5))
+
+class RasterCache:
+    '''
+    Two tier cache of rasterized chord diagrams, keyed by SVG content hash and render scale
+    inputs:
+        max_bytes: int (budget of the in-memory LRU tier)
+        cache_dir: str (directory of the persistent PNG tier, None disables it)
+    '''
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, cache_dir: str = CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.current_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        # the cache is shared with the background loaders
+        self._lock = threading.Lock()
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._check_version()
+
+    @staticmethod
+    def make_key(svg, scale: float = 1.0):
+        return RasterCache.hash_key(content_hash(svg), scale)
+
+    @staticmethod
+    def hash_key(svg_hash, scale: float = 1.0):
+        # make_key of an SVG whose content_hash is already known
+        return f"{svg_hash}_{scale:g}"
+
+    @staticmethod
+    def chord_key(chord, scale: float = 1.0, backend: str = render.DEFAULT_BACKEND):
+        return f"{definition_hash(chord.to_dict())}_{backend}_{scale:g}"
+
+    @staticmethod
+    def image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def _check_version(self):
+        version_path = os.path.join(self.cache_dir, "version")
+        try:
+            with open(version_path) as f:
+                if f.read().strip() == str(CACHE_VERSION):
+                    return
+        except OSError:
+            pass
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".png"):
+                        os.remove(entry.path)
+            with open(version_path, "w") as f:
+                f.write(str(CACHE_VERSION))
+        except OSError as e:
+            print(f"Error clearing the raster cache {self.cache_dir}: {e}")
+
+    def disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+        if image is not None:
+            instrument.count("raster_cache.hit")
+            return image
+
+        if self.cache_dir is not None:
+            path = self.disk_path(key)
+            if os.path.exists(path):
+                try:
+                    from PIL import Image
+                    with Image.open(path) as png:
+                        image = png.convert("RGB")
+                    with self._lock:
+                        self.disk_hits += 1
+                    instrument.count("raster_cache.disk_hit")
+                    self._remember(key, image)
+                    return image
+                except Exception as e:
+                    print(f"Error reading cached PNG {path}: {e}")
+        return None
+
+    def put(self, key, image, persist: bool = True):
+        self._remember(key, image)
+        if persist and self.cache_dir is not None:
+            path = self.disk_path(key)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    image.save(tmp_path, format="PNG")
+                    os.replace(tmp_path, path)
+                except Exception as e:
+                    print(f"Error writing cached PNG {path}: {e}")
+
+    def rasterize(self, svg, scale: float = 1.0, persist: bool = True):
+        '''
+        Returns the PIL image for an SVG document, rendering it only on a cache miss
+        '''
+        key = self.make_key(svg, scale)
+        image = self.get(key)
+        if image is None:
+            with self._lock:
+                self.misses += 1
+            instrument.count("raster_cache.miss")
+            image = render.svg_to_pil(svg, scale)
+            self.put(key, image, persist)
+        return image
+
+    def render_chord(self, chord, scale: float = 1.0, backend: str = render.DEFAULT_BACKEND, persist: bool = True):
+        '''
+        Returns the PIL image for a Chord, keyed by its definition so no SVG is built on a hit
+        '''
+        key = self.chord_key(chord, scale, backend)
+        image = self.get(key)
+        if image is None:
+            with self._lock:
+                self.misses += 1
+            instrument.count("raster_cache.miss")
+            image = render.render_chord(chord, scale, backend)
+            self.put(key, image, persist)
+        return image
+
+    def zoom(self, key, scale: float, size=None, render_level=None):
+        '''
+        Returns the scale 1 image stored under key at another scale: a cache lookup, or a resample of the
+        nearest mipmap level at or above the scale. Zoomed images are only kept in memory
+        inputs:
+            size: (width, height) of the result, defaults to the scale 1 size times scale
+            render_level: function of a scale returning the image at that scale (e.g. a render_chord call),
+                without it the scale 1 image is resampled
+        '''
+        if size is not None and scale != 1.0:
+            image = self.get(f"{key}@{size[0]}x{size[1]}")
+            if image is not None:
+                return image
+
+        base = render_level(1.0) if render_level is not None else self.get(key)
+        if base is None or base.size == size or (size is None and scale == 1.0):
+            return base
+        if size is None:
+            size = scaled_size(base.size, scale)
+            image = self.get(f"{key}@{size[0]}x{size[1]}")
+            if image is not None:
+                return image
+
+        level = mip_level(scale)
+        source = render_level(level) if render_level is not None and level != 1.0 else base
+        with instrument.stage("render.resample"):
+            from PIL import Image
+            image = source if source.size == size else source.resize(size, Image.Resampling.LANCZOS)
+        self.put(f"{key}@{size[0]}x{size[1]}", image, persist=False)
+        return image
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.current_bytes = 0
+
+    def _remember(self, key, image):
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return
+            self._images[key] = image
+            self.current_bytes += self.image_bytes(image)
+            # evict least recently used images, but always keep the newest one
+            while self.current_bytes > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self.current_bytes -= self.image_bytes(evicted)
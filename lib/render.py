@@ -0,0 +1,72 @@
+import io
+import lib.instrument as instrument
+
+# svglib, reportlab and PIL take most of the startup time of anything that imports them, so they are
+# imported on first use (or ahead of it with preload) rather than with this module
+
+# "raster" draws Chord geometry straight into PIL, "svg" goes through svglib + renderPM
+BACKENDS = ("raster", "svg")
+DEFAULT_BACKEND = "raster"
+
+def preload():
+    '''
+    Imports the rendering stack, so the first render doesn't pay for it
+    '''
+    import svgwrite
+    from svglib.svglib import svg2rlg
+    from reportlab.graphics import renderPM
+    import lib.raster_backend as raster_backend
+
+def svg_to_drawing(svg):
+    '''
+    Parses an SVG document held in memory (str or bytes) into a ReportLab Drawing
+    '''
+    from svglib.svglib import svg2rlg
+
+    if isinstance(svg, str):
+        svg = svg.encode("utf-8")
+    with instrument.stage("render.svg2rlg"):
+        drawing = svg2rlg(io.BytesIO(svg))
+    if drawing is None:
+        raise ValueError("Unable to read SVG document")
+    return drawing
+
+def scale_drawing(drawing, scale: float):
+    '''
+    Scales a Drawing in place, strokes included: renderPM draws stroke widths in output pixels whatever
+    the drawing transform or dpi, so they are scaled by hand
+    '''
+    nodes = [drawing]
+    while nodes:
+        node = nodes.pop()
+        if getattr(node, "strokeWidth", None):
+            node.strokeWidth *= scale
+        nodes.extend(getattr(node, "contents", ()))
+    drawing.scale(scale, scale)
+    drawing.width *= scale
+    drawing.height *= scale
+    return drawing
+
+def svg_to_pil(svg, scale: float = 1.0):
+    '''
+    Rasterizes an in-memory SVG document straight to a PIL image
+    '''
+    from reportlab.graphics import renderPM
+
+    drawing = svg_to_drawing(svg)
+    if scale != 1.0:
+        scale_drawing(drawing, scale)
+    with instrument.stage("render.renderPM"):
+        return renderPM.drawToPIL(drawing, dpi=72)
+
+def render_chord(chord, scale: float = 1.0, backend: str = DEFAULT_BACKEND):
+    '''
+    Rasterizes a Chord with the chosen backend
+    '''
+    if backend == "raster":
+        import lib.raster_backend as raster_backend
+        with instrument.stage("render.raster_backend"):
+            return raster_backend.chord_to_pil(chord, scale)
+    if backend == "svg":
+        return svg_to_pil(chord.to_svg(), scale)
+    raise ValueError(f"Unknown render backend: {backend}")
@@ -0,0 +1,315 @@
+'''
+Local HTTP service that renders chord diagrams for other tools, without the GUI.
+
+    python -m lib.render_server --port 8765 --workers 4
+
+    POST /render?format=png&scale=2     body: a chord definition in the Chord.__init__ shape (JSON)
+    GET  /render?format=svg&chord=...   the definition URL encoded in the query, for <img src=...>
+    GET  /health                        "ok" once the server is up
+    GET  /stats                         request, cache and render counts (JSON)
+
+A definition looks like {"num_strings": 6, "title": "F", "notes": [[5, 3], [4, 3]], "barres": [[1, 1, 2]], "mute": [3]}.
+Renders run on a process pool. Responses are cached by the hash of the normalized definition, format and
+scale, which is also the ETag, so a request with a matching If-None-Match gets a 304 without rendering,
+and identical requests in flight at the same time share one render.
+'''
+import argparse
+import hashlib
+import io
+import json
+import signal
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import lib.chord_diagram_gen as cg
+from lib.raster_cache import definition_hash, scaled_size
+
+FORMATS = {"svg": "image/svg+xml", "png": "image/png"}
+MAX_SCALE = 8.0
+MAX_STRINGS = 12
+# largest diagram param (padding, spacings, thicknesses) in scale 1 pixels, and largest PNG a request may ask for
+MAX_PARAM = 200
+MAX_PIXELS = 4096 * 4096
+MAX_BODY_BYTES = 64 * 1024
+RENDER_TIMEOUT_S = 30
+# responses are addressed by their content, so clients may keep them as long as they like
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def init_worker():
+    # Ctrl+C reaches the whole process group; the server stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import lib.render as render
+    render.preload()
+
+def render_response(definition, format, scale):
+    '''
+    Renders one normalized definition; runs in a worker process
+    returns: the response body (bytes)
+    '''
+    chord = cg.Chord.from_dict(definition)
+    if format == "svg":
+        return chord.to_svg().encode("utf-8")
+    import lib.render as render
+    buffer = io.BytesIO()
+    render.render_chord(chord, scale).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class ResponseCache:
+    '''
+    Thread-safe LRU of response bodies by key, bounded by total size
+    '''
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self.current_bytes += len(body)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+class RenderService:
+    '''
+    Validates render requests and answers them from the response cache or the process pool
+    inputs:
+        workers: int (None for the cpu count)
+        cache_bytes: int (response cache size)
+    '''
+    def __init__(self, workers: int = None, cache_bytes: int = 64 * 1024 * 1024):
+        # workers import the rendering stack up front, so the first requests don't pay for it
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        self.cache = ResponseCache(cache_bytes)
+        self.stats = {"requests": 0, "cache_hits": 0, "not_modified": 0, "shared": 0, "renders": 0, "errors": 0}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def close(self, wait: bool = True):
+        # waiting reaps the worker processes, which would otherwise outlive the server
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(cache_entries=len(self.cache), cache_bytes=self.cache.current_bytes)
+        return stats
+
+    @staticmethod
+    def request_key(definition, format, scale):
+        '''
+        Normalizes a request (raising ValueError when it isn't valid)
+        returns: (normalized definition, format, scale, key)
+        '''
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported format: {format!r} (expected one of {', '.join(FORMATS)})")
+        if not 0 < scale <= MAX_SCALE:
+            raise ValueError(f"scale must be in (0, {MAX_SCALE:g}]")
+        if not isinstance(definition, dict):
+            raise ValueError("The chord definition must be a JSON object")
+        try:
+            chord = cg.Chord.from_dict(definition)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid chord definition: {e!r}")
+        # what Chord itself doesn't check, and would only fail in the worker
+        if not 1 <= chord.num_strings <= MAX_STRINGS:
+            raise ValueError(f"num_strings must be between 1 and {MAX_STRINGS}")
+        if not isinstance(chord.title, str):
+            raise ValueError("The title must be a string")
+        for name, value in chord.params.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value <= MAX_PARAM:
+                raise ValueError(f"params.{name} must be a number in (0, {MAX_PARAM}]")
+        chord.get_max_fret_distance()
+        definition = chord.to_dict()
+        # the scale only changes PNGs
+        scale = scale if format == "png" else 1.0
+        if format == "png":
+            from lib.raster_backend import PX_TO_PT
+            width, height = scaled_size(chord.get_size(), scale * PX_TO_PT)
+            if width * height > MAX_PIXELS:
+                raise ValueError(f"The image would be {width}x{height} pixels, over the limit of {MAX_PIXELS}")
+        key = hashlib.sha1(f"{definition_hash(definition)}_{format}_{scale:g}".encode("utf-8")).hexdigest()
+        return definition, format, scale, key
+
+    def render(self, definition, format, scale, key):
+        '''
+        returns: the response body for a normalized request, rendering it only when no identical request
+        is cached or already rendering
+        '''
+        body = self.cache.get(key)
+        if body is not None:
+            self.count("cache_hits")
+            return body
+        with self._lock:
+            future = self._in_flight.get(key)
+            submitted = future is None
+            if submitted:
+                future = self.pool.submit(render_response, definition, format, scale)
+                self._in_flight[key] = future
+                self.stats["renders"] += 1
+            else:
+                self.stats["shared"] += 1
+        if submitted:
+            # outside the lock: it runs right here when the render already finished
+            future.add_done_callback(lambda done: self._finish(key, done))
+        return future.result(timeout=RENDER_TIMEOUT_S)
+
+    def _finish(self, key, future):
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+class RenderHandler(BaseHTTPRequestHandler):
+    # keep-alive, so clients can reuse connections; every response sets Content-Length
+    protocol_version = "HTTP/1.1"
+    server_version = "reChord"
+    service = None
+    quiet = True
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type, headers = ()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_error_message(self, status, message):
+        self.service.count("errors")
+        self.send_body(status, json.dumps({"error": message}).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/health":
+            return self.send_body(200, b"ok", "text/plain")
+        if url.path == "/stats":
+            return self.send_body(200, json.dumps(self.service.snapshot()).encode("utf-8"), "application/json")
+        if url.path != "/render":
+            return self.send_error_message(404, f"Unknown path: {url.path}")
+        if "chord" not in query:
+            return self.send_error_message(400, "Missing chord query parameter")
+        self.handle_render(query.get("chord")[0], query)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/render":
+            return self.send_error_message(404, f"Unknown path: {url.path}")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True
+            return self.send_error_message(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self.send_error_message(413, f"Request body over {MAX_BODY_BYTES} bytes")
+        self.handle_render(self.rfile.read(length), parse_qs(url.query))
+
+    def handle_render(self, data, query):
+        self.service.count("requests")
+        try:
+            definition = json.loads(data)
+            format = query.get("format", ["svg"])[0].lower()
+            scale = float(query.get("scale", ["1"])[0])
+            definition, format, scale, key = self.service.request_key(definition, format, scale)
+        except ValueError as e:
+            return self.send_error_message(400, str(e))
+        except RecursionError:
+            return self.send_error_message(400, "The request body is nested too deeply")
+
+        etag = f'"{key}"'
+        headers = (("ETag", etag), ("Cache-Control", CACHE_CONTROL))
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.service.count("not_modified")
+            self.send_response(304)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        try:
+            body = self.service.render(definition, format, scale, key)
+        except Exception as e:
+            return self.send_error_message(500, f"Error rendering chord: {e}")
+        self.send_body(200, body, FORMATS[format], headers)
+
+def make_server(host, port, service, quiet = True):
+    '''
+    returns: a ThreadingHTTPServer answering render requests with service; call serve_forever() on it
+    '''
+    handler = type("BoundRenderHandler", (RenderHandler,), {"service": service, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Serve chord diagram renders (SVG/PNG) over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="render processes (default: cpu count)")
+    parser.add_argument("--cache-mb", type=float, default=64, help="response cache size in MB")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    service = RenderService(args.workers, int(args.cache_mb * 1024 * 1024))
+    try:
+        server = make_server(args.host, args.port, service, quiet=not args.verbose)
+    except OSError as e:
+        print(f"Error listening on {args.host}:{args.port}: {e}")
+        service.close()
+        return 1
+    print(f"Serving chord renders on http://{args.host}:{server.server_address[1]}", flush=True)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, which runs on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    # SIGBREAK is Ctrl+Break on Windows
+    for name in ("SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+'''
+Save files (./save/<name>.json)
+
+version 1 (name only):
+    {"chord_names": ["F", "G", ...]}
+
+version 2 (self-contained):
+    {
+        "version": 2,
+        "chord_names": ["F", ...],      # kept so older versions can still read the file
+        "chords": [
+            {"name": "F", "definition": {<Chord.to_dict()>} or null, "png": "<base64 PNG>" (optional)},
+            ...
+        ]
+    }
+'''
+import base64
+import io
+
+SAVE_VERSION = 2
+
+def encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def decode_png(data: str):
+    from PIL import Image
+    with Image.open(io.BytesIO(base64.b64decode(data))) as png:
+        return png.convert("RGB")
+
+def build_save(chord_names, definitions, images = None):
+    '''
+    Builds a version 2 save
+    inputs:
+        chord_names: [str, ...]
+        definitions: [dict or None, ...] (Chord.to_dict() of each chord, None when unknown)
+        images: [PIL image or None, ...] to embed as PNG, or None to skip embedding
+    '''
+    chords = []
+    for index, chord_name in enumerate(chord_names):
+        entry = {"name": chord_name, "definition": definitions[index]}
+        if images is not None and images[index] is not None:
+            entry["png"] = encode_png(images[index])
+        chords.append(entry)
+    return {"version": SAVE_VERSION, "chord_names": list(chord_names), "chords": chords}
+
+def read_save(save_data: dict):
+    '''
+    Normalizes a save of any version into a list of {"name", "definition", "png"} entries
+    '''
+    version = save_data.get("version", 1)
+    if version == 1:
+        return [{"name": chord_name, "definition": None, "png": None} for chord_name in save_data["chord_names"]]
+    if version > SAVE_VERSION:
+        raise ValueError(f"Save file version {version} is newer than this version of reChord supports")
+    return [
+        {"name": chord["name"], "definition": chord.get("definition"), "png": chord.get("png")}
+        for chord in save_data["chords"]
+    ]
@@ -0,0 +1,84 @@
+import os
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import lib.chord_diagram_gen as cg
+import lib.instrument as instrument
+from lib.raster_cache import RasterCache, content_hash
+from lib.save_format import decode_png
+
+LoadResult = namedtuple("LoadResult", ["index", "name", "image", "definition", "key", "error"])
+
+def load_entry(entry, raster_cache, svg_dir = './tmp/svg', library = None):
+    '''
+    Rasterizes one save entry (see lib.save_format.read_save) without touching Tk:
+    embedded PNG first, then the stored definition, then the chord's SVG from the library
+    (svg_dir or the pack), or from svg_dir when there is no library
+    returns: (PIL image, definition, raster cache key)
+    '''
+    if entry["png"]:
+        try:
+            key = f"{content_hash(entry['png'])}_png"
+            image = raster_cache.get(key)
+            if image is None:
+                image = decode_png(entry["png"])
+                # persisted so a virtualized canvas can fetch it again after eviction
+                raster_cache.put(key, image)
+            return image, entry["definition"], key
+        except Exception as e:
+            print(f"Error decoding saved image for {entry['name']}: {e}")
+    if entry["definition"]:
+        chord = cg.Chord.from_dict(entry["definition"])
+        return raster_cache.render_chord(chord), entry["definition"], RasterCache.chord_key(chord)
+    try:
+        if library is not None:
+            svg_data = library.read_svg(f"{entry['name']}.svg")
+        else:
+            with open(os.path.join(svg_dir, f"{entry['name']}.svg"), 'rb') as f:
+                svg_data = f.read()
+    except OSError:
+        raise ValueError("no saved image, definition or SVG file")
+    return raster_cache.rasterize(svg_data), cg.read_definition(svg_data), RasterCache.make_key(svg_data)
+
+class SetLoader:
+    '''
+    Loads the entries of a save on a worker pool, off the Tk thread.
+    Finished chords are put on the results queue as LoadResults in completion order;
+    the consumer is expected to place them by index.
+    inputs:
+        entries: [{"name", "definition", "png"}, ...] (lib.save_format.read_save)
+        raster_cache: RasterCache
+        workers: int (None for the ThreadPoolExecutor default)
+        library: ChordLibrary the SVGs of entries without an image or definition are read from
+    '''
+    def __init__(self, entries, raster_cache, workers: int = None, library = None):
+        self.entries = entries
+        self.raster_cache = raster_cache
+        self.library = library
+        self.results = queue.Queue()
+        self.cancelled = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rechord-load")
+        # submitted in saved order so the first chords are ready first
+        self._futures = [self._pool.submit(self._load, index, entry) for index, entry in enumerate(entries)]
+        self._pool.shutdown(wait=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self._futures:
+            future.cancel()
+
+    def _load(self, index, entry):
+        if self.cancelled.is_set():
+            return
+        try:
+            with instrument.stage("load.entry"):
+                image, definition, key = load_entry(entry, self.raster_cache, library=self.library)
+            result = LoadResult(index, entry["name"], image, definition, key, None)
+        except Exception as e:
+            result = LoadResult(index, entry["name"], None, None, None, e)
+        if not self.cancelled.is_set():
+            self.results.put(result)
@@ -0,0 +1,225 @@
+'''
+Exports a set of chords as one chord sheet: SVG, PNG or multi-page PDF.
+
+Chords are laid out in order, wrapping rows at a width the same way the main canvas does, and are written
+out as they are laid out: the SVG is written chord by chord, the PNG is encoded in horizontal bands and the
+PDF page by page, so a songbook of thousands of chords exports without holding the whole sheet in memory.
+
+    python -m lib.sheet_export save/songbook.json -o songbook.pdf --width 800
+'''
+import argparse
+import base64
+import io
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from collections import OrderedDict
+import lib.chord_diagram_gen as cg
+from lib.layout import FlowLayout
+from lib.raster_cache import definition_hash, scaled_size
+
+FORMATS = ("svg", "png", "pdf")
+# height of the strips the PNG is rendered and encoded in
+PNG_BAND_HEIGHT = 256
+PDF_MARGIN = 36
+# parsed chord drawings kept for repeats while writing a PDF
+PDF_DRAWING_CACHE = 64
+
+def chord_size(definition):
+    '''
+    Returns the scale 1 raster size of a chord definition, the size it has on the canvas
+    '''
+    from lib.raster_backend import PX_TO_PT
+    return scaled_size(cg.Chord.from_dict(definition).get_size(), PX_TO_PT)
+
+def export_format(path, format = None):
+    format = (format or os.path.splitext(path)[1][1:]).lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported sheet format: {format!r} (expected one of {', '.join(FORMATS)})")
+    return format
+
+def export_sheet(path, definitions, width, load_image = None, sizes = None, format = None, scale = 1.0):
+    '''
+    Writes the chords to one sheet at path
+    inputs:
+        definitions: [Chord.to_dict() or None, ...] in sheet order
+        width: wrap width, in scale 1 pixels
+        load_image: function(index) -> scale 1 PIL image, for chords without a definition
+        sizes: [(width, height), ...] scale 1 sizes, computed from the definitions when omitted
+        format: "svg", "png" or "pdf", from the extension of path when omitted
+        scale: output scale of SVG and PNG sheets (PDF sheets are fitted to the page)
+    returns: number of chords written
+    '''
+    format = export_format(path, format)
+    if sizes is None:
+        sizes = [chord_size(definition) if definition else load_image(index).size for index, definition in enumerate(definitions)]
+    layout = FlowLayout(sizes, width)
+    positions, height = layout.positions, layout.content_height()
+    sheet_width = max((x + size[0] for (x, _), size in zip(positions, sizes)), default=1)
+    writers = {"svg": write_svg, "png": write_png, "pdf": write_pdf}
+    writers[format](path, definitions, sizes, positions, (sheet_width, max(height, 1)), load_image, scale)
+    return len(definitions)
+
+def chord_image(index, definition, size, load_image, scale):
+    import lib.render as render
+    if definition:
+        return render.render_chord(cg.Chord.from_dict(definition), scale)
+    if load_image is None:
+        raise ValueError(f"chord #{index} has no definition and no image")
+    image = load_image(index)
+    if image is None:
+        raise ValueError(f"chord #{index} has no definition and no cached image")
+    target = scaled_size(size, scale)
+    return image if image.size == target else image.resize(target)
+
+def image_data_uri(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def write_svg(path, definitions, sizes, positions, sheet_size, load_image, scale):
+    import svgwrite
+    from svgwrite.container import Defs, Group
+    from lib.raster_backend import PX_TO_PT
+
+    # a scratch drawing supplies the element factories; each chord's new symbols are written just before it
+    drawing = svgwrite.Drawing(debug=False)
+    defined = set()
+    sheet_width, sheet_height = scaled_size(sheet_size, scale)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{sheet_width}" height="{sheet_height}" viewBox="0 0 {cg.compact_number(sheet_size[0])} {cg.compact_number(sheet_size[1])}">'
+        )
+        for index, definition in enumerate(definitions):
+            x, y = positions[index]
+            if definition:
+                group = Group(transform=f"translate({cg.compact_number(x)} {cg.compact_number(y)}) scale({PX_TO_PT:g})", debug=False)
+                drawing.defs = Defs(debug=False)
+                cg.Chord.from_dict(definition).add_compact_elements(drawing, group, defined)
+                if drawing.defs.elements:
+                    f.write(drawing.defs.tostring())
+                f.write(group.tostring())
+            else:
+                image = chord_image(index, definition, sizes[index], load_image, 1.0)
+                f.write(drawing.image(image_data_uri(image), insert=(x, y), size=sizes[index]).tostring())
+        f.write("</svg>")
+
+def png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+def write_png(path, definitions, sizes, positions, sheet_size, load_image, scale):
+    from PIL import Image
+
+    sheet_width, sheet_height = scaled_size(sheet_size, scale)
+    band_height = PNG_BAND_HEIGHT
+    compressor = zlib.compressobj(6)
+    # chords already rendered that reach into the current band: [(image, x, y)]
+    pending = []
+    next_index = 0
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", sheet_width, sheet_height, 8, 2, 0, 0, 0)))
+        for band_top in range(0, sheet_height, band_height):
+            band_bottom = min(band_top + band_height, sheet_height)
+            # rows start at non-decreasing y, so chords are rendered in order as the bands reach them
+            while next_index < len(definitions) and int(positions[next_index][1] * scale + 0.5) < band_bottom:
+                x, y = positions[next_index]
+                image = chord_image(next_index, definitions[next_index], sizes[next_index], load_image, scale)
+                pending.append((image, int(x * scale + 0.5), int(y * scale + 0.5)))
+                next_index += 1
+            band = Image.new("RGB", (sheet_width, band_bottom - band_top), "white")
+            for image, x, y in pending:
+                band.paste(image, (x, y - band_top))
+            pending = [(image, x, y) for image, x, y in pending if y + image.height > band_bottom]
+
+            stride = sheet_width * 3
+            raw = band.tobytes()
+            # every scanline is prefixed with filter type 0 (none)
+            scanlines = b"".join(b"\x00" + raw[row:row + stride] for row in range(0, len(raw), stride))
+            data = compressor.compress(scanlines)
+            if data:
+                f.write(png_chunk(b"IDAT", data))
+        f.write(png_chunk(b"IDAT", compressor.flush()))
+        f.write(png_chunk(b"IEND", b""))
+
+def write_pdf(path, definitions, sizes, positions, sheet_size, load_image, scale):
+    from reportlab.graphics import renderPDF
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+    import lib.render as render
+
+    page_width, page_height = letter
+    # one layout pixel is one point, shrunk to fit when the rows are wider than the page
+    fit = min(1.0, (page_width - 2 * PDF_MARGIN) / sheet_size[0])
+    printable_height = (page_height - 2 * PDF_MARGIN) / fit
+    pdf = canvas.Canvas(path, pagesize=letter)
+    drawings = OrderedDict()
+    page_top = None
+    for index, definition in enumerate(definitions):
+        x, y = positions[index]
+        chord_width, chord_height = sizes[index]
+        # a new page starts at the row of the first chord that would run past the bottom margin
+        if page_top is None:
+            page_top = y
+        elif y + chord_height - page_top > printable_height and y > page_top:
+            pdf.showPage()
+            page_top = y
+        left = PDF_MARGIN + x * fit
+        bottom = page_height - PDF_MARGIN - (y - page_top + chord_height) * fit
+
+        if definition:
+            key = definition_hash(definition)
+            drawing = drawings.pop(key, None)
+            if drawing is None:
+                drawing = render.svg_to_drawing(cg.Chord.from_dict(definition).to_svg())
+            drawings[key] = drawing
+            if len(drawings) > PDF_DRAWING_CACHE:
+                drawings.popitem(last=False)
+            pdf.saveState()
+            pdf.translate(left, bottom)
+            pdf.scale(fit, fit)
+            renderPDF.draw(drawing, pdf, 0, 0)
+            pdf.restoreState()
+        else:
+            image = chord_image(index, definition, sizes[index], load_image, 1.0)
+            pdf.drawImage(ImageReader(image), left, bottom, chord_width * fit, chord_height * fit)
+    pdf.showPage()
+    pdf.save()
+
+def main(argv = None):
+    from lib.save_format import decode_png, read_save
+
+    parser = argparse.ArgumentParser(description="Export a saved set of chords as one SVG, PNG or PDF chord sheet")
+    parser.add_argument("save", help="save file (.json)")
+    parser.add_argument("-o", "--output", required=True, help="sheet to write (.svg, .png or .pdf)")
+    parser.add_argument("--width", type=int, default=800, help="row width to wrap at, in pixels")
+    parser.add_argument("--scale", type=float, default=1.0, help="SVG/PNG output scale")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.save) as f:
+            entries = read_save(json.load(f))
+    except Exception as e:
+        print(f"Error reading {args.save}: {e}")
+        return 1
+
+    def load_image(index):
+        png = entries[index]["png"]
+        return decode_png(png) if png else None
+
+    start = time.perf_counter()
+    try:
+        count = export_sheet(args.output, [entry["definition"] for entry in entries], args.width, load_image, scale=args.scale)
+    except Exception as e:
+        print(f"Error exporting {args.output}: {e}")
+        return 1
+    print(f"Exported {count} chords to {args.output} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
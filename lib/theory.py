@@ -0,0 +1,121 @@
+import re
+
+NOTE_NAMES_SHARP = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+NOTE_NAMES_FLAT = ["C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B"]
+NATURALS = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+# Keys whose chords are conventionally spelled with flats
+FLAT_ROOTS = {5, 10, 3, 8, 1}
+
+# Intervals (semitones above the root) of each chord quality, keyed by the suffix used in chord names
+CHORD_QUALITIES = {
+    "": (0, 4, 7),
+    "m": (0, 3, 7),
+    "dim": (0, 3, 6),
+    "aug": (0, 4, 8),
+    "sus2": (0, 2, 7),
+    "sus4": (0, 5, 7),
+    "5": (0, 7),
+    "6": (0, 4, 7, 9),
+    "m6": (0, 3, 7, 9),
+    "7": (0, 4, 7, 10),
+    "maj7": (0, 4, 7, 11),
+    "m7": (0, 3, 7, 10),
+    "mMaj7": (0, 3, 7, 11),
+    "m7b5": (0, 3, 6, 10),
+    "dim7": (0, 3, 6, 9),
+    "aug7": (0, 4, 8, 10),
+    "7sus4": (0, 5, 7, 10),
+    "7sus2": (0, 2, 7, 10),
+    "add9": (0, 2, 4, 7),
+    "madd9": (0, 2, 3, 7),
+    "6/9": (0, 2, 4, 7, 9),
+    "9": (0, 2, 4, 7, 10),
+    "maj9": (0, 2, 4, 7, 11),
+    "m9": (0, 2, 3, 7, 10),
+    "7b9": (0, 1, 4, 7, 10),
+    "7#9": (0, 3, 4, 7, 10),
+    "11": (0, 2, 5, 7, 10),
+    "13": (0, 2, 4, 7, 9, 10),
+}
+
+# Other spellings accepted when parsing names
+QUALITY_ALIASES = {
+    "maj": "", "M": "", "major": "",
+    "min": "m", "-": "m", "minor": "m",
+    "M7": "maj7", "Maj7": "maj7", "ma7": "maj7",
+    "min7": "m7", "-7": "m7",
+    "mM7": "mMaj7", "mmaj7": "mMaj7",
+    "ø": "m7b5", "ø7": "m7b5", "min7b5": "m7b5",
+    "°": "dim", "o": "dim", "°7": "dim7", "o7": "dim7",
+    "+": "aug", "+7": "aug7", "7#5": "aug7",
+    "sus": "sus4", "7sus": "7sus4",
+    "2": "sus2", "4": "sus4",
+    "69": "6/9", "add2": "add9",
+}
+
+# Open string pitches (MIDI numbers) of the default tuning for each string count,
+# listed from string 1 (the right-most string of a diagram) to the lowest string
+STANDARD_TUNINGS = {
+    4: (69, 64, 60, 67),            # ukulele, gCEA
+    5: (62, 59, 55, 50, 67),        # banjo, open G (gDGBD)
+    6: (64, 59, 55, 50, 45, 40),    # guitar, EADGBE
+}
+
+NOTE_PATTERN = re.compile(r"^([A-Ga-g])([#b♯♭]*)")
+
+def parse_note(text: str):
+    '''
+    Returns (pitch class, number of characters consumed) of the note name at the start of text
+    '''
+    match = NOTE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Not a note name: {text!r}")
+    pitch_class = NATURALS[match.group(1).upper()]
+    for accidental in match.group(2):
+        pitch_class += 1 if accidental in "#♯" else -1
+    return pitch_class % 12, match.end()
+
+def parse_quality(suffix: str):
+    if suffix in CHORD_QUALITIES:
+        return suffix
+    if suffix in QUALITY_ALIASES:
+        return QUALITY_ALIASES[suffix]
+    raise ValueError(f"Unknown chord quality: {suffix!r}")
+
+def parse_chord_name(name: str):
+    '''
+    Parses a chord name like "Bbm7", "F#" or "C/G"
+    returns: (root pitch class, quality suffix, bass pitch class or None)
+    '''
+    name = name.strip()
+    root, consumed = parse_note(name)
+    rest = name[consumed:]
+    bass = None
+    # "6/9" is a quality, not a slash chord
+    slash = rest.rfind("/")
+    if slash != -1 and rest[slash + 1:slash + 2].upper() in NATURALS:
+        bass, _ = parse_note(rest[slash + 1:])
+        rest = rest[:slash]
+    return root, parse_quality(rest), bass
+
+def chord_pitch_classes(root: int, quality: str):
+    return frozenset((root + interval) % 12 for interval in CHORD_QUALITIES[quality])
+
+def note_name(pitch_class: int, prefer_flats: bool = False):
+    return (NOTE_NAMES_FLAT if prefer_flats else NOTE_NAMES_SHARP)[pitch_class % 12]
+
+def chord_name(root: int, quality: str, bass: int = None, prefer_flats: bool = None):
+    '''
+    Spells a chord name, using flats for flat keys unless prefer_flats says otherwise
+    '''
+    if prefer_flats is None:
+        prefer_flats = root in FLAT_ROOTS
+    name = note_name(root, prefer_flats) + quality
+    if bass is not None and bass != root:
+        name += "/" + note_name(bass, prefer_flats)
+    return name
+
+def default_tuning(num_strings: int):
+    if num_strings not in STANDARD_TUNINGS:
+        raise ValueError(f"No default tuning for {num_strings} strings; pass a tuning")
+    return STANDARD_TUNINGS[num_strings]
@@ -0,0 +1,219 @@
+'''
+Transposition of chords, saved sets and the whole library.
+
+    python -m lib.transpose 2 --save save/songbook.json      # writes save/songbook_+2.json
+    python -m lib.transpose -3 --library                     # adds transposed copies of every chord
+'''
+import argparse
+import json
+import os
+import sys
+import time
+import lib.chord_diagram_gen as cg
+import lib.theory as theory
+import lib.voicings as voicings
+from lib.identify import chord_frets, identify_pitches
+
+def transpose_name(title: str, semitones: int):
+    '''
+    Shifts the root (and slash bass) of a chord name, keeping the rest of the text,
+    e.g. "F# minor" +2 -> "Ab minor" (new roots are spelled like theory.chord_name, using
+    FLAT_ROOTS). Returns None when the title does not start with a note.
+    '''
+    try:
+        root, quality, bass = theory.parse_chord_name(title)
+        return theory.chord_name((root + semitones) % 12, quality, None if bass is None else (bass + semitones) % 12)
+    except ValueError:
+        pass
+    try:
+        root, consumed = theory.parse_note(title)
+    except ValueError:
+        return None
+    return theory.note_name((root + semitones) % 12, (root + semitones) % 12 in theory.FLAT_ROOTS) + title[consumed:]
+
+def is_playable(frets):
+    fretted = [fret for fret in frets if fret]
+    if any(fret is not None and fret < 0 for fret in frets):
+        return False
+    if fretted and (max(fretted) > 100 or max(fretted) - min(fretted) > 6):
+        return False
+    return voicings.Voicing(frets, 0, (0,) * len(frets)).fingers <= voicings.MAX_FINGERS
+
+def shift_frets(frets, semitones):
+    # open strings move with the shape (like a capo); muted strings stay muted
+    return [None if fret is None else fret + semitones for fret in frets]
+
+def transpose_chord(chord, semitones: int, tuning = None, rename: bool = True):
+    '''
+    Returns a new Chord a number of semitones away. The shape is moved along the neck when it can be;
+    when that would cross the nut, leave the 1-100 fret range or need too many fingers the chord is
+    re-voiced near where the moved shape would have been, and failing that the shape is moved an octave away.
+    '''
+    if tuning is None:
+        tuning = theory.default_tuning(chord.num_strings)
+    frets = chord_frets(chord)
+
+    title = chord.title
+    if rename:
+        title = transpose_name(chord.title, semitones) or title
+
+    shifted = shift_frets(frets, semitones)
+    if is_playable(shifted):
+        return voicings.Voicing(shifted, 0, tuning).to_chord(title, chord.params)
+
+    # re-voice: name what the moved shape would sound like and take the closest playable voicing
+    pitches = [tuning[string] + fret + semitones for string, fret in enumerate(frets) if fret is not None]
+    names = identify_pitches(pitches, limit=1)
+    candidates = voicings.enumerate_voicings(names[0], chord.num_strings, tuning) if names else []
+    if candidates:
+        fretted = [fret for fret in frets if fret]
+        position = min(fretted) + semitones if fretted else 0
+        best = min(candidates, key=lambda voicing: voicing.score + 0.5 * abs(min(voicing.fretted() or [0]) - position))
+        return best.to_chord(title, chord.params)
+
+    for shift in (semitones - 12, semitones + 12):
+        shifted = shift_frets(frets, shift)
+        if is_playable(shifted):
+            return voicings.Voicing(shifted, 0, tuning).to_chord(title, chord.params)
+    raise ValueError(f"Unable to transpose {chord.title}: no playable shape or voicing")
+
+def existing_chord(name, library, svg_dir):
+    '''
+    returns: (whether the library or svg_dir has a chord with this file name, its definition or None)
+    '''
+    record = library.get(name) if library is not None else None
+    if record is not None:
+        return True, record["definition"]
+    path = os.path.join(svg_dir, f"{name}.svg")
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return True, cg.read_definition(f.read())
+    return False, None
+
+def unique_title(definition, library, taken, svg_dir: str = './tmp/svg'):
+    '''
+    Renames a transposed definition ("D" -> "D (2)") when its name is used by anything but the same chord
+    (including diagrams without a definition), so rendering it never overwrites another chord's SVG
+    '''
+    base = definition["title"]
+    title = base
+    number = 2
+    while True:
+        name = cg.safe_filename(title)
+        if name in taken:
+            exists, existing = True, taken[name]
+        else:
+            exists, existing = existing_chord(name, library, svg_dir)
+        if not exists or existing == dict(definition, title=title):
+            return title
+        title = f"{base} ({number})"
+        number += 1
+
+def transpose_definitions(definitions, semitones: int, workers: int = None, svg_dir: str = './tmp/svg', library = None):
+    '''
+    Transposes a batch of chord definitions and renders the results into svg_dir on a process pool.
+    Identical transposed shapes are rendered once, and shapes already rendered under the same name are reused.
+    returns: ([new definition or None per input], [(index, error)])
+    '''
+    from lib.batch_render import render_batch
+
+    results = []
+    errors = []
+    for index, definition in enumerate(definitions):
+        try:
+            results.append(transpose_chord(cg.Chord.from_dict(definition), semitones).to_dict())
+        except Exception as e:
+            results.append(None)
+            errors.append((index, e))
+
+    to_render = {}
+    taken = {}
+    for index, definition in enumerate(results):
+        if definition is None:
+            continue
+        definition["title"] = unique_title(definition, library, taken, svg_dir)
+        name = cg.safe_filename(definition["title"])
+        taken[name] = definition
+        key = json.dumps(definition, sort_keys=True)
+        if key in to_render:
+            continue
+        # already rendered under the same name by an earlier run
+        if existing_chord(name, library, svg_dir)[1] == definition:
+            continue
+        to_render[key] = definition
+
+    if to_render:
+        _, render_errors, _ = render_batch(list(to_render.values()), svg_dir, ("svg",), workers)
+        errors.extend((None, error) for _, _, error in render_errors)
+    if library is not None:
+        library.reconcile()
+    return results, errors
+
+def transpose_save(save_path: str, semitones: int, output_path: str = None, workers: int = None, library = None):
+    '''
+    Writes a transposed copy of a save (version 2, definitions only) and renders its chords
+    '''
+    from lib.save_format import build_save, read_save
+    with open(save_path, 'r') as f:
+        entries = read_save(json.load(f))
+
+    definitions = []
+    for entry in entries:
+        definition = entry["definition"]
+        if definition is None:
+            # version 1 saves only name the chords; their SVGs may be loose files or only in the pack
+            try:
+                if library is not None:
+                    definition = cg.read_definition(library.read_svg(f"{entry['name']}.svg"))
+                else:
+                    with open(os.path.join('./tmp/svg', f"{entry['name']}.svg"), 'rb') as f:
+                        definition = cg.read_definition(f.read())
+            except OSError:
+                pass
+        if definition is None:
+            print(f"Error transposing {entry['name']}: no chord definition saved")
+            continue
+        definitions.append(definition)
+
+    results, errors = transpose_definitions(definitions, semitones, workers, library=library)
+    kept = [definition for definition in results if definition is not None]
+    if output_path is None:
+        base, extension = os.path.splitext(save_path)
+        output_path = f"{base}_{semitones:+d}{extension}"
+    with open(output_path, 'w') as f:
+        json.dump(build_save([cg.safe_filename(definition["title"]) for definition in kept], kept), f)
+    return output_path, errors
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Transpose saved sets or the whole chord library")
+    parser.add_argument("semitones", type=int, help="semitones to shift by (negative for down)")
+    parser.add_argument("--save", nargs="*", default=[], help="save files to transpose")
+    parser.add_argument("--library", action="store_true", help="add transposed copies of every chord in the library")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="render worker processes")
+    args = parser.parse_args(argv)
+
+    from lib.library import ChordLibrary
+    library = ChordLibrary()
+    library.reconcile()
+    start = time.perf_counter()
+    failed = 0
+
+    for save_path in args.save:
+        output_path, errors = transpose_save(save_path, args.semitones, workers=args.workers, library=library)
+        failed += len(errors)
+        print(f"{save_path} -> {output_path}")
+        for _, error in errors:
+            print(f"  Error: {error}")
+
+    if args.library:
+        definitions = [record["definition"] for record in map(library.get, library.chord_names()) if record and record["definition"]]
+        results, errors = transpose_definitions(definitions, args.semitones, args.workers, library=library)
+        failed += len(errors)
+        print(f"Transposed {sum(1 for result in results if result)} of {len(definitions)} library chords")
+        for _, error in errors:
+            print(f"  Error: {error}")
+    print(f"Done in {time.perf_counter() - start:.2f}s ({failed} errors)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+'''
+Playable voicing search over the fretboard.
+
+A voicing is a tuple of frets indexed from string 1 (the right-most string of a diagram):
+None is a muted string, 0 an open string, n a fretted note.
+
+    python -m lib.voicings Bbm7 --strings 6 --limit 10
+'''
+import argparse
+import sys
+import time
+from functools import lru_cache
+import lib.chord_diagram_gen as cg
+import lib.theory as theory
+
+# Fingers available to fret notes (a barre takes one)
+MAX_FINGERS = 4
+# Default largest distance between the lowest and highest fretted note; the diagram shows 4 frets
+MAX_SPAN = 3
+MAX_FRET = 15
+
+class Voicing:
+    '''
+    One playable fingering, with the barres and notes in the shapes Chord.__init__ takes
+    inputs:
+        frets: (fret or None per string, from string 1)
+        root: int (pitch class of the chord root, used for scoring)
+    '''
+    def __init__(self, frets, root, tuning):
+        self.frets = tuple(frets)
+        self.num_strings = len(self.frets)
+        self.muted_strings = [string for string, fret in enumerate(self.frets, 1) if fret is None]
+        self.barres, self.notes = find_barres(self.frets)
+        self.fingers = len(self.notes) + len(self.barres)
+        self.score = playability_score(self, root, tuning)
+
+    def __repr__(self):
+        return f"Voicing({self.shape()}, score={self.score:.2f})"
+
+    def shape(self):
+        '''
+        The usual tab-style spelling, lowest string first, e.g. "x13121"
+        '''
+        return "".join("x" if fret is None else (str(fret) if fret < 10 else f"({fret})") for fret in reversed(self.frets))
+
+    def fretted(self):
+        return [fret for fret in self.frets if fret]
+
+    def starting_fret(self):
+        fretted = self.fretted()
+        if not fretted or max(fretted) <= 4:
+            return 1
+        return min(fretted)
+
+    def to_chord(self, title: str = "", params: dict = {}):
+        return cg.Chord(
+            self.num_strings,
+            title = title,
+            starting_fret = self.starting_fret(),
+            notes = list(self.notes),
+            barres = list(self.barres),
+            mute = list(self.muted_strings),
+            params = params
+        )
+
+def find_barres(frets):
+    '''
+    Splits fretted strings into barres and single notes, the way CreatePopup.get_barres reads a grid:
+    a barre lies across the lowest fretted fret when it is held on two or more strings and
+    every string between them is fretted at or above it.
+    returns: ([(fret, starting string, ending string)], [(string, fret)])
+    '''
+    fretted = [fret for fret in frets if fret]
+    if not fretted:
+        return [], []
+    lowest = min(fretted)
+    at_lowest = [string for string, fret in enumerate(frets, 1) if fret == lowest]
+    barres = []
+    if len(at_lowest) >= 2:
+        first, last = at_lowest[0], at_lowest[-1]
+        if all(frets[string - 1] and frets[string - 1] >= lowest for string in range(first, last + 1)):
+            barres.append((lowest, first, last))
+    notes = []
+    for string, fret in enumerate(frets, 1):
+        if not fret:
+            continue
+        if barres and fret == lowest and barres[0][1] <= string <= barres[0][2]:
+            continue
+        notes.append((string, fret))
+    return barres, notes
+
+def playability_score(voicing, root, tuning):
+    '''
+    Lower is easier: penalizes stretch, fingers, height on the neck, muted strings
+    (more so between sounding strings), open strings under a high shape
+    and a bass note other than the root
+    '''
+    frets = voicing.frets
+    fretted = voicing.fretted()
+    span = max(fretted) - min(fretted) if fretted else 0
+    sounding = [string for string, fret in enumerate(frets) if fret is not None]
+    lowest, highest = min(sounding), max(sounding)
+    inner_mutes = sum(1 for string in range(lowest, highest + 1) if frets[string] is None)
+    bass = bass_pitch(frets, tuning) % 12
+    position = min(fretted) if fretted else 0
+
+    # muting the bass strings is how open chords are played; climbing the neck costs more than that
+    score = 1.5 * span + voicing.fingers + 0.5 * position + len(voicing.muted_strings) + 3 * inner_mutes
+    score -= 0.5 * len(sounding)
+    if bass != root:
+        score += 3
+    if voicing.barres:
+        score += 0.5
+    # open strings ringing against a shape high up the neck
+    if position > 4 and len(fretted) < len(sounding):
+        score += 2
+    return score
+
+def bass_pitch(frets, tuning):
+    '''
+    The lowest sounding pitch, which isn't always on the lowest sounding string (x(10)0... sounds the open A
+    under the fretted D)
+    '''
+    return min(tuning[string] + fret for string, fret in enumerate(frets) if fret is not None)
+
+@lru_cache(maxsize=None)
+def string_candidates(open_pitch, mask, base, max_span):
+    '''
+    Frets of one string that sound a chord tone: open, then base..base+max_span
+    '''
+    candidates = []
+    if mask >> (open_pitch % 12) & 1:
+        candidates.append(0)
+    for fret in range(max(base, 1), base + max_span + 1):
+        if mask >> ((open_pitch + fret) % 12) & 1:
+            candidates.append(fret)
+    return tuple(candidates)
+
+def pitch_mask(pitch_classes):
+    mask = 0
+    for pitch_class in pitch_classes:
+        mask |= 1 << pitch_class
+    return mask
+
+def search(tuning, chord_mask, required_mask, bass_mask, max_span, max_fret, min_strings):
+    '''
+    Depth first search over every window of max_span + 1 frets, from the lowest string up.
+    Prunes on uncovered required tones vs. strings left, the sounding string count, a
+    lower bound on the fingers needed and a bass (the lowest pitch so far) outside bass_mask
+    that no string left can go under.
+    '''
+    num_strings = len(tuning)
+    found = set()
+
+    for base in range(1, max_fret - max_span + 1):
+        candidates = [string_candidates(tuning[string], chord_mask, base, max_span) for string in range(num_strings)]
+        # lowest pitch strings 1..string + 1 can still sound (index string)
+        lowest_left = []
+        for string in range(num_strings):
+            pitches = [tuning[string] + fret for fret in candidates[string]]
+            lowest_left.append(min(pitches + lowest_left[-1:], default=float("inf")))
+        frets = [None] * num_strings
+
+        def visit(string, covered, sounding, low, notes_total, notes_at_low, bass):
+            # string counts down from the lowest string (index num_strings - 1) to string 1 (index 0)
+            missing = bin(required_mask & ~covered).count("1")
+            if missing > string + 1 or sounding + string + 1 < min_strings:
+                return
+            if notes_total and (notes_total - notes_at_low) + 1 > MAX_FINGERS:
+                return
+            bass_ok = bass is not None and bass_mask >> bass % 12 & 1
+            if bass is not None and not bass_ok and (string < 0 or lowest_left[string] >= bass):
+                return
+            if string < 0:
+                found.add(tuple(frets))
+                return
+
+            # muted (the pruning above keeps enough strings sounding)
+            frets[string] = None
+            visit(string - 1, covered, sounding, low, notes_total, notes_at_low, bass)
+
+            open_pitch = tuning[string]
+            for fret in candidates[string]:
+                pitch = open_pitch + fret
+                pitch_class = pitch % 12
+                below = bass is None or pitch < bass
+                # a new bass has to be allowed unless a string left can still sound under it
+                if below and not bass_mask >> pitch_class & 1 and (string == 0 or lowest_left[string - 1] >= pitch):
+                    continue
+                frets[string] = fret
+                next_bass = pitch if below else bass
+                if fret == 0:
+                    visit(string - 1, covered | 1 << pitch_class, sounding + 1, low, notes_total, notes_at_low, next_bass)
+                elif low is None or fret < low:
+                    visit(string - 1, covered | 1 << pitch_class, sounding + 1, fret, notes_total + 1, 1, next_bass)
+                elif fret == low:
+                    visit(string - 1, covered | 1 << pitch_class, sounding + 1, low, notes_total + 1, notes_at_low + 1, next_bass)
+                else:
+                    visit(string - 1, covered | 1 << pitch_class, sounding + 1, low, notes_total + 1, notes_at_low, next_bass)
+            frets[string] = None
+
+        visit(num_strings - 1, 0, 0, None, 0, 0, None)
+    return found
+
+@lru_cache(maxsize=1024)
+def _enumerate(tuning, root, quality, bass, max_span, max_fret, min_strings):
+    pitch_classes = theory.chord_pitch_classes(root, quality)
+    intervals = theory.CHORD_QUALITIES[quality]
+    required = set(pitch_classes)
+    # the fifth may be left out of chords with four or more notes
+    if len(intervals) >= 4 and 7 in intervals:
+        required.discard((root + 7) % 12)
+    if bass is not None:
+        pitch_classes = pitch_classes | {bass}
+        required.add(bass)
+        bass_mask = 1 << bass
+    else:
+        # inversions are asked for by name ("D/F#"), so a plain chord keeps its root in the bass
+        bass_mask = 1 << root
+
+    found = search(tuning, pitch_mask(pitch_classes), pitch_mask(required), bass_mask, max_span, max_fret, min_strings)
+    voicings = [Voicing(frets, root, tuning) for frets in found]
+    voicings = [voicing for voicing in voicings if voicing.fingers <= MAX_FINGERS]
+    voicings.sort(key=lambda voicing: (voicing.score, voicing.shape()))
+    return tuple(voicings)
+
+def enumerate_voicings(name: str, num_strings: int = 6, tuning = None, max_span: int = MAX_SPAN, max_fret: int = MAX_FRET, min_strings: int = None):
+    '''
+    Returns every playable voicing of a chord name (e.g. "Bbm7", "C/G"), best first
+    inputs:
+        name: str
+        num_strings: int (picks the default tuning when tuning is None)
+        tuning: (MIDI pitch of each open string, from string 1)
+        max_span: int (frets between the lowest and highest fretted notes, at most 6 like Chord.get_max_fret_distance)
+        max_fret: int (highest fret searched)
+        min_strings: int (fewest sounding strings, defaults to all but two)
+    '''
+    if tuning is None:
+        tuning = theory.default_tuning(num_strings)
+    tuning = tuple(tuning)
+    if not 0 <= max_span <= 6:
+        raise ValueError("Your hands aren't that big: fret span must be between 0 and 6")
+    if min_strings is None:
+        min_strings = max(3, len(tuning) - 2)
+    root, quality, bass = theory.parse_chord_name(name)
+    return list(_enumerate(tuning, root, quality, bass, max_span, max_fret, min(min_strings, len(tuning))))
+
+def best_voicing(name: str, num_strings: int = 6, tuning = None, **kwargs):
+    voicings = enumerate_voicings(name, num_strings, tuning, **kwargs)
+    if not voicings:
+        raise ValueError(f"No playable voicing found for {name}")
+    return voicings[0]
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="List playable voicings of a chord")
+    parser.add_argument("name", nargs="+", help="chord names, e.g. Bbm7 C/G")
+    parser.add_argument("-s", "--strings", type=int, default=6, help="number of strings (default tuning)")
+    parser.add_argument("--tuning", default=None, help="comma separated MIDI pitches from string 1, e.g. 64,59,55,50,45,40")
+    parser.add_argument("--span", type=int, default=MAX_SPAN, help="largest fret span")
+    parser.add_argument("-n", "--limit", type=int, default=10, help="voicings to list per chord")
+    parser.add_argument("-o", "--output", default=None, help="write the listed voicings as SVGs to this directory")
+    args = parser.parse_args(argv)
+
+    tuning = tuple(int(pitch) for pitch in args.tuning.split(",")) if args.tuning else None
+    start = time.perf_counter()
+    for name in args.name:
+        voicings = enumerate_voicings(name, args.strings, tuning, max_span=args.span)
+        print(f"{name}: {len(voicings)} voicings")
+        for rank, voicing in enumerate(voicings[:args.limit], 1):
+            print(f"  {voicing.shape():>12}  score {voicing.score:5.2f}")
+            if args.output:
+                import os
+                os.makedirs(args.output, exist_ok=True)
+                voicing.to_chord(name).create_image(os.path.join(args.output, f"{cg.safe_filename(name)}_{rank}.svg"))
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,22 @@
 import tkinter as tk
 from tkinter import filedialog, simpledialog, ttk
-from PIL import Image, ImageTk
+from contextlib import contextmanager
 import os
+import queue
 import sys
-from svglib.svglib import svg2rlg
-from reportlab.graphics import renderPM
+import threading
+import time
 import lib.chord_diagram_gen as cg
+import lib.instrument as instrument
+import lib.render as render
+from lib.identify import identify_chord
+from lib.layout import FlowLayout
+from lib.library import ChordLibrary
+from lib.preview_worker import PreviewWorker
+from lib.raster_cache import RasterCache, content_hash, scaled_size
+from lib.save_format import build_save, read_save
+from lib.set_loader import SetLoader
+from lib.sheet_export import export_sheet
 import json
 
 BUTTON_STYLE = {
@@ -17,6 +28,29 @@ BUTTON_STYLE = {
     "bd": 2,
     "relief": tk.RAISED,
 }
+# Bursts of <Configure> events are coalesced into one reflow per frame
+REFLOW_DELAY_MS = 16
+# Background loads are drained every LOAD_POLL_MS, spending at most LOAD_BUDGET_S per drain on the Tk thread
+LOAD_POLL_MS = 15
+LOAD_BUDGET_S = 0.012
+EXPORT_POLL_MS = 100
+# The create popup re-renders its preview once edits pause for PREVIEW_DELAY_MS, and checks for the render every PREVIEW_POLL_MS
+PREVIEW_DELAY_MS = 150
+PREVIEW_POLL_MS = 15
+# Chords within this many viewport heights above or below the view keep a PhotoImage and canvas item
+VIEWPORT_MARGIN = 1.0
+SCROLL_INCREMENT = 40
+ZOOM_LEVELS = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 3.0, 4.0)
+HIGHLIGHT_COLOR = "coral"
+# largest chord the create popup edits; its grid keeps one entry per cell of this size and hides the unused ones
+MAX_GRID_STRINGS = 6
+MAX_GRID_FRETS = 6
+# clicking a cell cycles its value
+NEXT_NOTE_VALUE = {"": "n", "n": "b", "b": ""}
+NEXT_MUTED_VALUE = {"": "x", "x": ""}
+# PIL, svglib and reportlab are imported on a background thread this long after start, once the first frame is up
+WARM_UP_DELAY_MS = 50
+
 # Shenanigans for PyInstaller
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -27,10 +61,29 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
+def preload_render_stack():
+    with instrument.stage("startup.preload"):
+        render.preload()
+        from PIL import ImageTk
+
+def show_preview(canvas, png_data):
+    # centers the image on a preview canvas, growing the canvas when a zoomed diagram doesn't fit
+    from PIL import ImageTk
+    preview_image = ImageTk.PhotoImage(png_data)
+    width = max(int(canvas.cget("width")), png_data.width)
+    height = max(int(canvas.cget("height")), png_data.height)
+    canvas.delete("all")
+    canvas.config(width=width, height=height)
+    canvas.create_image(width / 2, height / 2, image=preview_image)
+    return preview_image
+
 def create_dirs():
     os.makedirs('./save', exist_ok=True)
     os.makedirs('./tmp/svg', exist_ok=True)
 class ReChord(tk.Tk):
+    # the per chord lists, kept in step (same length and order)
+    CHORD_LISTS = ("chord_images", "chord_names", "chord_definitions", "chord_keys", "chord_sizes", "chord_items")
+
     def __init__(self):
         super().__init__()
 
@@ -38,9 +91,30 @@ class ReChord(tk.Tk):
         self.geometry("800x600")
         self.iconbitmap(resource_path("logo.ico"))
 
-        self.canvas = tk.Canvas(self, bg='white')
-        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.canvas_frame = tk.Frame(self)
+        self.canvas_frame.pack(fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(self.canvas_frame, orient=tk.VERTICAL)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.canvas_frame, bg='white', yscrollcommand=self.on_scroll, yscrollincrement=SCROLL_INCREMENT)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.config(command=self.canvas.yview)
         self.canvas.bind("<Configure>", self.on_resize)
+        # click selects a chord, dragging it drops it between the chords under the pointer
+        self.canvas.bind("<Button-1>", self.on_canvas_press)
+        self.canvas.bind("<B1-Motion>", self.on_canvas_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_canvas_release)
+        self.bind("<MouseWheel>", self.on_mousewheel)
+        self.bind("<Button-4>", self.on_mousewheel)
+        self.bind("<Button-5>", self.on_mousewheel)
+        self.bind("<Control-MouseWheel>", self.on_zoom_wheel)
+        self.bind("<Control-Button-4>", self.on_zoom_wheel)
+        self.bind("<Control-Button-5>", self.on_zoom_wheel)
+        self.bind("<Control-plus>", lambda event: self.set_zoom(self.zoom_index + 1))
+        self.bind("<Control-equal>", lambda event: self.set_zoom(self.zoom_index + 1))
+        self.bind("<Control-minus>", lambda event: self.set_zoom(self.zoom_index - 1))
+        self.bind("<Control-0>", lambda event: self.set_zoom(ZOOM_LEVELS.index(1.0)))
+        # with RECHORD_PROFILE=1, F12 prints the per-stage timings so far
+        self.bind("<F12>", lambda event: print(instrument.summary_table()))
 
         self.button_frame = tk.Frame(self)
         self.button_frame.pack(side=tk.TOP, pady=10)
@@ -60,30 +134,241 @@ class ReChord(tk.Tk):
         self.load_button = tk.Button(self.button_frame, text="Load", command=self.open_load_popup, **BUTTON_STYLE)
         self.load_button.pack(side=tk.LEFT, padx=10)
 
+        self.export_button = tk.Button(self.button_frame, text="Export", command=self.open_export_dialog, **BUTTON_STYLE)
+        self.export_button.pack(side=tk.LEFT, padx=10)
+        self.export_results = queue.Queue()
+
+        self.raster_cache = RasterCache()
+        self.library = ChordLibrary()
+        # full pass once per start for files edited in place while the app was closed
+        self.after_idle(self.library.reconcile, True)
+        # the canvas is virtualized: only chords near the viewport (the materialized set) have a
+        # PhotoImage in chord_images and an item in chord_items, the rest are None and are fetched
+        # again from the raster cache by key when scrolled into view
         self.chord_images = []
         self.chord_names = []
-        self.next_x = 0
-        self.next_y = 0
+        # definition (Chord.to_dict(), None if unknown) and raster cache key of each chord
+        self.chord_definitions = []
+        self.chord_keys = []
+        # scale 1 size of each chord, kept in step with chord_images
+        self.chord_sizes = []
+        self.chord_items = []
+        self.materialized = set()
         self.canvas_width = 800
+        # positions of the chords at their display scale sizes, updated with every edit of the chord lists
+        self.layout = FlowLayout(width=self.canvas_width)
+        self.reflow_job = None
+        self.viewport_job = None
+        # inside batch_edit, reflows are deferred to the end of the outermost batch; reflow_start is the
+        # first chord whose canvas item may be out of place (None when there is nothing to move)
+        self.edit_depth = 0
+        self.reflow_start = None
+        # index of the clicked chord, and the chord being dragged with its drop index
+        self.selected_chord = None
+        self.drag_index = None
+        self.drop_target = None
+        # chords are shown at display_scale, the zoom level times the screen's DPI over 96
+        self.hidpi_scale = max(1.0, self.winfo_fpixels('1i') / 96)
+        self.zoom_index = ZOOM_LEVELS.index(1.0)
+        self.display_scale = self.hidpi_scale
+
+        self.loader = None
+        # the pending drain_load_queue call, cancelled with the load so an old chain can't drain a new loader
+        self.load_job = None
+        self.load_pending = {}
+        self.load_next_index = 0
+        self.after(WARM_UP_DELAY_MS, self.warm_up)
+
+    def warm_up(self):
+        # the first render would otherwise block the Tk thread on importing the rendering stack
+        threading.Thread(target=preload_render_stack, daemon=True).start()
 
     def on_resize(self, event):
+        self.schedule_viewport()
+        if event.width == self.canvas_width:
+            return
         self.canvas_width = event.width
-        self.reposition_chords()
-
-    def reposition_chords(self):
-        self.canvas.delete("all")
-        self.next_x = 0
-        self.next_y = 0
-        for chord_image in self.chord_images:
-            svg_width = chord_image.width()
-            svg_height = chord_image.height()
-
-            if self.next_x + svg_width > self.canvas_width:
-                self.next_x = 0
-                self.next_y += svg_height
-
-            self.canvas.create_image(self.next_x + svg_width / 2, self.next_y + svg_height / 2, image=chord_image)
-            self.next_x += svg_width
+        self.schedule_reflow()
+
+    def schedule_reflow(self):
+        if self.reflow_job is None:
+            self.reflow_job = self.after(REFLOW_DELAY_MS, self.run_reflow)
+
+    def run_reflow(self):
+        self.reflow_job = None
+        self.reposition_chords(self.layout.set_width(self.canvas_width))
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_viewport()
+
+    def on_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.canvas.yview_scroll(-1, "units")
+        else:
+            self.canvas.yview_scroll(1, "units")
+
+    def on_zoom_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.set_zoom(self.zoom_index + 1)
+        else:
+            self.set_zoom(self.zoom_index - 1)
+
+    def set_zoom(self, zoom_index):
+        zoom_index = min(max(zoom_index, 0), len(ZOOM_LEVELS) - 1)
+        if zoom_index == self.zoom_index:
+            return
+        fraction = self.canvas.yview()[0]
+        self.zoom_index = zoom_index
+        self.display_scale = ZOOM_LEVELS[zoom_index] * self.hidpi_scale
+        for index in list(self.materialized):
+            self.release_chord(index)
+        self.layout.reset([self.layout_size(size) for size in self.chord_sizes])
+        self.layout_chords(len(self.chord_sizes))
+        self.canvas.yview_moveto(fraction)
+        self.update_viewport()
+
+    def schedule_viewport(self):
+        if self.viewport_job is None:
+            self.viewport_job = self.after(REFLOW_DELAY_MS, self.update_viewport)
+
+    def viewport_bounds(self):
+        height = max(self.canvas.winfo_height(), 1)
+        top = self.canvas.canvasy(0)
+        return top - height * VIEWPORT_MARGIN, top + height * (1 + VIEWPORT_MARGIN)
+
+    def update_viewport(self):
+        # materializes chords in or near the view and releases the rest
+        self.viewport_job = None
+        first, last = self.layout.visible_range(*self.viewport_bounds())
+        for index in [index for index in self.materialized if not first <= index < last]:
+            self.release_chord(index)
+        for index in range(first, last):
+            if index not in self.materialized:
+                self.materialize_chord(index)
+
+    def update_scrollregion(self):
+        self.canvas.config(scrollregion=(0, 0, self.canvas_width, self.layout.content_height()))
+
+    def render_scaled(self, chord, size=None, persist=True):
+        # a chord at the display scale, resampled from the nearest cached mipmap level
+        def render_level(scale):
+            return self.raster_cache.render_chord(chord, scale, persist=persist)
+        return self.raster_cache.zoom(RasterCache.chord_key(chord), self.display_scale, size, render_level)
+
+    def chord_image(self, index):
+        # the PIL image of a chord at the display scale, from the raster cache or re-rendered from its definition
+        size = scaled_size(self.chord_sizes[index], self.display_scale)
+        definition = self.chord_definitions[index]
+        image = None
+        if definition is None or self.display_scale == 1.0:
+            image = self.raster_cache.zoom(self.chord_keys[index], self.display_scale, size)
+        if image is None and definition is not None:
+            image = self.render_scaled(cg.Chord.from_dict(definition), size)
+        return image
+
+    def materialize_chord(self, index, png_data=None):
+        try:
+            if png_data is None:
+                png_data = self.chord_image(index)
+            if png_data is None:
+                raise ValueError("no cached image or definition")
+            from PIL import ImageTk
+            with instrument.stage("canvas.photoimage"):
+                chord_image = ImageTk.PhotoImage(png_data)
+            with instrument.stage("canvas.create_image"):
+                self.chord_items[index] = self.canvas.create_image(*self.layout.center(index), image=chord_image)
+                # chords never overlap each other, only the selection and drop marker drawn over them
+                self.canvas.tag_lower(self.chord_items[index])
+            self.chord_images[index] = chord_image
+            self.materialized.add(index)
+        except Exception as e:
+            print(f"Error showing chord {self.chord_names[index]}: {e}")
+
+    def release_chord(self, index):
+        self.canvas.delete(self.chord_items[index])
+        self.chord_items[index] = None
+        self.chord_images[index] = None
+        self.materialized.discard(index)
+
+    def layout_size(self, size):
+        return size if self.display_scale == 1.0 else scaled_size(size, self.display_scale)
+
+    def layout_chords(self, start=0):
+        # the layout is already up to date; only materialized items from start on can have moved, and keep their ids
+        for index in self.materialized:
+            if index >= start:
+                self.canvas.coords(self.chord_items[index], *self.layout.center(index))
+        self.update_scrollregion()
+        self.show_selection()
+
+    def reposition_chords(self, start=0):
+        '''
+        Moves the canvas items of the chords from start on to their place in the layout
+        '''
+        if self.edit_depth:
+            self.reflow_start = start if self.reflow_start is None else min(self.reflow_start, start)
+            return
+        self.layout_chords(start)
+        self.update_viewport()
+
+    def show_selection(self):
+        self.canvas.delete("selection")
+        if self.selected_chord is not None:
+            x, y = self.layout.positions[self.selected_chord]
+            width, height = self.layout.sizes[self.selected_chord]
+            self.canvas.create_rectangle(x + 1, y + 1, x + width - 1, y + height - 1, outline=HIGHLIGHT_COLOR, width=2, tags="selection")
+
+    def show_drop_marker(self, target):
+        self.canvas.delete("drop_marker")
+        if target is None:
+            return
+        if target < len(self.layout):
+            x, y = self.layout.positions[target]
+            height = self.layout.sizes[target][1]
+        else:
+            (x, y), (width, height) = self.layout.positions[-1], self.layout.sizes[-1]
+            x += width
+        self.canvas.create_line(x, y, x, y + height, fill=HIGHLIGHT_COLOR, width=3, tags="drop_marker")
+
+    def on_canvas_press(self, event):
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        self.selected_chord = self.layout.hit_test(x, y)
+        self.drag_index = self.selected_chord
+        self.drop_target = None
+        self.show_selection()
+
+    def on_canvas_drag(self, event):
+        if self.drag_index is None:
+            return
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        target = self.layout.drop_index(x, y)
+        # dropping a chord next to itself leaves it where it is
+        self.drop_target = None if target in (self.drag_index, self.drag_index + 1) else target
+        self.show_drop_marker(self.drop_target)
+
+    def on_canvas_release(self, event):
+        index, target = self.drag_index, self.drop_target
+        self.drag_index = self.drop_target = None
+        self.show_drop_marker(None)
+        if index is not None and target is not None:
+            # target counts the dragged chord itself, move_chords counts only the others
+            self.selected_chord = self.move_chords([index], target - (target > index))
+            self.show_selection()
+
+    @contextmanager
+    def batch_edit(self):
+        '''
+        Applies any number of adds, removes and moves made inside the block with a single reflow at the end
+        '''
+        self.edit_depth += 1
+        try:
+            yield
+        finally:
+            self.edit_depth -= 1
+            if self.edit_depth == 0 and self.reflow_start is not None:
+                start, self.reflow_start = self.reflow_start, None
+                self.reposition_chords(start)
 
     def open_edit_popup(self):
         popup = EditPopup(self)
@@ -105,53 +390,221 @@ class ReChord(tk.Tk):
         popup = LoadPopup(self)
         self.wait_window(popup)
 
-    def add_svg_to_canvas(self, svg_path, chord_name):
+    def open_export_dialog(self):
+        path = filedialog.asksaveasfilename(
+            parent=self, title="Export Chord Sheet", defaultextension=".pdf",
+            filetypes=[("PDF", "*.pdf"), ("SVG", "*.svg"), ("PNG", "*.png")]
+        )
+        if path:
+            self.export_canvas(path)
+
+    def export_canvas(self, path):
+        # written on a worker thread from a snapshot of the canvas, wrapped as it is shown now
+        definitions = list(self.chord_definitions)
+        keys = list(self.chord_keys)
+        sizes = list(self.chord_sizes)
+        width = self.canvas_width / self.display_scale
+
+        def load_image(index):
+            return self.raster_cache.get(keys[index])
+
+        def run():
+            try:
+                export_sheet(path, definitions, width, load_image, sizes)
+                self.export_results.put((path, None))
+            except Exception as e:
+                self.export_results.put((path, e))
+
+        self.export_button.config(text="Exporting...", state=tk.DISABLED)
+        threading.Thread(target=run, daemon=True).start()
+        self.after(EXPORT_POLL_MS, self.poll_export)
+
+    def poll_export(self):
         try:
-            drawing = svg2rlg(svg_path)
-            if drawing is None:
-                raise ValueError(f"Unable to read SVG file: {svg_path}")
-            
-            png_data = renderPM.drawToPIL(drawing)
-            chord_image = ImageTk.PhotoImage(png_data)
-
-            svg_width = drawing.width
-            svg_height = drawing.height
-
-            # wrap logic
-            if self.next_x + svg_width > self.canvas_width:
-                self.next_x = 0
-                self.next_y += svg_height
-
-            self.canvas.create_image(self.next_x + svg_width / 2, self.next_y + svg_height / 2, image=chord_image)
-            self.chord_images.append(chord_image)  
-            self.chord_names.append(chord_name)
-
-            self.next_x += svg_width
+            path, error = self.export_results.get_nowait()
+        except queue.Empty:
+            self.after(EXPORT_POLL_MS, self.poll_export)
+            return
+        if error is not None:
+            print(f"Error exporting {path}: {error}")
+        self.export_button.config(text="Export", state=tk.NORMAL)
+
+    def add_svg_to_canvas(self, filename, chord_name):
+        # a library chord, loose or packed
+        try:
+            svg_data = self.library.read_svg(filename)
+            svg_hash = content_hash(svg_data)
+            key = RasterCache.hash_key(svg_hash)
+            definition = cg.read_definition(svg_data)
+            if self.raster_cache.get(key) is None:
+                thumbnail = self.library.thumbnail(chord_name, svg_hash)
+                if thumbnail is not None:
+                    # chords with a definition are re-rendered after eviction, so only the others need a PNG on disk
+                    self.raster_cache.put(key, thumbnail, persist=definition is None)
+
+            png_data = self.raster_cache.rasterize(svg_data)
+            self.add_image_to_canvas(png_data, chord_name, definition, key)
         except Exception as e:
             print(f"Error adding SVG to canvas: {e}")
 
+    def add_definition_to_canvas(self, definition, chord_name):
+        try:
+            chord = cg.Chord.from_dict(definition)
+            png_data = self.raster_cache.render_chord(chord)
+            self.add_image_to_canvas(png_data, chord_name, definition, RasterCache.chord_key(chord))
+        except Exception as e:
+            print(f"Error adding chord to canvas: {e}")
+
+    def load_set(self, entries):
+        # replaces the canvas with a save, loaded progressively in saved order
+        self.cancel_load()
+        self.remove_all_chords()
+        self.loader = SetLoader(entries, self.raster_cache, library=self.library)
+        self.load_pending = {}
+        self.load_next_index = 0
+        self.load_button.config(text="Cancel Load", command=self.cancel_load)
+        self.load_job = self.after(LOAD_POLL_MS, self.drain_load_queue)
+
+    def drain_load_queue(self):
+        self.load_job = None
+        loader = self.loader
+        if loader is None:
+            return
+
+        while True:
+            try:
+                result = loader.results.get_nowait()
+            except queue.Empty:
+                break
+            self.load_pending[result.index] = result
+
+        start = time.perf_counter()
+        with instrument.stage("load.drain"):
+            while self.load_next_index in self.load_pending and time.perf_counter() - start < LOAD_BUDGET_S:
+                result = self.load_pending.pop(self.load_next_index)
+                self.load_next_index += 1
+                if result.error is not None:
+                    print(f"Error loading chord {result.name}: {result.error}")
+                    continue
+                self.add_image_to_canvas(result.image, result.name, result.definition, result.key)
+
+        if self.load_next_index >= len(loader):
+            self.finish_load()
+        else:
+            self.load_job = self.after(LOAD_POLL_MS, self.drain_load_queue)
+
+    def cancel_load(self):
+        if self.loader is not None:
+            self.loader.cancel()
+            self.finish_load()
+
+    def finish_load(self):
+        if self.load_job is not None:
+            self.after_cancel(self.load_job)
+            self.load_job = None
+        self.loader = None
+        self.load_pending = {}
+        self.load_button.config(text="Load", command=self.open_load_popup)
+
+    def add_image_to_canvas(self, png_data, chord_name, definition=None, key=None):
+        if key is None:
+            # chords only live in the raster cache while off screen, so every chord needs a key
+            key = f"{content_hash(png_data.tobytes())}_image"
+            self.raster_cache.put(key, png_data)
+
+        index = self.layout.append(self.layout_size(png_data.size))
+        self.chord_sizes.append(png_data.size)
+        self.chord_items.append(None)
+        self.chord_images.append(None)
+        self.chord_names.append(chord_name)
+        self.chord_definitions.append(definition)
+        self.chord_keys.append(key)
+        self.update_scrollregion()
+
+        top, bottom = self.viewport_bounds()
+        y, height = self.layout.positions[index][1], self.layout.sizes[index][1]
+        if y < bottom and y + height > top:
+            self.materialize_chord(index, png_data if self.display_scale == 1.0 else None)
+
     def remove_chord(self, index):
         if 0 <= index < len(self.chord_images):
-            self.chord_images.pop(index)
-            self.chord_names.pop(index)
-            self.reposition_chords()
+            if index in self.materialized:
+                self.release_chord(index)
+            self.materialized = {shown - (shown > index) for shown in self.materialized}
+            if self.selected_chord is not None:
+                self.selected_chord = None if self.selected_chord == index else self.selected_chord - (self.selected_chord > index)
+            for name in self.CHORD_LISTS:
+                getattr(self, name).pop(index)
+            self.reposition_chords(self.layout.remove(index))
 
     def remove_all_chords(self):
-        self.chord_images.clear()
-        self.chord_names.clear()
+        for index in self.materialized:
+            self.canvas.delete(self.chord_items[index])
+        self.materialized.clear()
+        self.selected_chord = None
+        for name in self.CHORD_LISTS:
+            getattr(self, name).clear()
+        self.layout.reset([])
         self.reposition_chords()
 
+    def reorder_chords(self, order):
+        '''
+        Keeps the chords at the indices in order, in that order, in one pass over the chord lists
+        inputs:
+            order: [int, ...] a permutation of the chord indices, or a subset of them to drop the rest
+        '''
+        new_indices = {old: new for new, old in enumerate(order)}
+        for index in [index for index in self.materialized if index not in new_indices]:
+            self.release_chord(index)
+        self.materialized = {new_indices[index] for index in self.materialized}
+        self.selected_chord = new_indices.get(self.selected_chord)
+        for name in self.CHORD_LISTS:
+            chord_list = getattr(self, name)
+            setattr(self, name, [chord_list[index] for index in order])
+        # chords before the first one that moved keep their place
+        start = next((new for new, old in enumerate(order) if new != old), len(order))
+        self.reposition_chords(self.layout.replace(start, [self.layout.sizes[index] for index in order[start:]]))
+
+    def remove_chords(self, indices):
+        removed = set(indices)
+        self.reorder_chords([index for index in range(len(self.chord_names)) if index not in removed])
+
+    def move_chords(self, indices, target):
+        '''
+        Moves the chords at indices, keeping their relative order, to position target among the other chords
+        returns: the new index of the first moved chord
+        '''
+        moving = sorted(set(indices))
+        moving_set = set(moving)
+        rest = [index for index in range(len(self.chord_names)) if index not in moving_set]
+        target = min(max(target, 0), len(rest))
+        self.reorder_chords(rest[:target] + moving + rest[target:])
+        return target
+
+    def swap_chords(self, first, second):
+        for name in self.CHORD_LISTS:
+            chord_list = getattr(self, name)
+            chord_list[first], chord_list[second] = chord_list[second], chord_list[first]
+        first_shown, second_shown = first in self.materialized, second in self.materialized
+        self.materialized.difference_update((first, second))
+        if first_shown:
+            self.materialized.add(second)
+        if second_shown:
+            self.materialized.add(first)
+        if self.selected_chord in (first, second):
+            self.selected_chord = first + second - self.selected_chord
+        start = min(first, second)
+        sizes = self.layout.sizes[start:]
+        sizes[first - start], sizes[second - start] = sizes[second - start], sizes[first - start]
+        return self.layout.replace(start, sizes)
+
     def move_chord_up(self, index):
         if 1 <= index < len(self.chord_images):
-            self.chord_images[index], self.chord_images[index-1] = self.chord_images[index-1], self.chord_images[index]
-            self.chord_names[index], self.chord_names[index-1] = self.chord_names[index-1], self.chord_names[index]
-            self.reposition_chords()
+            self.reposition_chords(self.swap_chords(index, index - 1))
 
     def move_chord_down(self, index):
         if 0 <= index < len(self.chord_images) - 1:
-            self.chord_images[index], self.chord_images[index+1] = self.chord_images[index+1], self.chord_images[index]
-            self.chord_names[index], self.chord_names[index+1] = self.chord_names[index+1], self.chord_names[index]
-            self.reposition_chords()
+            self.reposition_chords(self.swap_chords(index, index + 1))
 
 class EditPopup(tk.Toplevel):
     def __init__(self, master):
@@ -170,7 +623,7 @@ class EditPopup(tk.Toplevel):
         self.file_list_label.pack(pady=10)
 
         # file list
-        self.svg_listbox = tk.Listbox(self.left_frame)
+        self.svg_listbox = tk.Listbox(self.left_frame, selectmode=tk.EXTENDED)
         self.svg_listbox.pack(fill=tk.BOTH, expand=True)
         self.svg_listbox.bind("<<ListboxSelect>>", self.preview_svg)
 
@@ -182,10 +635,14 @@ class EditPopup(tk.Toplevel):
         self.chord_list_label = tk.Label(self.right_frame, text="Current Chords")
         self.chord_list_label.pack(pady=10)
 
-        # canvas chords
-        self.chord_listbox = tk.Listbox(self.right_frame, width=15) 
+        # canvas chords; drag a selected chord to move the selection there
+        self.chord_listbox = tk.Listbox(self.right_frame, width=15, selectmode=tk.EXTENDED)
         self.chord_listbox.pack(fill=tk.BOTH, expand=True)
         self.chord_listbox.bind("<<ListboxSelect>>", self.preview_svg)
+        self.chord_listbox.bind("<Button-1>", self.start_drag)
+        self.chord_listbox.bind("<B1-Motion>", self.drag_motion)
+        self.chord_listbox.bind("<ButtonRelease-1>", self.end_drag)
+        self.drag_start = None
 
         self.button_frame = tk.Frame(self.right_frame)
         self.button_frame.pack(fill=tk.X, pady=10)
@@ -205,25 +662,30 @@ class EditPopup(tk.Toplevel):
         self.move_down_button = tk.Button(self.button_frame, text="Move Down", command=self.move_chord_down, **BUTTON_STYLE)
         self.move_down_button.pack(side=tk.LEFT, padx=5)
 
+        self.move_to_button = tk.Button(self.button_frame, text="Move To", command=self.move_chords_to, **BUTTON_STYLE)
+        self.move_to_button.pack(side=tk.LEFT, padx=5)
+
         self.close_button = tk.Button(self.button_frame, text="Close", command=self.destroy, **BUTTON_STYLE)
         self.close_button.pack(side=tk.LEFT, padx=5)
 
-        self.preview_canvas = tk.Canvas(self, width=200, height=200)
+        self.preview_canvas = tk.Canvas(self, width=int(200 * master.hidpi_scale), height=int(200 * master.hidpi_scale))
         self.preview_canvas.pack(pady=10)
 
         self.load_svgs()
         self.load_current_chords()
 
     def load_svgs(self):
-        svg_dir = './tmp/svg'
-        self.svgs = [f for f in os.listdir(svg_dir) if f.endswith('.svg')]
-        for svg in self.svgs:
-            self.svg_listbox.insert(tk.END, svg)
+        self.master.library.reconcile()
+        self.svgs = self.master.library.chord_filenames()
+        self.svg_listbox.insert(tk.END, *self.svgs)
 
-    def load_current_chords(self):
+    def load_current_chords(self, selection=()):
         self.chord_listbox.delete(0, tk.END)
-        for chord_name in self.master.chord_names:
-            self.chord_listbox.insert(tk.END, chord_name)
+        self.chord_listbox.insert(tk.END, *self.master.chord_names)
+        for index in selection:
+            self.chord_listbox.select_set(index)
+        if selection:
+            self.chord_listbox.see(selection[0])
 
     def preview_svg(self, event):
         selected_index = self.svg_listbox.curselection()
@@ -231,14 +693,15 @@ class EditPopup(tk.Toplevel):
             return
 
         selected_svg = self.svgs[selected_index[0]]
-        svg_path = os.path.join('./tmp/svg', selected_svg)
         try:
-            drawing = svg2rlg(svg_path)
-            if drawing is None:
-                raise ValueError(f"Unable to read SVG file: {svg_path}")
-            png_data = renderPM.drawToPIL(drawing)
-            self.preview_image = ImageTk.PhotoImage(png_data)
-            self.preview_canvas.create_image(100, 100, image=self.preview_image)
+            with instrument.stage("preview.edit"):
+                svg_data = self.master.library.read_svg(selected_svg)
+                definition = cg.read_definition(svg_data)
+                if definition is not None:
+                    png_data = self.master.render_scaled(cg.Chord.from_dict(definition))
+                else:
+                    png_data = self.master.raster_cache.rasterize(svg_data, self.master.display_scale)
+                self.preview_image = show_preview(self.preview_canvas, png_data)
         except Exception as e:
             print(f"Error previewing SVG: {e}")
 
@@ -247,11 +710,11 @@ class EditPopup(tk.Toplevel):
         if not selected_index:
             return
 
-        selected_svg = self.svgs[selected_index[0]]
-        svg_path = os.path.join('./tmp/svg', selected_svg)
-        chord_name = os.path.splitext(selected_svg)[0]
-
-        self.master.add_svg_to_canvas(svg_path, chord_name)
+        with self.master.batch_edit():
+            for index in selected_index:
+                selected_svg = self.svgs[index]
+                chord_name = os.path.splitext(selected_svg)[0]
+                self.master.add_svg_to_canvas(selected_svg, chord_name)
         self.load_current_chords()
 
     def remove_chord(self):
@@ -259,33 +722,73 @@ class EditPopup(tk.Toplevel):
         if not selected_index:
             return
 
-        chord_index = selected_index[0]
-        self.master.remove_chord(chord_index)
+        self.master.remove_chords(selected_index)
         self.load_current_chords()
 
     def remove_all_chords(self):
         self.master.remove_all_chords()
         self.load_current_chords()
 
+    def move_selection(self, target):
+        # moves the selected chords as one block to position target among the unselected ones
+        selected_index = self.chord_listbox.curselection()
+        if not selected_index:
+            return
+        first = self.master.move_chords(selected_index, target)
+        self.load_current_chords(range(first, first + len(selected_index)))
+
     def move_chord_up(self):
         selected_index = self.chord_listbox.curselection()
         if not selected_index or selected_index[0] == 0:
             return
-
-        chord_index = selected_index[0]
-        self.master.move_chord_up(chord_index)
-        self.load_current_chords()
-        self.chord_listbox.select_set(chord_index - 1)
+        self.move_selection(selected_index[0] - 1)
 
     def move_chord_down(self):
         selected_index = self.chord_listbox.curselection()
-        if not selected_index or selected_index[0] == len(self.master.chord_names) - 1:
+        if not selected_index or selected_index[-1] == len(self.master.chord_names) - 1:
             return
+        self.move_selection(selected_index[0] + 1)
 
-        chord_index = selected_index[0]
-        self.master.move_chord_down(chord_index)
-        self.load_current_chords()
-        self.chord_listbox.select_set(chord_index + 1)
+    def move_chords_to(self):
+        selected_index = self.chord_listbox.curselection()
+        if not selected_index:
+            return
+        position = simpledialog.askinteger("Move To", f"Move {len(selected_index)} chord(s) to position:", parent=self, minvalue=1, maxvalue=len(self.master.chord_names))
+        if position is not None:
+            self.move_selection(position - 1)
+
+    def start_drag(self, event):
+        index = self.chord_listbox.nearest(event.y)
+        # a plain press on a selected chord starts a drag instead of resetting the selection
+        if index in self.chord_listbox.curselection() and not event.state & 0x0005:
+            self.drag_start = index
+            return "break"
+        self.drag_start = None
+
+    def drag_motion(self, event):
+        if self.drag_start is None:
+            return
+        self.chord_listbox.activate(self.chord_listbox.nearest(event.y))
+        return "break"
+
+    def end_drag(self, event):
+        if self.drag_start is None:
+            return
+        start, self.drag_start = self.drag_start, None
+        target = self.chord_listbox.nearest(event.y)
+        selected_index = self.chord_listbox.curselection()
+        if target == start:
+            # a click without a drag selects just that chord, as usual
+            self.chord_listbox.selection_clear(0, tk.END)
+            self.chord_listbox.select_set(target)
+            self.chord_listbox.event_generate("<<ListboxSelect>>")
+            return "break"
+        if target in selected_index:
+            return "break"
+        # dropped below the start the block lands after the target, above it lands before it
+        unselected_before = sum(1 for index in range(target) if index not in selected_index)
+        self.move_selection(unselected_before + (target > start))
+        return "break"
 
 class DeletePopup(tk.Toplevel):
     def __init__(self, master):
@@ -310,10 +813,9 @@ class DeletePopup(tk.Toplevel):
         self.load_svgs()
 
     def load_svgs(self):
-        svg_dir = './tmp/svg'
-        self.svgs = [f for f in os.listdir(svg_dir) if f.endswith('.svg')]
-        for svg in self.svgs:
-            self.svg_listbox.insert(tk.END, svg)
+        self.master.library.reconcile()
+        self.svgs = self.master.library.chord_filenames()
+        self.svg_listbox.insert(tk.END, *self.svgs)
 
     def delete_selected(self):
         selected_index = self.svg_listbox.curselection()
@@ -323,7 +825,10 @@ class DeletePopup(tk.Toplevel):
         selected_svg = self.svgs[selected_index[0]]
         svg_path = os.path.join('./tmp/svg', selected_svg)
         try:
-            os.remove(svg_path)
+            # first, as it refuses while the library pack is locked; packed chords may have no loose SVG
+            self.master.library.remove(os.path.splitext(selected_svg)[0])
+            if os.path.exists(svg_path):
+                os.remove(svg_path)
             self.svg_listbox.delete(selected_index)
             self.svgs.pop(selected_index[0])
         except Exception as e:
@@ -343,6 +848,10 @@ class SavePopup(tk.Toplevel):
         self.filename_entry = tk.Entry(self)
         self.filename_entry.pack(pady=10)
 
+        self.embed_images_var = tk.BooleanVar(value=True)
+        self.embed_images_check = tk.Checkbutton(self, text="Embed rendered images", variable=self.embed_images_var)
+        self.embed_images_check.pack()
+
         self.button_frame = tk.Frame(self)
         self.button_frame.pack(pady=10)
 
@@ -357,9 +866,10 @@ class SavePopup(tk.Toplevel):
         if not filename:
             return
 
-        save_data = {
-            "chord_names": self.master.chord_names
-        }
+        images = None
+        if self.embed_images_var.get():
+            images = [self.master.raster_cache.get(key) if key else None for key in self.master.chord_keys]
+        save_data = build_save(self.master.chord_names, self.master.chord_definitions, images)
 
         save_path = os.path.join('./save', f"{filename}.json")
         try:
@@ -392,10 +902,9 @@ class LoadPopup(tk.Toplevel):
         self.load_saves()
 
     def load_saves(self):
-        save_dir = './save'
-        self.saves = [f for f in os.listdir(save_dir) if f.endswith('.json')]
-        for save in self.saves:
-            self.save_listbox.insert(tk.END, save)
+        self.master.library.reconcile()
+        self.saves = self.master.library.save_filenames()
+        self.save_listbox.insert(tk.END, *self.saves)
 
     def load_selected(self):
         selected_index = self.save_listbox.curselection()
@@ -407,11 +916,7 @@ class LoadPopup(tk.Toplevel):
         try:
             with open(save_path, 'r') as f:
                 save_data = json.load(f)
-                self.master.remove_all_chords()
-                for chord_name in save_data["chord_names"]:
-                    svg_path = os.path.join('./tmp/svg', f"{chord_name}.svg")
-                    if os.path.exists(svg_path):
-                        self.master.add_svg_to_canvas(svg_path, chord_name)
+            self.master.load_set(read_save(save_data))
             self.destroy()
         except Exception as e:
             print(f"Error loading save: {e}")
@@ -433,8 +938,21 @@ class CreatePopup(tk.Toplevel):
         self.num_strings_var.set(6)
         self.num_frets_var.set(4)
 
+        # the preview follows every edit: debounced, then rendered on a worker thread
+        self.preview_worker = PreviewWorker(lambda chord: self.master.render_scaled(chord, persist=False), "preview.create")
+        self.preview_job = None
+        self.preview_poll_job = None
+
         self.create_widgets()
 
+    def destroy(self):
+        for job in (self.preview_job, self.preview_poll_job):
+            if job is not None:
+                self.after_cancel(job)
+        self.preview_job = self.preview_poll_job = None
+        self.preview_worker.close()
+        super().destroy()
+
     def create_widgets(self):
         instructions_label = tk.Label(self, text="Use 'b' for barre, 'n' for dot\n'x' for muted", font=("Helvetica", 10))
         instructions_label.pack(pady=(10, 0))
@@ -455,10 +973,10 @@ class CreatePopup(tk.Toplevel):
         tk.Spinbox(control_frame, from_=1, to=20, textvariable=self.starting_fret_var, width=3).grid(row=1, column=1, padx=5, pady=5, sticky="w")
 
         tk.Label(control_frame, text="Number of Strings:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
-        tk.Spinbox(control_frame, from_=4, to=6, textvariable=self.num_strings_var, width=3).grid(row=2, column=1, padx=5, pady=5, sticky="w")
+        tk.Spinbox(control_frame, from_=4, to=MAX_GRID_STRINGS, textvariable=self.num_strings_var, width=3).grid(row=2, column=1, padx=5, pady=5, sticky="w")
 
         tk.Label(control_frame, text="Number of Frets:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
-        tk.Spinbox(control_frame, from_=4, to=6, textvariable=self.num_frets_var, width=3).grid(row=3, column=1, padx=5, pady=5, sticky="w")
+        tk.Spinbox(control_frame, from_=4, to=MAX_GRID_FRETS, textvariable=self.num_frets_var, width=3).grid(row=3, column=1, padx=5, pady=5, sticky="w")
 
         # Muted
         self.muted_label = tk.Label(left_frame, text="Muted:", font=("Helvetica", 10))
@@ -474,6 +992,9 @@ class CreatePopup(tk.Toplevel):
         self.grid_frame = tk.Frame(left_frame)
         self.grid_frame.pack(pady=5, padx=10)
 
+        self.suggestion_label = tk.Label(left_frame, text="", font=("Helvetica", 10))
+        self.suggestion_label.pack()
+
         self.error_label = tk.Label(left_frame, text="", font=("Helvetica", 10), fg="red")
         self.error_label.pack()
 
@@ -483,7 +1004,7 @@ class CreatePopup(tk.Toplevel):
         self.preview_label = tk.Label(right_frame, text="Preview: ", font=("Helvetica", 10))
         self.preview_label.pack()
 
-        self.preview_canvas = tk.Canvas(right_frame, width=400, height=300)
+        self.preview_canvas = tk.Canvas(right_frame, width=int(400 * self.master.hidpi_scale), height=int(300 * self.master.hidpi_scale))
         self.preview_canvas.pack(pady=10, padx=10)
 
         button_frame = tk.Frame(self)
@@ -498,37 +1019,101 @@ class CreatePopup(tk.Toplevel):
         self.cancel_button = tk.Button(button_frame, text="Cancel", command=self.destroy, **BUTTON_STYLE)
         self.cancel_button.pack(side=tk.RIGHT, padx=10)
 
+        self.create_grid()
         self.num_strings_var.trace_add("write", self.update_grid)
         self.num_frets_var.trace_add("write", self.update_grid)
+        self.starting_fret_var.trace_add("write", self.on_chord_changed)
+        self.chord_name_var.trace_add("write", self.schedule_preview)
 
         self.update_grid()
 
-    def update_grid(self, *args):
-        for widget in self.grid_frame.winfo_children():
-            widget.destroy()
-        for widget in self.muted_frame.winfo_children():
-            widget.destroy()
-
-        num_frets = self.num_frets_var.get()
-        num_strings = self.num_strings_var.get()
-
-        self.entries = []
-        for fret in range(num_frets):
-            row_entries = []
-            for string in range(num_strings):
-                entry = tk.Entry(self.grid_frame, width=3) 
-                entry.grid(row=fret, column=string, padx=2, pady=2)
-                row_entries.append(entry)
-            self.entries.append(row_entries)
-
-        self.muted_entries = []
-        for string in range(num_strings):
-            entry = tk.Entry(self.muted_frame, width=3)
-            entry.grid(row=0, column=string, padx=2, pady=2)
-            self.muted_entries.append(entry)
-
+    def create_cell(self, parent, row, column, next_value):
+        entry = tk.Entry(parent, width=3)
+        entry.grid(row=row, column=column, padx=2, pady=2)
+        entry.bind("<KeyRelease>", self.on_chord_changed)
+        entry.bind("<Button-1>", lambda event: self.toggle_cell(entry, next_value))
+        return entry
+
+    def create_grid(self):
+        # one entry per cell of the largest grid, created once; update_grid only shows and hides them.
+        # Column c is string MAX_GRID_STRINGS - c, so fewer strings hide columns on the left and a
+        # cell keeps its string (and what was typed in it) when the string count changes
+        self.cell_pool = [
+            [self.create_cell(self.grid_frame, fret, column, NEXT_NOTE_VALUE) for column in range(MAX_GRID_STRINGS)]
+            for fret in range(MAX_GRID_FRETS)
+        ]
+        self.muted_pool = [self.create_cell(self.muted_frame, 0, column, NEXT_MUTED_VALUE) for column in range(MAX_GRID_STRINGS)]
+        self.grid_shape = (MAX_GRID_FRETS, MAX_GRID_STRINGS)
+        # sized once for the largest grid, so changing the grid never resizes the window
         self.update_window_size()
 
+    def update_grid(self, *args):
+        try:
+            num_frets = min(self.num_frets_var.get(), MAX_GRID_FRETS)
+            num_strings = min(self.num_strings_var.get(), MAX_GRID_STRINGS)
+        except tk.TclError:
+            # the spinbox is being typed in
+            return
+        first_column = MAX_GRID_STRINGS - num_strings
+        if (num_frets, num_strings) != self.grid_shape:
+            for fret, row in enumerate(self.cell_pool):
+                for column, entry in enumerate(row):
+                    self.show_cell(entry, fret < num_frets and column >= first_column)
+            for column, entry in enumerate(self.muted_pool):
+                self.show_cell(entry, column >= first_column)
+            self.grid_shape = (num_frets, num_strings)
+        self.entries = [row[first_column:] for row in self.cell_pool[:num_frets]]
+        self.muted_entries = self.muted_pool[first_column:]
+        self.on_chord_changed()
+
+    def show_cell(self, entry, shown):
+        if shown and not entry.winfo_manager():
+            entry.grid()
+        elif not shown and entry.winfo_manager():
+            entry.grid_remove()
+
+    def toggle_cell(self, entry, next_value):
+        value = next_value.get(entry.get().strip(), "")
+        entry.delete(0, tk.END)
+        entry.insert(0, value)
+        entry.focus_set()
+        self.on_chord_changed()
+        # skip the default click handling, which would move the cursor or select the text
+        return "break"
+
+    def on_chord_changed(self, *args):
+        self.update_suggestions()
+        self.schedule_preview()
+
+    def update_suggestions(self, *args):
+        self.suggestions = self.suggest_names()
+        if self.suggestions:
+            self.suggestion_label.config(text=f"Looks like: {', '.join(self.suggestions)}")
+        else:
+            self.suggestion_label.config(text="")
+
+    def suggest_names(self):
+        try:
+            starting_fret = self.starting_fret_var.get()
+            num_strings = self.num_strings_var.get()
+        except tk.TclError:
+            return []
+        grid = [[entry.get() for entry in row] for row in self.entries]
+        muted = [entry.get() for entry in self.muted_entries]
+        if not self.validate_chord_data(grid) or not self.validate_muted_data(muted):
+            return []
+        try:
+            chord = cg.Chord(
+                num_strings,
+                starting_fret = starting_fret,
+                notes = self.get_notes(grid, starting_fret),
+                barres = self.get_barres(grid, starting_fret, num_strings),
+                mute = self.get_muted(muted)
+            )
+            return identify_chord(chord, limit=3)
+        except ValueError:
+            return []
+
     def update_window_size(self):
         self.update_idletasks()
         width = 500
@@ -537,6 +1122,8 @@ class CreatePopup(tk.Toplevel):
 
     def create_chord(self):
         title = self.chord_name_var.get()
+        if not title and self.suggestions:
+            title = self.suggestions[0]
         starting_fret = self.starting_fret_var.get()
         num_strings = self.num_strings_var.get()
         num_frets = self.num_frets_var.get()
@@ -620,20 +1207,45 @@ class CreatePopup(tk.Toplevel):
                     notes.append((string_index + 1, starting_fret + fret_index))
         return notes
     
+    def build_chord(self, num_strings, title, starting_fret, notes, barres, mute):
+        try:
+            chord = cg.Chord(num_strings, title, starting_fret, notes, barres, mute)
+            # drawing raises on a shape no hand can play; check here so the error reaches error_label
+            chord.get_max_fret_distance()
+            return chord, ""
+        except Exception as error:
+            print(error)
+            return None, error
+
     def create_chord_svg(self, num_strings, title, starting_fret, notes, barres, mute):
+        new_chord, error = self.build_chord(num_strings, title, starting_fret, notes, barres, mute)
+        if new_chord is None:
+            return False, error
         try:
-            new_chord = cg.Chord(num_strings, title, starting_fret, notes, barres, mute)
-            new_chord.create_image()
+            new_chord.create_image(library=self.master.library)
             return True, ""
         except Exception as error:
             print(error)
             return False, error
 
+    def schedule_preview(self, *args):
+        # restarts the wait on every edit, so a burst of typing renders once
+        if self.preview_job is not None:
+            self.after_cancel(self.preview_job)
+        self.preview_job = self.after(PREVIEW_DELAY_MS, self.preview_chord)
+
     def preview_chord(self):
+        if self.preview_job is not None:
+            self.after_cancel(self.preview_job)
+            self.preview_job = None
         title = self.chord_name_var.get()
-        starting_fret = self.starting_fret_var.get()
-        num_strings = self.num_strings_var.get()
-        num_frets = self.num_frets_var.get()
+        try:
+            starting_fret = self.starting_fret_var.get()
+            num_strings = self.num_strings_var.get()
+            num_frets = self.num_frets_var.get()
+        except tk.TclError:
+            # a spinbox is being typed in
+            return
 
         chord_data = {
             "title": title,
@@ -645,10 +1257,12 @@ class CreatePopup(tk.Toplevel):
         }
 
         if not self.validate_chord_data(chord_data["grid"]):
+            self.preview_worker.cancel()
             self.error_label.config(text="Input validation failed:\nOnly 'b' or 'n' allowed in notes")
             return
         
         if not self.validate_muted_data(chord_data["muted"]):
+            self.preview_worker.cancel()
             self.error_label.config(text="Input validation failed:\nOnly 'x' allowed in notes")
             return
 
@@ -656,28 +1270,40 @@ class CreatePopup(tk.Toplevel):
         notes = self.get_notes(chord_data["grid"], starting_fret)
         mutes = self.get_muted(chord_data["muted"])
 
-        success, error = self.create_chord_svg(num_strings, chord_data["title"], starting_fret, notes, barres, mutes)
+        new_chord, error = self.build_chord(num_strings, chord_data["title"], starting_fret, notes, barres, mutes)
 
-        if not success:
+        if new_chord is None:
+            self.preview_worker.cancel()
             self.error_label.config(text=error)
             return
-
-        # Preview SVG
-        if not title:
-            title = "new_chord"
-        svg_path = f"./tmp/svg/{title}.svg"
-        try:
-            drawing = svg2rlg(svg_path)
-            if drawing is None:
-                raise ValueError(f"Unable to read SVG file: {svg_path}")
-            png_data = renderPM.drawToPIL(drawing)
-            self.preview_image = ImageTk.PhotoImage(png_data)
-            self.preview_canvas.create_image(100, 100, image=self.preview_image)
-            os.remove(svg_path)
-        except Exception as e:
-            print(f"Error previewing SVG: {e}")
+        self.error_label.config(text="")
+
+        # Preview (rendered in memory on the preview worker, nothing touches ./tmp/svg or blocks typing)
+        self.preview_worker.submit(new_chord)
+        if self.preview_poll_job is None:
+            self.preview_poll_job = self.after(PREVIEW_POLL_MS, self.poll_preview)
+
+    def poll_preview(self):
+        self.preview_poll_job = None
+        latest = None
+        while True:
+            try:
+                result = self.preview_worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if self.preview_worker.is_current(result.generation):
+                latest = result
+        if latest is not None:
+            if latest.error is not None:
+                print(f"Error previewing SVG: {latest.error}")
+                self.error_label.config(text=f"Error previewing chord:\n{latest.error}")
+            else:
+                self.preview_image = show_preview(self.preview_canvas, latest.image)
+        if self.preview_worker.busy():
+            self.preview_poll_job = self.after(PREVIEW_POLL_MS, self.poll_preview)
 
 if __name__ == "__main__":
     create_dirs()
     app = ReChord()
     app.mainloop()
+    app.library.close()
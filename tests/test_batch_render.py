@@ -0,0 +1,21 @@
+import os
+import lib.chord_diagram_gen as cg
+from lib.batch_render import file_names, render_batch
+
+def definition(title, fret):
+    return {"num_strings": 6, "title": title, "notes": [[5, fret]], "barres": [], "mute": []}
+
+def test_file_names_are_unique():
+    names = file_names([{"title": "C"}, {"title": "c"}, {"title": ""}, {"title": "C"}, {"title": "A/B"}, None, {"title": " "}])
+    assert names == ["C", "c-2", cg.DEFAULT_TITLE, "C-3", "A_B", f"{cg.DEFAULT_TITLE}-2", f"{cg.DEFAULT_TITLE}-3"]
+
+def test_batch_keeps_every_duplicate(tmp_path):
+    logged = []
+    definitions = [definition("C", 1), definition("C", 2), definition("", 3)]
+    rendered, errors, _ = render_batch(definitions, str(tmp_path), ("svg",), workers=2, log=logged.append)
+    assert (rendered, errors) == (3, [])
+    assert sorted(os.listdir(tmp_path)) == ["C-2.svg", "C.svg", f"{cg.DEFAULT_TITLE}.svg"]
+    assert len(logged) == 1
+    # a blank title is drawn with the title it is named after
+    with open(tmp_path / f"{cg.DEFAULT_TITLE}.svg", "rb") as f:
+        assert cg.read_definition(f.read())["title"] == cg.DEFAULT_TITLE
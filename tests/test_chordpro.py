@@ -0,0 +1,98 @@
+import os
+import pytest
+import lib.chord_diagram_gen as cg
+import lib.chordpro as chordpro
+import lib.voicings as voicings
+from lib.identify import identify_chord
+
+class FakeLibrary:
+    '''
+    Just the part of ChordLibrary the resolver uses
+    '''
+    def __init__(self, definitions):
+        self.definitions = definitions
+
+    def get(self, name):
+        definition = self.definitions.get(name)
+        return {"definition": dict(definition)} if definition else None
+
+    def reconcile(self):
+        pass
+
+def library_of(*names):
+    return FakeLibrary({name: voicings.best_voicing(name).to_chord(name).to_dict() for name in names})
+
+def write_song(directory, name, text):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+@pytest.mark.parametrize("name, shape", [("D", "xx0232"), ("Dm", "xx0231"), ("D7", "xx0212"), ("Dsus2", "xx0230")])
+def test_generated_chords_are_the_chords_named(name, shape):
+    definition, source = chordpro.ChordResolver().resolve(name)
+    assert source == "generated"
+    assert identify_chord(cg.Chord.from_dict(definition))[0] == name
+    assert voicings.best_voicing(name).shape() == shape
+
+def test_scan_song_skips_annotations_and_no_chord(tmp_path):
+    path = write_song(tmp_path, "song.cho", "{title: Song}\n[D]one [*riff]two [N.C.]three [D]four [G/B]five\n")
+    assert chordpro.scan_song(path) == ("Song", ["D", "G/B"])
+
+def test_songs_are_redrawn_when_a_chord_diagram_changes(tmp_path):
+    songs, sheets = tmp_path / "songs", tmp_path / "sheets"
+    songs.mkdir()
+    write_song(songs, "one.cho", "[D]one [G]two\n")
+    write_song(songs, "two.cho", "[C]three\n")
+    library = library_of("D", "G", "C")
+
+    def build():
+        return chordpro.build_songbook(str(songs), str(sheets), "svg", resolver=chordpro.ChordResolver(library), log=lambda message: None)
+
+    assert build()["written"] == 2
+    assert build()["skipped"] == 2
+    library.definitions["G"] = dict(library.definitions["G"], starting_fret=3)
+    stats = build()
+    assert (stats["written"], stats["skipped"]) == (1, 1)
+
+def test_a_song_deleted_during_the_run_is_counted_as_failed(tmp_path, monkeypatch):
+    songs = tmp_path / "songs"
+    songs.mkdir()
+    write_song(songs, "one.cho", "[C]one\n")
+    monkeypatch.setattr(chordpro, "iter_songs", lambda directory: [str(songs / "one.cho"), str(songs / "gone.cho")])
+    stats = chordpro.build_songbook(str(songs), str(tmp_path / "sheets"), "svg", resolver=chordpro.ChordResolver(library_of("C")), log=lambda message: None)
+    assert (stats["written"], stats["failed"]) == (1, 1)
+
+# drawn by hand (or by old versions of the app): no definition embedded
+CUSTOM_SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="80" height="100"><rect x="10" y="10" width="60" height="80"/></svg>'
+
+def test_library_chords_without_a_definition_are_drawn_and_kept(tmp_path, monkeypatch):
+    from lib.library import ChordLibrary
+    monkeypatch.chdir(tmp_path)
+    songs, svg_dir, save_dir = tmp_path / "songs", tmp_path / "svg", tmp_path / "save"
+    for directory in (songs, svg_dir, save_dir):
+        directory.mkdir()
+    (svg_dir / "Am.svg").write_bytes(CUSTOM_SVG)
+    write_song(songs, "one.cho", "[Am]one [E]two\n")
+    library = ChordLibrary(str(tmp_path / "library.db"), str(svg_dir), str(save_dir), None)
+    library.reconcile(True)
+    try:
+        resolver = chordpro.ChordResolver(library)
+        stats = chordpro.build_songbook(str(songs), str(tmp_path / "sheets"), "svg", resolver=resolver, svg_dir=str(svg_dir), log=lambda message: None)
+    finally:
+        library.close()
+    assert (svg_dir / "Am.svg").read_bytes() == CUSTOM_SVG
+    assert (stats["written"], stats["library"], stats["generated"]) == (1, 1, 1)
+    assert resolver.chord_hash("Am") is not None
+    assert "<image" in (tmp_path / "sheets" / "one.svg").read_text()
+
+def test_generated_voicings_never_replace_existing_files(tmp_path):
+    songs, svg_dir = tmp_path / "songs", tmp_path / "svg"
+    songs.mkdir()
+    svg_dir.mkdir()
+    (svg_dir / "Am.svg").write_bytes(CUSTOM_SVG)
+    write_song(songs, "one.cho", "[Am]one [E]two\n")
+    stats = chordpro.build_songbook(str(songs), str(tmp_path / "sheets"), "svg", svg_dir=str(svg_dir), log=lambda message: None)
+    assert (svg_dir / "Am.svg").read_bytes() == CUSTOM_SVG
+    assert (stats["written"], stats["rendered"]) == (1, 1)
+    assert sorted(os.listdir(svg_dir)) == ["Am.svg", "E.svg"]
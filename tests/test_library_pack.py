@@ -0,0 +1,117 @@
+import os
+import pytest
+import lib.chord_diagram_gen as cg
+import lib.library_pack as library_pack
+from lib.library import ChordLibrary
+from lib.library_pack import ChordPack
+
+def svg_of(title, fret = 3):
+    chord = cg.Chord(6, title, 1, [(5, fret), (4, fret)], [], [6])
+    return chord.to_svg().encode("utf-8"), chord.to_dict()
+
+@pytest.fixture
+def pack_path(tmp_path):
+    return str(tmp_path / "library.pack")
+
+def test_chords_read_back_after_reopening(pack_path):
+    pack = ChordPack(pack_path)
+    svg, definition = svg_of("A")
+    pack.put("A", svg, definition, b"png")
+    pack.put("B", *svg_of("B"))
+    pack.delete("B")
+    pack.close()
+
+    pack = ChordPack(pack_path, writable=False)
+    assert pack.names() == ["A"]
+    assert (pack.svg("A"), pack.definition("A"), pack.thumbnail("A")) == (svg, definition, b"png")
+    pack.close()
+
+def test_unflushed_writes_are_recovered_and_torn_ones_dropped(pack_path):
+    pack = ChordPack(pack_path)
+    pack.put("A", *svg_of("A"))
+    pack.flush()
+    pack.put("B", *svg_of("B"))
+    # the process dies: no index for B, and half a record after it
+    pack._close_file()
+    pack._release()
+    with open(pack_path, "ab") as f:
+        f.write(library_pack.pack_record(library_pack.CHORD, "C", b"", b"<svg/>")[:10])
+
+    pack = ChordPack(pack_path)
+    assert pack.names() == ["A", "B"]
+    pack.close()
+
+def test_compaction_keeps_only_live_records(pack_path, monkeypatch):
+    monkeypatch.setattr(library_pack, "COMPACT_MIN_BYTES", 0)
+    pack = ChordPack(pack_path)
+    for fret in range(1, 6):
+        pack.put("A", *svg_of("A", fret))
+    pack.put("B", *svg_of("B"))
+    pack.close()
+
+    pack = ChordPack(pack_path)
+    assert pack.dead_bytes == 0
+    assert pack.definition("A") == svg_of("A", 5)[1]
+    assert pack.names() == ["A", "B"]
+    pack.close()
+
+def test_a_second_writer_is_refused(pack_path):
+    pack = ChordPack(pack_path)
+    with pytest.raises(ValueError):
+        ChordPack(pack_path)
+    # readers are fine
+    ChordPack(pack_path, writable=False).close()
+    pack.close()
+    ChordPack(pack_path).close()
+
+def test_library_opens_a_locked_pack_read_only(tmp_path, pack_path):
+    writer = ChordPack(pack_path)
+    writer.put("A", *svg_of("A"))
+    writer.flush()
+    library = ChordLibrary(str(tmp_path / "library.db"), str(tmp_path / "svg"), str(tmp_path / "save"), pack_path)
+    assert library.chord_names() == ["A"]
+    with pytest.raises(ValueError):
+        library.remove("A")
+    assert library.chord_names() == ["A"]
+    library.close()
+    writer.close()
+
+def test_loose_chords_stay_out_of_the_pack(tmp_path, pack_path):
+    ChordPack(pack_path).close()
+    svg_dir = tmp_path / "svg"
+    svg_dir.mkdir()
+    library = ChordLibrary(str(tmp_path / "library.db"), str(svg_dir), str(tmp_path / "save"), pack_path)
+    (svg_dir / "A.svg").write_bytes(svg_of("A")[0])
+    library.record_svg(str(svg_dir / "A.svg"))
+    assert library.chord_names() == ["A"]
+    # deleted outside the app: gone after reconcile, with no packed copy to come back
+    os.remove(svg_dir / "A.svg")
+    library.reconcile(True)
+    assert library.chord_names() == []
+    library.close()
+
+def test_version_1_saves_find_chords_that_are_only_packed(tmp_path, monkeypatch):
+    import json
+    from lib.raster_cache import RasterCache
+    from lib.set_loader import load_entry
+    from lib.transpose import transpose_save
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("tmp/svg")
+    os.makedirs("save")
+    pack = ChordPack("library.pack")
+    svg, definition = svg_of("A")
+    pack.put("A", svg, definition)
+    pack.close()
+    with open("save/set.json", "w") as f:
+        json.dump({"chord_names": ["A"]}, f)
+
+    library = ChordLibrary("library.db", "tmp/svg", "save", "library.pack")
+    try:
+        image, loaded, _ = load_entry({"name": "A", "definition": None, "png": None}, RasterCache(cache_dir=None), library=library)
+        assert loaded == definition and image.size[0] > 1
+        output_path, errors = transpose_save("save/set.json", 2, workers=1, library=library)
+    finally:
+        library.close()
+    assert errors == []
+    with open(output_path) as f:
+        assert [chord["name"] for chord in json.load(f)["chords"]] == ["B"]
@@ -0,0 +1,106 @@
+import tkinter as tk
+from types import SimpleNamespace
+import pytest
+import main
+
+class FakeApp(SimpleNamespace):
+    # the Tk after() queue and widgets ReChord's loading methods touch
+    def __init__(self):
+        super().__init__(raster_cache=None, library=None, loader=None, load_job=None, load_pending={}, load_next_index=0, jobs={}, next_job=0)
+        self.load_button = SimpleNamespace(config=lambda **kwargs: None)
+        self.remove_all_chords = lambda: None
+        self.open_load_popup = None
+        for name in ("load_set", "drain_load_queue", "cancel_load", "finish_load"):
+            setattr(self, name, getattr(main.ReChord, name).__get__(self))
+
+    def after(self, delay, callback):
+        self.next_job += 1
+        self.jobs[self.next_job] = callback
+        return self.next_job
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+ENTRY = {"name": "C", "definition": {"num_strings": 6, "title": "C", "notes": [], "barres": [], "mute": []}}
+
+def test_reloading_cancels_the_previous_drain():
+    app = FakeApp()
+    app.load_set([ENTRY])
+    app.load_set([ENTRY])
+    assert list(app.jobs) == [app.load_job]
+
+def test_cancel_load_stops_draining():
+    app = FakeApp()
+    app.load_set([ENTRY])
+    app.cancel_load()
+    assert app.jobs == {} and app.load_job is None and app.loader is None
+
+def test_build_chord_reports_unplayable_shapes():
+    chord, error = main.CreatePopup.build_chord(None, 6, "wide", 1, [(1, 1), (2, 9)], [], [])
+    assert chord is None and "fret distance" in str(error)
+    chord, error = main.CreatePopup.build_chord(None, 6, "C", 1, [(2, 1), (4, 2), (5, 3)], [], [])
+    assert chord is not None and error == ""
+
+def test_preview_render_errors_reach_the_error_label():
+    from lib.preview_worker import PreviewWorker
+
+    def render(chord):
+        raise ValueError("Unable to draw chord")
+
+    labels = []
+    popup = SimpleNamespace(preview_poll_job=None, error_label=SimpleNamespace(config=lambda text: labels.append(text)))
+    popup.preview_worker = PreviewWorker(render)
+    popup.preview_worker.submit(None)
+    # wait for the render to fail, then hand the result back for poll_preview to pick up
+    popup.preview_worker.results.put(popup.preview_worker.results.get(timeout=5))
+    main.CreatePopup.poll_preview(popup)
+    popup.preview_worker.close()
+    assert labels and "Unable to draw chord" in labels[-1]
+
+@pytest.mark.parametrize("format", ["svg", "png", "pdf"])
+def test_export_canvas_writes_the_canvas_chords(tmp_path, format):
+    import queue
+    import lib.chord_diagram_gen as cg
+    from lib.raster_cache import RasterCache
+    from lib.sheet_export import chord_size
+    definitions = [cg.Chord(6, title, 1, [(5, 3), (4, 2)], [], [6]).to_dict() for title in ("C", "Am", "G")]
+    app = SimpleNamespace(
+        chord_definitions=definitions, chord_keys=[None] * 3, chord_sizes=[chord_size(definition) for definition in definitions],
+        canvas_width=300, display_scale=1.0, raster_cache=RasterCache(cache_dir=None), export_results=queue.Queue(),
+        export_button=SimpleNamespace(config=lambda **kwargs: None), after=lambda delay, callback: None, poll_export=None
+    )
+    path = str(tmp_path / f"sheet.{format}")
+    main.ReChord.export_canvas(app, path)
+    assert app.export_results.get(timeout=30) == (path, None)
+    with open(path, "rb") as f:
+        data = f.read()
+    if format == "svg":
+        assert all(f">{title}<".encode() in data for title in ("C", "Am", "G"))
+    elif format == "png":
+        from PIL import Image
+        # three chords wrapped at 300px: two rows
+        width, height = Image.open(path).size
+        assert width <= 300 and height >= 2 * app.chord_sizes[0][1]
+    else:
+        assert data.startswith(b"%PDF")
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    try:
+        tk.Tk().destroy()
+    except tk.TclError:
+        pytest.skip("needs a display")
+    monkeypatch.chdir(tmp_path)
+    # .ico window icons only load on Windows
+    monkeypatch.setattr(main.ReChord, "iconbitmap", lambda self, *args: None)
+    main.create_dirs()
+    app = main.ReChord()
+    yield app
+    app.library.close()
+    app.destroy()
+
+@pytest.mark.parametrize("popup", [main.EditPopup, main.CreatePopup, main.DeletePopup, main.SavePopup, main.LoadPopup])
+def test_popups_open(app, popup):
+    window = popup(app)
+    app.update()
+    window.destroy()
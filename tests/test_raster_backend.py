@@ -0,0 +1,28 @@
+import pytest
+import lib.chord_diagram_gen as cg
+import lib.raster_backend as raster_backend
+import lib.render as render
+
+# (num_strings, title, starting_fret, notes, barres, mute)
+CHORDS = [
+    (4, "C", 1, [(1, 3)], [], []),
+    (5, "Bm", 2, [(2, 4), (3, 4), (4, 3)], [(2, 1, 5)], []),
+    (6, "F", 1, [(3, 2), (4, 3), (5, 3)], [(1, 1, 6)], []),
+    (6, "D", 1, [(1, 2), (2, 3), (3, 2)], [], [5, 6]),
+    (6, "Bb7", 6, [(2, 8), (4, 8)], [(6, 1, 6)], []),
+]
+# antialiasing differs along edges; anything more is a drawing difference
+MAX_DIFFERENCE = 0.01
+
+@pytest.mark.parametrize("scale", [1.0, 2.0])
+@pytest.mark.parametrize("args", CHORDS, ids=[args[1] for args in CHORDS])
+def test_raster_backend_matches_the_svg_backend(args, scale):
+    chord = cg.Chord(*args)
+    raster = raster_backend.chord_to_pil(chord, scale)
+    svg = render.svg_to_pil(chord.to_svg(), scale)
+    assert raster.size == svg.size
+    assert raster_backend.image_difference(raster, svg) < MAX_DIFFERENCE
+
+def test_image_difference_sees_a_different_chord():
+    f, d = cg.Chord(*CHORDS[2]), cg.Chord(*CHORDS[3])
+    assert raster_backend.image_difference(raster_backend.chord_to_pil(f), render.svg_to_pil(d.to_svg())) > MAX_DIFFERENCE
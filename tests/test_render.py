@@ -0,0 +1,25 @@
+import pytest
+import lib.chord_diagram_gen as cg
+import lib.render as render
+
+def dark_runs(image, x):
+    '''
+    returns: the heights of the dark runs down column x
+    '''
+    runs = []
+    run = 0
+    for y in range(image.height):
+        if image.getpixel((x, y))[0] < 128:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    return runs
+
+@pytest.mark.parametrize("backend", render.BACKENDS)
+@pytest.mark.parametrize("scale", [1.0, 2.0, 4.0])
+def test_strokes_scale_with_the_render(backend, scale):
+    # a 12px barre across the first fret, crossing the middle column
+    chord = cg.Chord(6, "F", 1, [(5, 3), (4, 3)], [(1, 1, 6)], [3])
+    image = render.render_chord(chord, scale, backend)
+    assert 12 * scale in dark_runs(image, image.width // 2)
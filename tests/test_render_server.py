@@ -0,0 +1,56 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from lib.render_server import MAX_PARAM, MAX_STRINGS, RenderService, make_server
+
+@pytest.mark.parametrize("definition", [
+    {"num_strings": 0},
+    {"num_strings": -3},
+    {"num_strings": MAX_STRINGS + 1},
+    {"num_strings": 2000},
+    {"num_strings": 6, "title": 5},
+    {"num_strings": 6, "notes": [[1, 1], [1, 9]]},
+    {"title": "no strings"},
+    [6],
+    {"num_strings": 6, "params": {"padding": "abc"}},
+    {"num_strings": 6, "params": {"fret_spacing": True}},
+    {"num_strings": 6, "params": {"string_spacing": -20}},
+    {"num_strings": 6, "params": {"padding": MAX_PARAM + 1}},
+    {"num_strings": 6, "params": {"padding": 30000}},
+])
+def test_invalid_definitions_are_rejected_before_rendering(definition):
+    with pytest.raises(ValueError):
+        RenderService.request_key(definition, "png", 1.0)
+
+def test_equivalent_definitions_share_a_key():
+    first = RenderService.request_key({"num_strings": 6, "notes": [[5, 3]]}, "svg", 1.0)
+    second = RenderService.request_key({"num_strings": "6", "notes": [(5, 3)], "mute": []}, "svg", 2.0)
+    assert first[3] == second[3]
+
+def test_oversized_pngs_are_rejected():
+    params = {"padding": MAX_PARAM, "fret_spacing": MAX_PARAM, "string_spacing": MAX_PARAM}
+    RenderService.request_key({"num_strings": 6, "params": params}, "svg", 1.0)
+    RenderService.request_key({"num_strings": 6}, "png", 8.0)
+    with pytest.raises(ValueError):
+        RenderService.request_key({"num_strings": MAX_STRINGS, "params": params}, "png", 8.0)
+
+@pytest.mark.parametrize("params, scale", [({"padding": "abc"}, 1), ({"padding": 30000}, 8)])
+def test_invalid_params_get_a_400_without_rendering(params, scale):
+    service = RenderService(workers=1)
+    server = make_server("127.0.0.1", 0, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{server.server_address[1]}/render?format=png&scale={scale}",
+            json.dumps({"num_strings": 6, "params": params}).encode("utf-8")
+        )
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request, timeout=10)
+        assert error.value.code == 400
+        assert service.snapshot()["renders"] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
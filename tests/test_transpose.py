@@ -0,0 +1,30 @@
+import os
+import lib.voicings as voicings
+from lib.transpose import transpose_definitions, transpose_name
+
+def test_transpose_name_spells_with_flat_roots():
+    assert transpose_name("F# minor", 2) == "Ab minor"
+    assert transpose_name("F#m", 2) == "Abm"
+    assert transpose_name("C#", 2) == "Eb"
+    assert transpose_name("D/F#", 2) == "E/G#"
+
+def test_transpose_name_rejects_non_notes():
+    assert transpose_name("intro riff", 2) is None
+
+def c_major():
+    return voicings.best_voicing("C").to_chord("C").to_dict()
+
+def test_transpose_never_renders_over_an_existing_diagram(tmp_path):
+    custom = b'<svg xmlns="http://www.w3.org/2000/svg" width="80" height="100"><rect width="60" height="80"/></svg>'
+    (tmp_path / "D.svg").write_bytes(custom)
+    results, errors = transpose_definitions([c_major()], 2, workers=1, svg_dir=str(tmp_path))
+    assert errors == []
+    assert results[0]["title"] == "D (2)"
+    assert (tmp_path / "D.svg").read_bytes() == custom
+    assert sorted(os.listdir(tmp_path)) == ["D (2).svg", "D.svg"]
+
+def test_transpose_reuses_the_same_chord(tmp_path):
+    first, _ = transpose_definitions([c_major()], 2, workers=1, svg_dir=str(tmp_path))
+    again, _ = transpose_definitions([c_major()], 2, workers=1, svg_dir=str(tmp_path))
+    assert first[0]["title"] == again[0]["title"] == "D"
+    assert os.listdir(tmp_path) == ["D.svg"]
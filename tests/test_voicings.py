@@ -0,0 +1,42 @@
+import pytest
+import lib.voicings as voicings
+from lib.identify import identify_chord
+
+# the open shapes every chord book has, lowest string first
+OPEN_VOICINGS = {
+    "D": "xx0232",
+    "Dm": "xx0231",
+    "D7": "xx0212",
+    "Dsus2": "xx0230",
+    "C": "x32010",
+    "G": "320003",
+    "A": "x02220",
+    "Am": "x02210",
+    "E": "022100",
+}
+
+@pytest.mark.parametrize("name, shape", OPEN_VOICINGS.items())
+def test_best_voicing_is_the_open_shape(name, shape):
+    assert voicings.best_voicing(name).shape() == shape
+
+@pytest.mark.parametrize("name", ["D", "Dm", "D7", "Dsus2", "Bbm7", "F#m7b5", "Cmaj7"])
+def test_best_voicing_is_identified_as_the_chord(name):
+    voicing = voicings.best_voicing(name)
+    assert identify_chord(voicing.to_chord(name))[0] == name
+
+@pytest.mark.parametrize("name", ["D", "Dm", "Dsus2", "G7"])
+def test_plain_chords_keep_the_root_in_the_bass(name):
+    tuning = voicings.theory.default_tuning(6)
+    root = voicings.theory.parse_chord_name(name)[0]
+    for voicing in voicings.enumerate_voicings(name):
+        assert voicings.bass_pitch(voicing.frets, tuning) % 12 == root
+
+def test_bass_is_the_lowest_pitch_not_the_lowest_string():
+    tuning = voicings.theory.default_tuning(6)
+    # D on the 10th fret of the low E string over the open A string: the A is the bass
+    assert voicings.bass_pitch((None, None, None, None, 0, 10), tuning) % 12 == 9
+
+def test_slash_chord_gets_its_bass():
+    voicing = voicings.best_voicing("D/F#")
+    assert voicings.bass_pitch(voicing.frets, voicings.theory.default_tuning(6)) % 12 == 6
+    assert identify_chord(voicing.to_chord("D/F#"))[0] == "D/F#"